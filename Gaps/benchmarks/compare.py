@@ -0,0 +1,42 @@
+# Compares two result files of run_benchmarks.py.
+#
+# Usage:
+#     python benchmarks/compare.py before.json after.json
+
+import argparse
+import json
+from typing import Dict, Tuple
+
+
+def load_results(path: str) -> Dict[Tuple, dict]:
+    '''Returns results of given file by benchmark, pieces, piece size and method'''
+    with open(path) as results_file:
+        results = json.load(results_file)['results']
+    return {
+        (result['benchmark'], result['pieces'], result['piece_size'], result['method'] or ''): result
+        for result in results
+    }
+
+
+def parse_arguments():
+    '''Parses paths of compared results'''
+    parser = argparse.ArgumentParser(description='Compares best times of two benchmark runs')
+    parser.add_argument('before', type=str, help='JSON results of the baseline run.')
+    parser.add_argument('after', type=str, help='JSON results of the compared run.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    before, after = load_results(args.before), load_results(args.after)
+
+    print('{:>20} {:>6} {:>5} {:>12} {:>12} {:>12} {:>8}'.format(
+        'benchmark', 'pieces', 'size', 'method', 'before [s]', 'after [s]', 'speedup'
+    ))
+    for key in sorted(set(before) & set(after)):
+        before_time, after_time = before[key]['best'], after[key]['best']
+        speedup = before_time / after_time if after_time > 0 else float('inf')
+        print('{:>20} {:>6} {:>5} {:>12} {:12.6f} {:12.6f} {:7.2f}x'.format(*key, before_time, after_time, speedup))
+
+    for key in sorted(set(before) ^ set(after)):
+        print('{:>20} {:>6} {:>5} {:>12} only in {}'.format(*key, 'before' if key in before else 'after'))
@@ -0,0 +1,183 @@
+# Benchmarks of puzzle solving stages on synthetic puzzles.
+# Puzzles are generated offline and deterministically, so results of different
+# commits are comparable. Results are written as JSON, see compare.py.
+#
+# Usage:
+#     python benchmarks/run_benchmarks.py --sizes 100 1000 5000 --output results.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import numpy as np
+
+from gaps import image_helpers
+from gaps.crossover import Crossover
+from gaps.genetic_algorithm import GeneticAlgorithm
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+from gaps.population import Population
+from gaps.selection import roulette_selection
+from synthetic import grid_shape, synthetic_puzzle
+
+SIZES = [100, 1000, 5000]
+PIECE_SIZE = 32
+METHODS = ['L2', 'Mahalanobis']
+REPEAT = 3
+POPULATION = 50
+GENERATIONS = 5
+GA_MAX_PIECES = 1000
+CHILDREN = 10
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    '''Runs function 'repeat' times without its output and returns the best and the mean time in seconds'''
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = perf_counter()
+            function()
+            times.append(perf_counter() - start)
+    return {'best': min(times), 'mean': float(np.mean(times)), 'repeat': repeat}
+
+
+def benchmark_size(pieces: int, args: argparse.Namespace) -> List[dict]:
+    '''Returns results of all benchmarks on a puzzle of given number of pieces'''
+    rows, columns = grid_shape(pieces)
+    image, puzzle, permutation = synthetic_puzzle(pieces, args.piece_size, args.seed)
+    results = []
+
+    def record(benchmark: str, timing: Dict[str, float], method: Optional[str] = None, **extra):
+        result = dict(benchmark=benchmark, pieces=pieces, piece_size=args.piece_size, method=method, **timing, **extra)
+        results.append(result)
+        print('{:>20} {:>6} pieces {:>12} {:12.6f} s'.format(benchmark, pieces, method or '', timing['best']))
+
+    record('flatten_image', measure(
+        lambda: image_helpers.flatten_image(puzzle, args.piece_size, indexed=True), args.repeat
+    ))
+    grid, _, _ = image_helpers.flatten_image(puzzle, args.piece_size)
+    record('assemble_image', measure(
+        lambda: image_helpers.assemble_image(grid, rows, columns, np.argsort(permutation)), args.repeat
+    ))
+
+    piece_set, _, _ = image_helpers.flatten_image(puzzle, args.piece_size, indexed=True)
+    random_state = np.random.RandomState(args.seed)
+    permutations = Population.random(piece_set, rows, columns, args.population, random_state).permutations
+
+    for method in args.methods:
+        analysis = None
+
+        def analyze():
+            nonlocal analysis
+            analysis = Analysis.analyze(piece_set, method, workers=args.workers)
+
+        record('analyze_image', measure(analyze, args.repeat), method)
+
+        # Stages below read the analysis of the last run
+        population = Population(piece_set, rows, columns, permutations, analysis)
+        parents = [(population[2 * index], population[2 * index + 1]) for index in range(CHILDREN)]
+        record('fitness', measure(
+            lambda: Individual(
+                piece_set, rows, columns, shuffle=False, permutation=permutations[0], analysis=analysis
+            ).fitness,
+            args.repeat
+        ), method)
+        record('population_fitness', measure(
+            lambda: Individual.batch_fitness(permutations, rows, columns, analysis), args.repeat
+        ), method, population=args.population)
+        record('crossover', measure(lambda: _crossovers(parents), args.repeat), method, children=CHILDREN)
+        record('roulette_selection', measure(
+            lambda: roulette_selection(population, elites=2, random_state=random_state), args.repeat
+        ), method, population=args.population)
+
+        if pieces <= args.ga_max_pieces:
+            solution = None
+
+            def solve():
+                nonlocal solution
+                solution = _solve(puzzle, method, args)
+
+            timing = measure(solve, 1)
+            correct = float(np.mean(np.all(solution.to_image() == image, axis=-1)))
+            record(
+                'genetic_algorithm', timing, method, population=args.population, generations=args.generations,
+                fitness=solution.fitness, correct_pixels=correct
+            )
+
+    return results
+
+
+def _crossovers(parents):
+    for first_parent, second_parent in parents:
+        crossover = Crossover(first_parent, second_parent)
+        crossover.run()
+        crossover.child()
+
+
+def _solve(puzzle: np.ndarray, method: str, args: argparse.Namespace) -> Individual:
+    '''Solves puzzle, including its analysis'''
+    algorithm = GeneticAlgorithm(
+        puzzle, args.piece_size, args.population, args.generations, method, workers=args.workers, seed=args.seed
+    )
+    return algorithm.start_evolution(False)
+
+
+def metadata(args: argparse.Namespace) -> dict:
+    '''Returns description of the environment results were measured in'''
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'arguments': vars(args)
+    }
+
+
+def parse_arguments():
+    '''Parses benchmark options'''
+    parser = argparse.ArgumentParser(description='Benchmarks of puzzle solving on synthetic puzzles')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Numbers of pieces of puzzles.')
+    parser.add_argument('--piece-size', type=int, default=PIECE_SIZE, help='Single piece size in pixels.')
+    parser.add_argument('--methods', type=str, nargs='+', default=METHODS, help='Methods of image analysis.')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='Runs of each benchmark, the best is reported.')
+    parser.add_argument('--population', type=int, default=POPULATION, help='Size of population.')
+    parser.add_argument('--generations', type=int, default=GENERATIONS, help='Generations of full solver runs.')
+    parser.add_argument(
+        '--ga-max-pieces', type=int, default=GA_MAX_PIECES, help='Largest puzzle solved by the full solver.'
+    )
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used by the solver.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of puzzles and random choices.')
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='JSON file of results.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark_size(size, args))
+
+    with open(args.output, 'w') as output:
+        json.dump({'metadata': metadata(args), 'results': results}, output, indent=2)
+    print('=== Results saved as "{}"'.format(args.output))
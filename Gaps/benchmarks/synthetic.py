@@ -0,0 +1,50 @@
+'''Deterministic synthetic puzzles for benchmarks.
+
+Images are sums of random sinusoids per channel with a little noise, so neighbouring
+pieces match well, distant pieces do not, and the same seed always gives the same image.
+'''
+
+from typing import Tuple
+
+import numpy as np
+
+from gaps import image_helpers
+
+
+def grid_shape(pieces: int) -> Tuple[int, int]:
+    '''Returns (rows, columns) of the most square grid of exactly given number of pieces'''
+    rows = int(np.sqrt(pieces))
+    while pieces % rows != 0:
+        rows -= 1
+    return rows, pieces // rows
+
+
+def synthetic_image(rows: int, columns: int, piece_size: int, seed: int = 0) -> np.ndarray:
+    '''Returns uint8 RGB image of rows x columns pieces of given size'''
+    random_state = np.random.RandomState(seed)
+    height, width = rows * piece_size, columns * piece_size
+    scale = max(height, width)
+    y = np.arange(height, dtype=np.float32)[:, np.newaxis] / scale
+    x = np.arange(width, dtype=np.float32)[np.newaxis, :] / scale
+
+    image = np.empty((height, width, 3), dtype=np.float32)
+    for channel in range(3):
+        image[..., channel] = 0
+        for _ in range(4):
+            frequency_y, frequency_x = random_state.uniform(1, 12, 2)
+            phase = random_state.uniform(0, 2 * np.pi)
+            image[..., channel] += np.sin(2 * np.pi * (frequency_y * y + frequency_x * x) + phase)
+
+    image = (image + 4) * (255 / 8) + random_state.normal(0, 3, image.shape).astype(np.float32)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def synthetic_puzzle(
+    pieces: int, piece_size: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''Returns original image, puzzle of its shuffled pieces and the permutation which shuffled them'''
+    rows, columns = grid_shape(pieces)
+    image = synthetic_image(rows, columns, piece_size, seed)
+    permutation = np.random.RandomState(seed + 1).permutation(pieces)
+    grid, _, _ = image_helpers.flatten_image(image, piece_size)
+    return image, image_helpers.assemble_image(grid, rows, columns, permutation), permutation
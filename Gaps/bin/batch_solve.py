@@ -0,0 +1,73 @@
+# Solves all puzzles in a directory (or listed in a manifest file)
+# in a pool of worker processes. One JSON record is written per
+# puzzle as soon as it is solved, together with the solution image.
+
+import argparse
+import json
+import os
+import sys
+from time import time
+sys.path.append(os.pardir)
+
+from gaps.batch import BatchSolver, puzzle_sources
+from gaps.genetic_algorithm import GeneticAlgorithm
+from gaps.selection import SELECTIONS
+
+GENERATIONS = 20
+POPULATION = 200
+
+
+def parse_arguments():
+    '''Parses input arguments required to solve puzzles'''
+    parser = argparse.ArgumentParser(description='Solves a batch of jigsaw puzzles')
+    parser.add_argument('source', type=str, help='Directory of puzzles or manifest file with one path per line.')
+    parser.add_argument('--output-dir', type=str, help='Directory of solution images.')
+    parser.add_argument('--records', type=str, help='JSON lines file of records, standard output by default.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    parser.add_argument('--size', type=int, help='Piece size of all puzzles in pixels, detected by default.')
+    parser.add_argument('--generations', type=int, default=GENERATIONS, help='Num of generations.')
+    parser.add_argument('--population', type=int, default=POPULATION, help='Size of population.')
+    parser.add_argument(
+        '--method', type=str, default='L2', help='Method for calculating error. Options: "Mahalanobis" and "L2".'
+    )
+    parser.add_argument(
+        '--cache-dir', type=str, help='Directory of cached image analyses, nothing is cached by default.'
+    )
+    parser.add_argument(
+        '--selection', type=str, default='roulette', choices=list(SELECTIONS), help='Selection of parents.'
+    )
+    parser.add_argument(
+        '--local-search', type=str, default='none', choices=GeneticAlgorithm.LOCAL_SEARCH,
+        help='Improve elites of every generation or the final solution by local moves.'
+    )
+    parser.add_argument('--seed', type=int, help='Seed of random choices of every puzzle.')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+
+    sources = puzzle_sources(args.source)
+    print('=== Puzzles:       {}'.format(len(sources)), file=sys.stderr)
+    print('=== Workers:       {}'.format(args.workers), file=sys.stderr)
+
+    solver = BatchSolver(
+        workers=args.workers, output_dir=args.output_dir, piece_size=args.size, population_size=args.population,
+        generations=args.generations, method=args.method, cache_dir=args.cache_dir, selection=args.selection,
+        local_search=args.local_search, seed=args.seed
+    )
+
+    start = time()
+    failed = 0
+    records = sys.stdout if args.records is None else open(args.records, 'a')
+    try:
+        for record in solver.solve(sources):
+            failed += record['error'] is not None
+            records.write(json.dumps(record) + '\n')
+            records.flush()
+    finally:
+        if records is not sys.stdout:
+            records.close()
+
+    print('=== Solved {} puzzles in {:.3f} s, {} failed'.format(
+        len(sources) - failed, time() - start, failed
+    ), file=sys.stderr)
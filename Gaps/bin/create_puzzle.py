@@ -33,10 +33,10 @@ def create_puzzle(args: argparse.Namespace):
     pieces, rows, columns = image_helpers.flatten_image(image, args.size)
 
     # Randomize pieces in order to make puzzle
-    np.random.shuffle(pieces)
+    permutation = np.random.permutation(rows * columns)
 
-    # Create puzzle by stacking pieces
-    puzzle = image_helpers.assemble_image(pieces, rows, columns)
+    # Create puzzle by gathering pieces
+    puzzle = image_helpers.assemble_image(pieces, rows, columns, permutation)
 
     cv2.imwrite(args.destination, puzzle)
     print_messages(['Puzzle created with {} x {} pieces'.format(rows, columns)])
@@ -10,19 +10,27 @@ from time import time
 sys.path.append(os.pardir)
 
 import cv2
-import matplotlib.pyplot as plt
+import numpy as np
 
 from gaps.genetic_algorithm import GeneticAlgorithm
+from gaps.instrumentation import Instrumentation
+from gaps.island_model import IslandModel
+from gaps.selection import SELECTIONS
+from gaps.renderer import FrameWriter
 from gaps.size_detector import SizeDetector
-from gaps.plot import Plot
 
 GENERATIONS = 20
 POPULATION = 200
+MEMORY_BUDGET = 256
+CACHE_DIR = '~/.cache/gaps'
 
 
 def show_image(img, title):
-    if not args.verbose:
-        Plot(img, title)
+    # Interactive backend is imported only when a window is shown
+    import matplotlib.pyplot as plt
+    from gaps.plot import Plot
+
+    Plot(img, title)
     plt.show()
 
 
@@ -34,9 +42,68 @@ def parse_arguments():
     parser.add_argument('--population', type=int, default=POPULATION, help='Size of population.')
     parser.add_argument('--size', type=int, help='Single piece size in pixels.')
     parser.add_argument('--method', type=str, default='L2', help='Method for calculating error. Options: "Mahalanobis" and "L2".')
+    parser.add_argument('--float32', action='store_true', help='Store dissimilarity measures in single precision.')
+    parser.add_argument('--memory-budget', type=int, default=MEMORY_BUDGET, help='Memory for analysis block in MB.')
+    parser.add_argument('--analysis-file', type=str, help='Memory mapped .npy file for measures, no cache is used.')
+    parser.add_argument(
+        '--cache-dir', type=str, help='Directory of cached image analyses. Default: {}.'.format(CACHE_DIR)
+    )
+    parser.add_argument('--no-cache', action='store_true', help='Analyze image without reading or writing the cache.')
+    parser.add_argument('--rebuild-cache', action='store_true', help='Analyze image again and replace cached analysis.')
+    parser.add_argument(
+        '--workers', type=int, default=1, help='Number of processes used by image analysis and crossover.'
+    )
+    parser.add_argument(
+        '--selection', type=str, default='roulette', choices=list(SELECTIONS),
+        help='Selection of parents: roulette wheel, tournament or stochastic universal sampling.'
+    )
+    parser.add_argument('--seed', type=int, help='Seed of random choices, solving is reproducible with a seed.')
+    parser.add_argument(
+        '--local-search', type=str, default='none', choices=GeneticAlgorithm.LOCAL_SEARCH,
+        help='Improve elites of every generation or the final solution by local moves.'
+    )
+    parser.add_argument('--checkpoint', type=str, help='File where state of the run is saved (.npz).')
+    parser.add_argument(
+        '--checkpoint-interval', type=int, default=1, help='Generations between checkpoints.'
+    )
+    parser.add_argument(
+        '--resume', action='store_true', help='Continue the run saved in --checkpoint file, if it exists.'
+    )
+    parser.add_argument(
+        '--islands', type=int, default=1, help='Number of populations evolved in separate processes.'
+    )
+    parser.add_argument(
+        '--migration-interval', type=int, default=5, help='Generations between migrations of islands.'
+    )
+    parser.add_argument('--migrants', type=int, default=1, help='Individuals each island sends in one migration.')
+    parser.add_argument(
+        '--topology', type=str, default='ring', choices=IslandModel.TOPOLOGIES,
+        help='Islands exchanging individuals: ring, all pairs or random pairs.'
+    )
+    parser.add_argument(
+        '--profile', type=str, help='Append timings and counters of every generation to this JSON lines file.'
+    )
+    parser.add_argument('--frames', type=str, help='Directory where the best individual is saved as PNG frames.')
+    parser.add_argument('--animation', type=str, help='Video (.avi, .mp4) or .gif file of the best individuals.')
+    parser.add_argument(
+        '--frame-interval', type=int, default=1, help='Generations between saved frames of the best individual.'
+    )
+    parser.add_argument('--headless', action='store_true', help='Do not show any window.')
     parser.add_argument('--verbose', action='store_true', help='Show best individual after each generation.')
     parser.add_argument('--save', action='store_true', help='Save puzzle result as image.')
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    # Measures are kept either in the given file or in the cache
+    cache_options = [
+        option for option, given in (
+            ('--cache-dir', args.cache_dir is not None), ('--rebuild-cache', args.rebuild_cache)
+        ) if given
+    ]
+    if cache_options and args.analysis_file is not None:
+        parser.error('{} not allowed with --analysis-file, which does not use the cache'.format(cache_options[0]))
+    if cache_options and args.no_cache:
+        parser.error('{} not allowed with --no-cache'.format(cache_options[0]))
+    return args
 
 if __name__ == '__main__':
     args = parse_arguments()
@@ -55,11 +122,51 @@ if __name__ == '__main__':
     print('=== Piece size:    {} px'.format(piece_size))
     print('=== Error methods: {}'.format(args.method))
 
+    if args.profile is not None:
+        Instrumentation.enable(path=args.profile)
+
     # Let the games begin! And may the odds be in your favor!
     start = time()
-    algorithm = GeneticAlgorithm(image, piece_size, args.population, args.generations, args.method)
-    solution = algorithm.start_evolution(args.verbose)
+    islands = {}
+    if args.islands > 1:
+        islands = dict(
+            islands=args.islands, migration_interval=args.migration_interval, migrants=args.migrants,
+            topology=args.topology
+        )
+    checkpoint = {}
+    if args.checkpoint is not None:
+        if islands:
+            sys.exit('Checkpoints are not supported with --islands')
+        checkpoint = dict(
+            checkpoint=args.checkpoint, checkpoint_interval=args.checkpoint_interval, resume=args.resume
+        )
+    elif args.resume:
+        sys.exit('--resume needs --checkpoint file')
+    algorithm = (IslandModel if islands else GeneticAlgorithm)(
+        image, piece_size, args.population, args.generations, args.method, **islands,
+        dtype=np.float32 if args.float32 else np.float64,
+        memory_budget=args.memory_budget * 2 ** 20,
+        analysis_file=args.analysis_file,
+        cache_dir=None if args.no_cache or args.analysis_file is not None else args.cache_dir or CACHE_DIR,
+        rebuild_cache=args.rebuild_cache,
+        workers=args.workers,
+        local_search=args.local_search,
+        seed=args.seed,
+        selection=args.selection,
+        **checkpoint
+    )
+    renderer = None
+    if args.frames is not None or args.animation is not None:
+        renderer = FrameWriter(
+            image, piece_size, directory=args.frames, animation=args.animation, every=args.frame_interval
+        )
+    try:
+        solution = algorithm.start_evolution(args.verbose and not args.headless, renderer)
+    finally:
+        if renderer is not None:
+            renderer.close()
     end = time()
+    Instrumentation.disable()
 
     print('\n=== Done in {0:.3f} s'.format(end - start))
 
@@ -71,5 +178,6 @@ if __name__ == '__main__':
         cv2.imwrite(solution_image_name, solution_image)
         print('=== Result saved as "{}"'.format(solution_image_name))
 
-    print('=== Close figure to exit')
-    show_image(solution_image, 'Solution')
+    if not args.headless:
+        print('=== Close figure to exit')
+        show_image(solution_image, 'Solution')
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import threading
+import warnings
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from gaps.best_match_table import BestMatchTable
+from gaps.image_analysis import Analysis, ImageAnalysis
+from gaps.piece import Piece
+from gaps.piece_set import PieceSet
+
+
+class AnalysisCache(object):
+    '''Persistent on-disk cache of image analysis.
+
+    Dissimilarity measures and best match table of a puzzle are kept in
+    a subdirectory named by a hash of piece pixels, piece size, method
+    and storage options. Measures are stored as a raw .npy file and
+    memory mapped on load, so solving the same puzzle again with other
+    settings neither recomputes nor fully reads the analysis.
+
+    :param directory: Directory holding cached analyses.
+
+    Usage::
+
+        >>> from gaps.analysis_cache import AnalysisCache
+        >>> cache = AnalysisCache('~/.cache/gaps')
+        >>> analysis, loaded = cache.load_or_analyze(pieces, 'L2')
+
+    '''
+
+    # Bump when format of cached files changes
+    VERSION = 1
+
+    def __init__(self, directory: str):
+        self.directory = os.path.expanduser(directory)
+
+    @classmethod
+    def key(cls, pieces: Union[List[Piece], PieceSet], method: str, dtype: np.dtype, top_k: int) -> str:
+        '''Returns cache key of analysis of given pieces'''
+        digest = hashlib.sha256()
+        digest.update('{}:{}:{}:{}:{}'.format(
+            cls.VERSION, pieces[0].size(), method, np.dtype(dtype).name, top_k
+        ).encode())
+        if isinstance(pieces, PieceSet):
+            digest.update(np.ascontiguousarray(pieces.images).tobytes())
+        else:
+            for piece in sorted(pieces, key=lambda piece: piece.id):
+                digest.update(np.ascontiguousarray(piece.image).tobytes())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        '''Returns directory of cached analysis with given key'''
+        return os.path.join(self.directory, key)
+
+    def load_or_analyze(
+        self, pieces: Union[List[Piece], PieceSet], method: str, dtype: np.dtype = np.float64,
+        top_k: int = BestMatchTable.TOP_K, memory_budget: int = Analysis.MEMORY_BUDGET, workers: int = 1,
+        rebuild: bool = False
+    ) -> Tuple[Analysis, bool]:
+        '''Loads analysis of given pieces from cache, analyzes image and caches the result on a miss
+
+        :params rebuild: Analyze image even if analysis is cached and replace cached one.
+
+        Other parameters are the same as of Analysis.analyze.
+        Returns the analysis and True if it was loaded from cache.
+
+        '''
+        path = self.path(self.key(pieces, method, dtype, top_k))
+
+        if os.path.isdir(path) and not rebuild:
+            return Analysis.load(path), True
+
+        # Analysis is written to a temporary directory first, so that
+        # an interrupted run never leaves a partial entry behind.
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        os.makedirs(temporary_path, exist_ok=True)
+        try:
+            analysis = Analysis.analyze(
+                pieces, method, dtype, top_k, memory_budget,
+                path=os.path.join(temporary_path, Analysis.MEASURES_FILE), workers=workers
+            )
+            analysis.save(temporary_path)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.replace(temporary_path, path)
+            except OSError:
+                # Another solve cached the same analysis meanwhile
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+        # Measures were written to the temporary directory, which is gone now, so
+        # they are mapped from the cache entry again, e.g. for workers to attach to
+        return Analysis.load(path), False
+
+    def analyze_image(
+        self, pieces: Union[List[Piece], PieceSet], method: str, dtype: np.dtype = np.float64,
+        top_k: int = BestMatchTable.TOP_K, memory_budget: int = Analysis.MEMORY_BUDGET, workers: int = 1,
+        rebuild: bool = False
+    ) -> bool:
+        '''Deprecated, same as load_or_analyze but makes the analysis the process-wide ImageAnalysis
+
+        Returns True if analysis was loaded from cache.
+
+        '''
+        warnings.warn(
+            'AnalysisCache.analyze_image is deprecated, use AnalysisCache.load_or_analyze', DeprecationWarning,
+            stacklevel=2
+        )
+        analysis, loaded = self.load_or_analyze(pieces, method, dtype, top_k, memory_budget, workers, rebuild)
+        ImageAnalysis.use(analysis)
+        return loaded
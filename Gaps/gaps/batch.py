@@ -0,0 +1,172 @@
+import contextlib
+import io
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import cv2
+
+from gaps.genetic_algorithm import GeneticAlgorithm
+from gaps.instrumentation import Instrumentation
+from gaps.size_detector import SizeDetector
+
+# Extensions of puzzle images found in a directory
+IMAGE_EXTENSIONS = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp')
+
+
+def puzzle_sources(path: str) -> List[str]:
+    '''Returns paths of puzzles in a directory or listed in a manifest file
+
+    Manifest is a text file with one path per line, relative paths are relative to the manifest.
+    Empty lines and lines starting with # are skipped.
+
+    '''
+    path = os.path.expanduser(path)
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+    with open(path) as manifest:
+        lines = [line.strip() for line in manifest]
+    directory = os.path.dirname(path)
+    return [os.path.join(directory, line) for line in lines if line and not line.startswith('#')]
+
+
+class BatchSolver(object):
+    '''Solves many puzzles in a pool of worker processes.
+
+    Workers live for the whole batch, so imports happen once per worker instead of once per
+    puzzle. Each worker solves one puzzle at a time: it reads the image, detects piece size
+    unless it is given, solves the puzzle, writes the solution image and returns a record:
+
+        source, index     - path of the puzzle and its position in given sources
+        piece_size, rows, columns
+        permutation       - ids of pieces (row by row in the puzzle) at each position of the solution
+        fitness, generations
+        timings           - seconds spent in reading, size_detection, solving and writing, and in
+                            phases of instrumentation (pieces, analysis, fitness, selection, crossover)
+        output            - path of the solution image, None without output directory
+        error             - None, or traceback of the error which stopped solving
+
+    Records are yielded as puzzles are solved, not in order of sources.
+
+    :param workers:    Number of worker processes, puzzles are solved in this process if 1.
+    :param output_dir: Directory of solution images, named <puzzle name>_solution.<extension>.
+    :param piece_size: Size of pieces of all puzzles, detected for every puzzle if None.
+
+    Other keyword arguments are passed to GeneticAlgorithm (e.g. seed, selection, cache_dir).
+
+    Usage::
+
+        >>> from gaps.batch import BatchSolver, puzzle_sources
+        >>> solver = BatchSolver(workers=4, output_dir='solutions', population_size=200, generations=20)
+        >>> for record in solver.solve(puzzle_sources('puzzles')):
+        ...     print(record['source'], record['fitness'])
+
+    '''
+
+    def __init__(
+        self, workers: int = 1, output_dir: Optional[str] = None, piece_size: Optional[int] = None,
+        population_size: int = 200, generations: int = 20, method: str = 'L2', **options
+    ):
+        self.workers = workers
+        self._output_dir = None if output_dir is None else os.path.expanduser(output_dir)
+        self._settings = dict(
+            piece_size=piece_size, population_size=population_size, generations=generations, method=method,
+            options=options
+        )
+        if self._output_dir is not None:
+            os.makedirs(self._output_dir, exist_ok=True)
+
+    def solve(self, sources: Iterable[str]) -> Iterator[dict]:
+        '''Yields record of each puzzle as soon as it is solved'''
+        sources = list(sources)
+        if self.workers <= 1:
+            for index, source in enumerate(sources):
+                yield solve_puzzle(source, index, self._output_dir, **self._settings)
+            return
+
+        with ProcessPoolExecutor(self.workers) as executor:
+            futures = {
+                executor.submit(solve_puzzle, source, index, self._output_dir, **self._settings): (source, index)
+                for index, source in enumerate(sources)
+            }
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception:
+                    # Worker died (e.g. killed or out of memory), the rest of the batch goes on.
+                    # A broken pool fails every unfinished puzzle, each of them gets its own record.
+                    record = _empty_record(*futures[future], self._settings['piece_size'])
+                    record['error'] = traceback.format_exc()
+                yield record
+
+
+def _empty_record(source: str, index: int, piece_size: Optional[int]) -> dict:
+    '''Returns record of a puzzle which is not solved yet'''
+    return {
+        'source': source, 'index': index, 'piece_size': piece_size, 'rows': None, 'columns': None,
+        'permutation': None, 'fitness': None, 'generations': 0, 'timings': {}, 'output': None, 'error': None
+    }
+
+
+def solve_puzzle(
+    source: str, index: int, output_dir: Optional[str], piece_size: Optional[int], population_size: int,
+    generations: int, method: str, options: dict
+) -> dict:
+    '''Solves one puzzle of a batch and returns its record, errors are part of the record'''
+    record = _empty_record(source, index, piece_size)
+    timings: Dict[str, float] = record['timings']
+
+    def add_phases(instrumentation_record: dict):
+        for phase, seconds in instrumentation_record['timers'].items():
+            timings[phase] = timings.get(phase, 0.0) + seconds
+        record['generations'] = max(record['generations'], instrumentation_record.get('generation', 0))
+
+    # Instrumentation enabled by the caller keeps its records and stays enabled
+    enabled = Instrumentation.enabled
+    Instrumentation.enable(callback=add_phases)
+    try:
+        start = perf_counter()
+        image = cv2.imread(source)
+        if image is None:
+            raise ValueError('Cannot read image {}'.format(source))
+        timings['reading'] = perf_counter() - start
+
+        if piece_size is None:
+            start = perf_counter()
+            piece_size = SizeDetector(image).detect_piece_size()
+            timings['size_detection'] = perf_counter() - start
+        record['piece_size'] = int(piece_size)
+
+        start = perf_counter()
+        algorithm = GeneticAlgorithm(image, piece_size, population_size, generations, method, **options)
+        # Progress of puzzles solved at the same time would be interleaved
+        with contextlib.redirect_stdout(io.StringIO()):
+            solution = algorithm.start_evolution(verbose=False)
+        timings['solving'] = perf_counter() - start
+
+        record.update(
+            rows=solution.rows, columns=solution.columns, permutation=solution.permutation.tolist(),
+            fitness=float(solution.fitness)
+        )
+
+        if output_dir is not None:
+            start = perf_counter()
+            name, extension = os.path.splitext(os.path.basename(source))
+            record['output'] = os.path.join(output_dir, '{}_solution{}'.format(name, extension or '.png'))
+            cv2.imwrite(record['output'], solution.to_image())
+            timings['writing'] = perf_counter() - start
+    except Exception:
+        record['error'] = traceback.format_exc()
+    finally:
+        if enabled:
+            Instrumentation.remove_callback(add_phases)
+        else:
+            Instrumentation.disable()
+
+    return record
@@ -0,0 +1,192 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class BestMatchTable(object):
+    '''Best matching pieces for each edge of each piece.
+
+    For every orientation the table keeps two (N, top_k) arrays: ids of best matching
+    pieces and their dissimilarity measures, sorted from the best match. Ties are broken
+    by piece id. Only top_k best matches are kept, since crossover rarely looks further;
+    a row is extended to all N - 1 matches lazily, the first time it is asked for.
+
+    Top matches are built block by block with update(), so the dissimilarity measures
+    never have to be in memory all at once.
+
+    :param left_right: Dissimilarity measures of [left, right] pairs, N x N.
+    :param top_down:   Dissimilarity measures of [top, down] pairs, N x N.
+    :param top_k:      Number of best matches kept for each edge.
+    :param indices:    Already built ids of top matches for each orientation.
+    :param measures:   Already built measures of top matches for each orientation.
+
+    Usage::
+
+        >>> from gaps.best_match_table import BestMatchTable
+        >>> table = BestMatchTable(left_right, top_down, top_k=8)
+        >>> table.update(0, left_right, top_down)
+        >>> ids, measures = table.row(42, 'R')
+
+    '''
+
+    ORIENTATIONS = ('T', 'R', 'D', 'L')
+
+    # Default number of best matches kept for each edge
+    TOP_K = 32
+
+    def __init__(
+        self, left_right: np.ndarray, top_down: np.ndarray, top_k: int = TOP_K,
+        indices: Optional[Dict[str, np.ndarray]] = None, measures: Optional[Dict[str, np.ndarray]] = None
+    ):
+        self._left_right = left_right
+        self._top_down = top_down
+        self.top_k = max(0, min(top_k, len(left_right) - 1))
+
+        if indices is None:
+            shape = (len(left_right), self.top_k)
+            indices = {orientation: np.full(shape, -1, dtype=np.int32) for orientation in self.ORIENTATIONS}
+            measures = {
+                orientation: np.full(shape, np.inf, dtype=left_right.dtype) for orientation in self.ORIENTATIONS
+            }
+
+        self.indices = indices
+        self.measures = measures
+
+        # Rows extended to all matches, orientation => {piece => (indices, measures)}
+        self._extended: Dict[str, Dict[int, Tuple[np.ndarray, np.ndarray]]] = {
+            orientation: {} for orientation in self.ORIENTATIONS
+        }
+
+    def __len__(self) -> int:
+        return len(self._left_right)
+
+    def update(self, start: int, left_right_rows: np.ndarray, top_down_rows: np.ndarray):
+        '''Merges a block of rows of dissimilarity measures into top matches.
+
+        Blocks must be given in increasing order of rows. Rows of a block hold
+        every match of 'R' and 'D' edges of pieces start, start + 1, ... and
+        a part of matches of 'L' and 'T' edges of every piece.
+
+        :params start:           Id of the piece in the first row of the block.
+        :params left_right_rows: Rows of [left, right] measures, shape (B, N).
+        :params top_down_rows:   Rows of [top, down] measures, shape (B, N).
+
+        '''
+        if self.top_k == 0:
+            return
+
+        rows = slice(start, start + len(left_right_rows))
+        ids = np.arange(len(self), dtype=np.int32)
+        block_ids = ids[rows]
+
+        for orientation, values in (('R', left_right_rows), ('D', top_down_rows)):
+            self.indices[orientation][rows], self.measures[orientation][rows] = _smallest(
+                values, np.broadcast_to(ids, values.shape), self.top_k
+            )
+
+        # Pieces of this block have greater ids than pieces already in top matches,
+        # so appending them after the current (sorted) matches keeps ties ordered by id.
+        for orientation, values in (('L', left_right_rows), ('T', top_down_rows)):
+            self.indices[orientation], self.measures[orientation] = _smallest(
+                np.hstack((self.measures[orientation], values.T)),
+                np.hstack((self.indices[orientation], np.broadcast_to(block_ids, values.T.shape))),
+                self.top_k
+            )
+
+    def save(self, path: str):
+        '''Saves top matches of every edge to given .npz file'''
+        arrays = {}
+        for orientation in self.ORIENTATIONS:
+            arrays['indices_' + orientation] = self.indices[orientation]
+            arrays['measures_' + orientation] = self.measures[orientation]
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str, left_right: np.ndarray, top_down: np.ndarray) -> 'BestMatchTable':
+        '''Loads top matches saved with save() for given dissimilarity measures'''
+        with np.load(path) as arrays:
+            indices = {orientation: arrays['indices_' + orientation] for orientation in cls.ORIENTATIONS}
+            measures = {orientation: arrays['measures_' + orientation] for orientation in cls.ORIENTATIONS}
+        top_k = indices[cls.ORIENTATIONS[0]].shape[1]
+        return cls(left_right, top_down, top_k, indices=indices, measures=measures)
+
+    def best_match(self, piece: int, orientation: str) -> int:
+        '''Returns best match piece for given piece and orientation'''
+        if self.top_k > 0:
+            return int(self.indices[orientation][piece, 0])
+        return int(self.full_row(piece, orientation)[0][0])
+
+    def best_buddies(self) -> np.ndarray:
+        '''Returns best buddy of every edge of every piece.
+
+        Two pieces are best buddies if each one is the best match of the other on the
+        touching edges. Row i of the (N, 4) array holds best buddies of edges of piece i
+        in order of ORIENTATIONS, -1 where the best match is not mutual.
+
+        '''
+        if self.top_k > 0:
+            best = np.stack([self.indices[orientation][:, 0] for orientation in self.ORIENTATIONS], axis=1)
+        else:
+            best = np.stack([
+                np.argmin(self._top_down, axis=0), np.argmin(self._left_right, axis=1),
+                np.argmin(self._top_down, axis=1), np.argmin(self._left_right, axis=0)
+            ], axis=1)
+
+        # Column of the touching edge of the best match: T <=> D, R <=> L
+        complementary = np.array([2, 3, 0, 1])
+        mutual = best[best, complementary] == np.arange(len(best))[:, np.newaxis]
+        return np.where(mutual, best, -1).astype(np.int32)
+
+    def row(self, piece: int, orientation: str) -> Tuple[np.ndarray, np.ndarray]:
+        '''Returns ids and measures of top_k best matches for given piece and orientation'''
+        return self.indices[orientation][piece], self.measures[orientation][piece]
+
+    def full_row(self, piece: int, orientation: str) -> Tuple[np.ndarray, np.ndarray]:
+        '''Returns ids and measures of all N - 1 matches for given piece and orientation.
+
+        The row is sorted once and then kept, so only edges that use up their
+        top_k matches ever pay for a full sort.
+
+        '''
+        extended = self._extended[orientation].get(piece)
+        if extended is None:
+            values = np.asarray(self._candidates(piece, orientation))
+            order = np.argsort(values, kind='stable')
+            order = order[order != piece].astype(np.int32)
+            extended = (order, values[order])
+            self._extended[orientation][piece] = extended
+        return extended
+
+    def _candidates(self, piece: int, orientation: str) -> np.ndarray:
+        '''Returns measures between given piece and every other piece on given edge'''
+        if orientation == 'T':
+            return self._top_down[:, piece]
+        if orientation == 'R':
+            return self._left_right[piece, :]
+        if orientation == 'D':
+            return self._top_down[piece, :]
+        if orientation == 'L':
+            return self._left_right[:, piece]
+
+
+def _smallest(values: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''Returns ids and values of k smallest values in each row, sorted by value and id.
+
+    Equal values within a row must appear in order of increasing ids.
+
+    '''
+    partition = np.argpartition(values, k - 1, axis=1)
+    kth_value = np.take_along_axis(values, partition[:, k - 1:k], axis=1)
+
+    # Keep every value better than the k-th one and as many ties with it as fit,
+    # lowest ids first, so the result does not depend on the partitioning.
+    better = values < kth_value
+    ties = values == kth_value
+    free_slots = k - better.sum(axis=1, keepdims=True)
+    selected = better | (ties & (np.cumsum(ties, axis=1) <= free_slots))
+
+    positions = np.nonzero(selected)[1].reshape(len(values), k)
+    measures = np.take_along_axis(values, positions, axis=1)
+    positions = np.take_along_axis(positions, np.argsort(measures, axis=1, kind='stable'), axis=1)
+
+    return np.take_along_axis(ids, positions, axis=1), np.take_along_axis(values, positions, axis=1)
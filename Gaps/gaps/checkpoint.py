@@ -0,0 +1,111 @@
+import os
+import random
+from typing import Dict
+
+import numpy as np
+
+
+class Checkpoint(object):
+    '''Named arrays describing the state of a run, stored in one compressed .npz file.
+
+    A checkpoint is written to a temporary file which then replaces the previous one,
+    so a run stopped while writing leaves the former checkpoint intact.
+    States of random generators are converted to arrays (and back) by module functions.
+
+    :param arrays: State by name.
+
+    Usage::
+
+        >>> from gaps.checkpoint import Checkpoint
+        >>> Checkpoint({'generation': np.array(3)}).save('run.npz')
+        >>> generation = int(Checkpoint.load('run.npz')['generation'])
+
+    '''
+
+    # Bump when content of checkpoints changes
+    VERSION = 1
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+    def save(self, path: str):
+        '''Writes checkpoint to given path, replacing the previous one'''
+        path = os.path.expanduser(path)
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+        # Written through a file object, so numpy does not append .npz to the temporary name
+        with open(temporary_path, 'wb') as checkpoint_file:
+            np.savez_compressed(checkpoint_file, version=np.array(self.VERSION), **self.arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'Checkpoint':
+        '''Reads checkpoint written by save()'''
+        with np.load(os.path.expanduser(path), allow_pickle=False) as checkpoint_file:
+            arrays = {name: checkpoint_file[name] for name in checkpoint_file.files}
+
+        version = int(arrays.pop('version', -1))
+        if version != cls.VERSION:
+            raise ValueError('Checkpoint {} has version {}, expected {}'.format(path, version, cls.VERSION))
+        return cls(arrays)
+
+
+def random_state_arrays(random_state: np.random.RandomState, prefix: str) -> Dict[str, np.ndarray]:
+    '''Returns state of numpy RandomState (or of np.random module) as arrays named by prefix'''
+    _, keys, position, has_gauss, cached_gaussian = random_state.get_state()
+    return {
+        prefix + '_keys': keys,
+        prefix + '_position': np.array(position),
+        prefix + '_gauss': np.array([has_gauss, cached_gaussian], dtype=np.float64)
+    }
+
+
+def restore_random_state(random_state: np.random.RandomState, checkpoint: Checkpoint, prefix: str):
+    '''Sets state of numpy RandomState (or of np.random module) written by random_state_arrays()'''
+    has_gauss, cached_gaussian = checkpoint[prefix + '_gauss']
+    random_state.set_state((
+        'MT19937', checkpoint[prefix + '_keys'], int(checkpoint[prefix + '_position']),
+        int(has_gauss), float(cached_gaussian)
+    ))
+
+
+def python_random_arrays(prefix: str) -> Dict[str, np.ndarray]:
+    '''Returns state of the global random module as arrays named by prefix'''
+    version, internal_state, gauss_next = random.getstate()
+    return {
+        prefix + '_version': np.array(version),
+        prefix + '_state': np.array(internal_state, dtype=np.int64),
+        prefix + '_gauss': np.array(np.nan if gauss_next is None else gauss_next)
+    }
+
+
+def restore_python_random(checkpoint: Checkpoint, prefix: str):
+    '''Sets state of the global random module written by python_random_arrays()'''
+    gauss_next = float(checkpoint[prefix + '_gauss'])
+    random.setstate((
+        int(checkpoint[prefix + '_version']), tuple(checkpoint[prefix + '_state'].tolist()),
+        None if np.isnan(gauss_next) else gauss_next
+    ))
+
+
+def seed_sequence_arrays(seed_sequence: np.random.SeedSequence, prefix: str) -> Dict[str, np.ndarray]:
+    '''Returns SeedSequence and the number of its spawned children as arrays named by prefix'''
+    # Entropy may be larger than any numpy integer
+    return {
+        prefix + '_entropy': np.array(str(seed_sequence.entropy)),
+        prefix + '_spawn_key': np.array(seed_sequence.spawn_key, dtype=np.int64),
+        prefix + '_spawned': np.array(seed_sequence.n_children_spawned)
+    }
+
+
+def restore_seed_sequence(checkpoint: Checkpoint, prefix: str) -> np.random.SeedSequence:
+    '''Returns SeedSequence written by seed_sequence_arrays(), it spawns the same children as the saved one'''
+    return np.random.SeedSequence(
+        int(str(checkpoint[prefix + '_entropy'])), spawn_key=tuple(checkpoint[prefix + '_spawn_key'].tolist()),
+        n_children_spawned=int(checkpoint[prefix + '_spawned'])
+    )
@@ -1,21 +1,69 @@
-import heapq
 import random
-from typing import Tuple, List, Optional
+from typing import Optional, Tuple
+
+import numpy as np
 
-from gaps.image_analysis import ImageAnalysis
 from gaps.individual import Individual
+from gaps.instrumentation import Instrumentation
+from gaps.priority_queue import PriorityQueue
 
 SHARED_PIECE_PRIORITY = -10
 BUDDY_PIECE_PRIORITY = -1
 
+# Orientations in order of columns of Individual.neighbours(), with offsets of neighbouring positions
+ORIENTATIONS = ('T', 'R', 'D', 'L')
+ORIENTATION_INDICES = {orientation: index for index, orientation in enumerate(ORIENTATIONS)}
+OFFSETS = ((-1, 0), (0, 1), (1, 0), (0, -1))
+
 
 class Crossover(object):
+    '''Builds a child of two parents by growing a kernel of pieces.
+
+    Pieces are placed one at a time, starting from a random piece of the first parent.
+    Each free position next to the kernel gets a candidate piece: a piece both parents
+    agree on, a best buddy one of the parents has there, or the best available match.
+    The candidate with the highest priority is placed next.
+
+    State is kept in flat arrays indexed by piece id or by position: neighbour tables
+    of both parents, placed pieces and an occupancy grid large enough for the kernel
+    to grow from its root in any direction.
+
+    Every free boundary (placed piece and orientation) has one entry in an indexed
+    priority queue. When a piece is placed, entries of its position are removed from
+    the queue. Entries proposing a piece placed elsewhere keep their priority, which
+    is a lower bound of the one of their next candidate, and get the next candidate
+    when they reach the top. Best matches are looked up with a cursor per boundary, which only
+    moves forward past placed pieces, so a row of best matches is scanned once per child.
+
+    :param first_parent:  Individual
+    :param second_parent: Individual of the same puzzle, best matches are read from the analysis of the first one
+    :param random_state:  random.Random choosing the root piece, global random state by default.
+
+    Usage::
+
+        >>> from gaps.crossover import Crossover
+        >>> crossover = Crossover(first_parent, second_parent)
+        >>> crossover.run()
+        >>> child = crossover.child()
+
+    '''
 
-    def __init__(self, first_parent: Individual, second_parent: Individual):
+    def __init__(
+        self, first_parent: Individual, second_parent: Individual, random_state: Optional[random.Random] = None
+    ):
         self._parents = (first_parent, second_parent)
-        self._pieces_length = len(first_parent.pieces)
+        self._random = random if random_state is None else random_state
+        self._pieces_length = len(first_parent.permutation)
         self._child_rows = first_parent.rows
         self._child_columns = first_parent.columns
+        analysis = first_parent.analysis
+        self._best_match_table = analysis.best_match_table
+
+        # Neighbours of both parents, piece * 4 + orientation index => piece id or -1
+        self._first_neighbours = first_parent.neighbours().ravel().tolist()
+        self._second_neighbours = second_parent.neighbours().ravel().tolist()
+        # Best buddies computed by image analysis, in the same layout
+        self._buddies = analysis.best_buddies.ravel().tolist()
 
         # Borders of growing kernel
         self._min_row = 0
@@ -23,161 +71,196 @@ class Crossover(object):
         self._min_column = 0
         self._max_column = 0
 
-        self._kernel = {}
-        self._taken_positions = set()
-
-        # Priority queue
-        self._candidate_pieces = []
+        # Root is at (0, 0), so the kernel spans rows 1 - rows ... rows - 1 of the occupancy grid
+        self._grid_width = 2 * self._child_columns - 1
+        self._taken_positions = bytearray((2 * self._child_rows - 1) * self._grid_width)
+        self._placed = bytearray(self._pieces_length)
+        self._kernel_rows = [0] * self._pieces_length
+        self._kernel_columns = [0] * self._pieces_length
+        self._kernel_size = 0
+        self._boundary_offsets = [
+            (orientation, row_offset, column_offset, row_offset * self._grid_width + column_offset)
+            for orientation, (row_offset, column_offset) in zip(ORIENTATIONS, OFFSETS)
+        ]
+
+        # Boundary (relative piece * 4 + orientation index) => (priority, row, column, piece,
+        # relative piece, orientation), so ties are broken by position, then by pieces
+        self._candidate_pieces = PriorityQueue()
+        # Position in occupancy grid => boundaries there
+        self._position_boundaries = {}
+
+        # Best matches of each boundary as lists and index of the first one which may be free
+        self._best_matches = {}
+        self._cursors = {}
+
+        # Candidates found placed when they reached the top of the queue, pieces placed
+        # by priority of their candidate and candidates looked up in best match rows
+        self._stale_candidates = 0
+        self._placements = {SHARED_PIECE_PRIORITY: 0, BUDDY_PIECE_PRIORITY: 0}
+        self._best_match_lookups = 0
 
     def child(self) -> Individual:
-        pieces = [None] * self._pieces_length
+        rows = np.array(self._kernel_rows) - self._min_row
+        columns = np.array(self._kernel_columns) - self._min_column
 
-        for piece, (row, column) in self._kernel.items():
-            index = (row - self._min_row) * self._child_columns + (column - self._min_column)
-            pieces[index] = self._parents[0].piece_by_id(piece)
+        permutation = np.empty(self._pieces_length, dtype=np.int32)
+        permutation[rows * self._child_columns + columns] = np.arange(self._pieces_length, dtype=np.int32)
 
-        return Individual(pieces, self._child_rows, self._child_columns, shuffle=False)
+        return self._parents[0].with_permutation(permutation)
 
     def run(self):
         self._initialize_kernel()
 
         while len(self._candidate_pieces) > 0:
-            _, (position, piece_id), relative_piece = heapq.heappop(self._candidate_pieces)
-
-            if position in self._taken_positions:
-                continue
+            _, (priority, row, column, piece_id, relative_piece, orientation) = self._candidate_pieces.pop()
 
             # If piece is already placed, find new piece candidate and put it back to
-            # priority queue
-            if piece_id in self._kernel:
-                self.add_piece_candidate(
-                    relative_piece[0], relative_piece[1], position)
+            # priority queue. Its former priority was a lower bound of the new one.
+            if self._placed[piece_id]:
+                self._stale_candidates += 1
+                self.add_piece_candidate(relative_piece, orientation, (row, column))
                 continue
 
-            self._put_piece_to_kernel(piece_id, position)
+            if priority in self._placements:
+                self._placements[priority] += 1
+            self._put_piece_to_kernel(piece_id, row, column)
+
+        if Instrumentation.enabled:
+            self._report()
+
+    def _report(self):
+        '''Adds counters of this crossover to instrumentation'''
+        shared, buddies = self._placements[SHARED_PIECE_PRIORITY], self._placements[BUDDY_PIECE_PRIORITY]
+        for name, value in (
+            ('heap_pushes', self._candidate_pieces.pushes),
+            ('heap_pops', self._candidate_pieces.pops),
+            ('stale_candidates', self._stale_candidates),
+            ('shared_placements', shared),
+            ('buddy_placements', buddies),
+            # The root is placed without a candidate
+            ('best_match_placements', self._kernel_size - 1 - shared - buddies),
+            ('best_match_lookups', self._best_match_lookups)
+        ):
+            Instrumentation.count(name, value)
 
     def _initialize_kernel(self):
         # choose a root piece
-        root_piece = self._parents[0].pieces[random.randint(0, self._pieces_length - 1)]
-        self._put_piece_to_kernel(root_piece.id, (0, 0))
+        root_piece = int(self._parents[0].permutation[self._random.randint(0, self._pieces_length - 1)])
+        self._put_piece_to_kernel(root_piece, 0, 0)
 
-    def _put_piece_to_kernel(self, piece_id: int, position: Tuple[int, int]):
+    def _put_piece_to_kernel(self, piece_id: int, row: int, column: int):
         # put the piece into table
-        self._kernel[piece_id] = position
-        self._taken_positions.add(position)
-        self._update_candidate_pieces(piece_id, position)
+        self._placed[piece_id] = 1
+        self._kernel_rows[piece_id] = row
+        self._kernel_columns[piece_id] = column
+        self._kernel_size += 1
+        position_index = self._grid_index(row, column)
+        self._taken_positions[position_index] = 1
 
-    def _update_candidate_pieces(self, piece_id: int, position: Tuple[int, int]):
-        available_boundaries = self._available_boundaries(position)
-
-        for orientation, position in available_boundaries:
-            self.add_piece_candidate(piece_id, orientation, position)
-
-    def add_piece_candidate(self, piece_id: int, orientation: str, position: Tuple[int, int]):
-        shared_piece = self._get_shared_piece(piece_id, orientation)
-        if self._is_valid_piece(shared_piece):
-            self._add_shared_piece_candidate(
-                shared_piece, position, (piece_id, orientation)
-            )
-            return
+        # Candidates for the position are not needed anymore
+        for boundary in self._position_boundaries.pop(position_index, ()):
+            self._candidate_pieces.remove(boundary)
 
-        buddy_piece = self._get_buddy_piece(piece_id, orientation)
-        if self._is_valid_piece(buddy_piece):
-            self._add_buddy_piece_candidate(
-                buddy_piece, position, (piece_id, orientation)
-            )
-            return
+        self._update_candidate_pieces(piece_id, row, column)
 
-        best_match_piece, priority = self._get_best_match_piece(piece_id, orientation)
-        if self._is_valid_piece(best_match_piece):
-            self._add_best_match_piece_candidate(
-                best_match_piece, position, priority, (piece_id, orientation)
-            )
+    def _update_candidate_pieces(self, piece_id: int, row: int, column: int):
+        if self._is_kernel_full():
             return
 
-    def _get_shared_piece(self, piece_id: int, orientation: str) -> Optional[int]:
-        first_parent, second_parent = self._parents
-        first_parent_edge = first_parent.edge(piece_id, orientation)
-        second_parent_edge = second_parent.edge(piece_id, orientation)
-
-        if first_parent_edge == second_parent_edge:
-            return first_parent_edge
-
-    def _get_buddy_piece(self, piece_id: int, orientation: str) -> Optional[int]:
-        first_buddy = ImageAnalysis.best_match(piece_id, orientation)
-        second_buddy = ImageAnalysis.best_match(first_buddy, complementary_orientation(orientation))
-
-        if second_buddy == piece_id:
-            for edge in [parent.edge(piece_id, orientation) for parent in self._parents]:
-                if edge == first_buddy:
-                    return edge
-
-    def _get_best_match_piece(self, piece_id: int, orientation: str) -> Tuple[int, float]:
-        for piece, dissimilarity_measure in ImageAnalysis.best_match_table[piece_id][orientation]:
-            if self._is_valid_piece(piece):
-                return piece, dissimilarity_measure
-
-    def _add_shared_piece_candidate(self, piece_id: int, position: str, relative_piece: Tuple[int, str]):
-        piece_candidate = (SHARED_PIECE_PRIORITY, (position, piece_id), relative_piece)
-        heapq.heappush(self._candidate_pieces, piece_candidate)
-
-    def _add_buddy_piece_candidate(self, piece_id: int, position: str, relative_piece: Tuple[int, str]):
-        piece_candidate = (BUDDY_PIECE_PRIORITY, (position, piece_id), relative_piece)
-        heapq.heappush(self._candidate_pieces, piece_candidate)
+        index = self._grid_index(row, column)
+        for orientation_index, (orientation, row_offset, column_offset, index_offset) in enumerate(
+            self._boundary_offsets
+        ):
+            # Kernel always contains the root at (0, 0), so its size is max - min + 1
+            boundary_row, boundary_column = row + row_offset, column + column_offset
+            min_row, max_row = min(self._min_row, boundary_row), max(self._max_row, boundary_row)
+            min_column, max_column = min(self._min_column, boundary_column), max(self._max_column, boundary_column)
+            if max_row - min_row >= self._child_rows or max_column - min_column >= self._child_columns:
+                continue
+            if self._taken_positions[index + index_offset]:
+                continue
 
-    def _add_best_match_piece_candidate(self, piece_id: int, position: str, priority: float, relative_piece: Tuple[int, str]):
-        piece_candidate = (priority, (position, piece_id), relative_piece)
-        heapq.heappush(self._candidate_pieces, piece_candidate)
+            self._min_row, self._max_row, self._min_column, self._max_column = min_row, max_row, min_column, max_column
+            self._position_boundaries.setdefault(index + index_offset, []).append(piece_id * 4 + orientation_index)
+            self.add_piece_candidate(piece_id, orientation, (boundary_row, boundary_column))
 
-    def _available_boundaries(self, row_and_column: Tuple[int, int]) -> List[Tuple[str, Tuple[int, int]]]:
-        (row, column) = row_and_column
-        boundaries = []
+    def add_piece_candidate(self, piece_id: int, orientation: str, position: Tuple[int, int]):
+        index = piece_id * 4 + ORIENTATION_INDICES[orientation]
+
+        piece = self._get_shared_piece(index)
+        priority = SHARED_PIECE_PRIORITY
+        if not self._is_valid_piece(piece):
+            piece = self._get_buddy_piece(index)
+            priority = BUDDY_PIECE_PRIORITY
+        if not self._is_valid_piece(piece):
+            piece, priority = self._get_best_match_piece(piece_id, orientation, index)
+        if not self._is_valid_piece(piece):
+            self._candidate_pieces.remove(index)
+            return
 
-        if not self._is_kernel_full():
-            positions = {
-                'T': (row - 1, column),
-                'R': (row, column + 1),
-                'D': (row + 1, column),
-                'L': (row, column - 1)
-            }
+        self._candidate_pieces.push(index, (priority, position[0], position[1], piece, piece_id, orientation))
 
-            for orientation, position in positions.items():
-                if position not in self._taken_positions and self._is_in_range(position):
-                    self._update_kernel_boundaries(position)
-                    boundaries.append((orientation, position))
+    def _get_shared_piece(self, index: int) -> int:
+        first_parent_edge = self._first_neighbours[index]
 
-        return boundaries
+        if first_parent_edge == self._second_neighbours[index]:
+            return first_parent_edge
+        return -1
+
+    def _get_buddy_piece(self, index: int) -> int:
+        buddy = self._buddies[index]
+
+        if buddy >= 0 and (self._first_neighbours[index] == buddy or self._second_neighbours[index] == buddy):
+            return buddy
+        return -1
+
+    def _get_best_match_piece(self, piece_id: int, orientation: str, index: int) -> Tuple[int, float]:
+        best_match_table = self._best_match_table
+        self._best_match_lookups += 1
+
+        # Look at top matches first, all matches are sorted only when top ones are used up
+        best_matches = self._best_matches.get(index)
+        if best_matches is None:
+            pieces, dissimilarity_measures = best_match_table.row(piece_id, orientation)
+            best_matches = (pieces.tolist(), dissimilarity_measures.tolist())
+            self._best_matches[index] = best_matches
+        pieces, dissimilarity_measures = best_matches
+
+        # Placed pieces stay placed, so the cursor never has to go back
+        cursor = self._cursors.get(index, 0)
+        while True:
+            while cursor < len(pieces) and self._placed[pieces[cursor]]:
+                cursor += 1
+            if cursor < len(pieces) or len(pieces) >= self._pieces_length - 1:
+                break
+            # Next matches are taken in chunks of growing size, so only the scanned part is converted
+            all_pieces, all_dissimilarity_measures = best_match_table.full_row(piece_id, orientation)
+            chunk = slice(len(pieces), 2 * len(pieces) + 1)
+            pieces.extend(all_pieces[chunk].tolist())
+            dissimilarity_measures.extend(all_dissimilarity_measures[chunk].tolist())
+        self._cursors[index] = cursor
+
+        if cursor < len(pieces):
+            return pieces[cursor], dissimilarity_measures[cursor]
+        return -1, 0.0
+
+    def _grid_index(self, row: int, column: int) -> int:
+        return (row + self._child_rows - 1) * self._grid_width + column + self._child_columns - 1
 
     def _is_kernel_full(self) -> bool:
-        return len(self._kernel) == self._pieces_length
+        return self._kernel_size == self._pieces_length
 
-    def _is_in_range(self, row_and_column: Tuple[int, int]) -> bool:
-        (row, column) = row_and_column
-        return self._is_row_in_range(row) and self._is_column_in_range(column)
-
-    def _is_row_in_range(self, row: int) -> bool:
-        current_rows = abs(min(self._min_row, row)) + abs(max(self._max_row, row))
-        return current_rows < self._child_rows
-
-    def _is_column_in_range(self, column: int) -> bool:
-        current_columns = abs(min(self._min_column, column)) + abs(max(self._max_column, column))
-        return current_columns < self._child_columns
+    def _is_valid_piece(self, piece_id: int) -> bool:
+        return piece_id >= 0 and not self._placed[piece_id]
 
-    def _update_kernel_boundaries(self, row_and_column: Tuple[int, int]):
-        (row, column) = row_and_column
-        self._min_row = min(self._min_row, row)
-        self._max_row = max(self._max_row, row)
-        self._min_column = min(self._min_column, column)
-        self._max_column = max(self._max_column, column)
 
-    def _is_valid_piece(self, piece_id: int) -> bool:
-        return piece_id is not None and piece_id not in self._kernel
+COMPLEMENTARY_ORIENTATIONS = {
+    'T': 'D',
+    'R': 'L',
+    'D': 'T',
+    'L': 'R'
+}
 
 
 def complementary_orientation(orientation: str) -> str:
-    return {
-        'T': 'D',
-        'R': 'L',
-        'D': 'T',
-        'L': 'R'
-    }.get(orientation, None)
+    return COMPLEMENTARY_ORIENTATIONS.get(orientation, None)
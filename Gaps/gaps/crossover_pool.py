@@ -0,0 +1,109 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from gaps.crossover import Crossover
+from gaps.image_analysis import Analysis, ImageAnalysis
+from gaps.individual import Individual
+
+# State of crossover worker processes set by _initialize_worker
+_worker = {}
+
+
+class CrossoverPool(object):
+    '''Pool of processes building children of pairs of parents.
+
+    Workers attach to the image analysis once, when they start (see Analysis.share),
+    so every generation only parents' and children's permutations travel between processes.
+    Root piece of every child is drawn from its own seed, so children do not depend on
+    which worker builds them or on the number of workers.
+
+    The image must be analyzed before the pool is created.
+
+    :param workers:  Number of worker processes.
+    :param rows:     Number of rows in input puzzle
+    :param columns:  Number of columns in input puzzle
+    :param analysis: Analysis of the puzzle, the process-wide ImageAnalysis.current() if None.
+
+    Usage::
+
+        >>> from gaps.crossover_pool import CrossoverPool
+        >>> with CrossoverPool(4, rows, columns, analysis) as pool:
+        ...     children = pool.children(first_parents, second_parents, seeds)
+
+    '''
+
+    def __init__(self, workers: int, rows: int, columns: int, analysis: Optional[Analysis] = None):
+        self.workers = workers
+        if analysis is None:
+            analysis = ImageAnalysis.current()
+        self._specification, self._shared = analysis.share()
+        self._executor = ProcessPoolExecutor(
+            workers, initializer=_initialize_worker, initargs=(self._specification, rows, columns)
+        )
+
+    def __enter__(self) -> 'CrossoverPool':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def children(self, first_parents: np.ndarray, second_parents: np.ndarray, seeds: Sequence[int]) -> np.ndarray:
+        '''Returns permutations of children of each pair of parents
+
+        :params first_parents:  Permutations of first parents, shape (K, N).
+        :params second_parents: Permutations of second parents, shape (K, N).
+        :params seeds:          Seed of random state of each child.
+
+        '''
+        seeds = np.asarray(seeds, dtype=np.uint64)
+        if len(seeds) == 0:
+            return np.empty((0, first_parents.shape[1]), dtype=np.int32)
+
+        # A few chunks per worker, so that workers finish at about the same time
+        chunks = np.array_split(np.arange(len(seeds)), min(len(seeds), 4 * self.workers))
+        return np.concatenate(list(self._executor.map(
+            _build_children,
+            [first_parents[chunk] for chunk in chunks],
+            [second_parents[chunk] for chunk in chunks],
+            [seeds[chunk] for chunk in chunks]
+        )))
+
+    def close(self):
+        '''Stops workers and releases shared analysis'''
+        self._executor.shutdown()
+        if self._shared is not None:
+            self._shared.unlink()
+            self._shared.close()
+            self._shared = None
+
+
+def build_child(first_parent: Individual, second_parent: Individual, seed: Optional[int] = None) -> Individual:
+    '''Returns child of given parents, root piece is drawn from given seed or from the global random state'''
+    random_state = None if seed is None else random.Random(int(seed))
+    crossover = Crossover(first_parent, second_parent, random_state)
+    crossover.run()
+    return crossover.child()
+
+
+def _initialize_worker(specification: dict, rows: int, columns: int):
+    '''Attaches crossover worker process to shared analysis'''
+    _worker['analysis'] = Analysis.attach(specification)
+    _worker['rows'] = rows
+    _worker['columns'] = columns
+
+
+def _build_children(first_parents: np.ndarray, second_parents: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    '''Builds children of a chunk of pairs of parents in crossover worker process'''
+    rows, columns, analysis = _worker['rows'], _worker['columns'], _worker['analysis']
+    children: List[np.ndarray] = []
+    for first_parent, second_parent, seed in zip(first_parents, second_parents, seeds):
+        child = build_child(
+            Individual(None, rows, columns, shuffle=False, permutation=first_parent, analysis=analysis),
+            Individual(None, rows, columns, shuffle=False, permutation=second_parent, analysis=analysis),
+            seed
+        )
+        children.append(child.permutation)
+    return np.stack(children)
@@ -36,19 +36,86 @@ def dissimilarity_measure(first: Piece, second: Piece, method: str = 'Mahalanobi
             color_diff = first.bottom - second.top
 
     elif method == 'Mahalanobis':
+        # Only the per-pixel quadratic forms (the diagonal of l_to_r @ sigma_inv @ l_to_r.T) are computed,
+        # see mahalanobis_dissimilarity_matrix for the reduction.
         if orientation == 'LR':
             # l_to_r.shape = (piece_size, 3)
             l_to_r = (second.left - first.right) - first.mu_right
-            diff_lr = l_to_r @ first.sigma_right_inv @ l_to_r.T
-            diff_rl = l_to_r @ second.sigma_left_inv @ l_to_r.T
-            color_diff = diff_lr + diff_rl
+            sigma_inv = first.sigma_right_inv + second.sigma_left_inv
+            color_diff = np.einsum('ij,jk,ik->i', l_to_r, sigma_inv, l_to_r)
         elif orientation == 'TD':
             # t_to_d.shape = (piece_size, 3)
             t_to_d = (second.top - first.bottom) - first.mu_bottom
-            diff_td = t_to_d @ first.sigma_bottom_inv @ t_to_d.T
-            diff_dt = t_to_d @ second.sigma_top_inv @ t_to_d.T
-            color_diff = diff_td + diff_dt
+            sigma_inv = first.sigma_bottom_inv + second.sigma_top_inv
+            color_diff = np.einsum('ij,jk,ik->i', t_to_d, sigma_inv, t_to_d)
 
     squared_color_difference = np.power(color_diff / 255.0, 2)
     value = np.sqrt(np.sum(squared_color_difference))
     return value
+
+
+def l2_dissimilarity_matrix(first_edges: np.ndarray, second_edges: np.ndarray) -> np.ndarray:
+    '''Calculates L2 dissimilarity measure between every pair of edges at once.
+
+    Element [i, j] of the result equals ``dissimilarity_measure(first_i, second_j, 'L2', orientation)``,
+    where ``first_edges`` hold right (bottom) edges and ``second_edges`` hold left (top) edges of pieces.
+    The squared distance ||a - b||^2 is expanded into ||a||^2 + ||b||^2 - 2 a.b, so the heavy lifting is a
+    single matrix product.
+
+    :params first_edges:  Stacked edges of first pieces, shape (M, piece_size, 3).
+    :params second_edges: Stacked edges of second pieces, shape (N, piece_size, 3).
+
+    Usage::
+
+        >>> from gaps.fitness import l2_dissimilarity_matrix
+        >>> lr = l2_dissimilarity_matrix(right_edges, left_edges)
+
+    '''
+    first = first_edges.reshape(len(first_edges), -1).astype(np.float64)
+    second = second_edges.reshape(len(second_edges), -1).astype(np.float64)
+
+    squared_distance = (
+        np.einsum('ij,ij->i', first, first)[:, np.newaxis]
+        + np.einsum('ij,ij->i', second, second)[np.newaxis, :]
+        - 2.0 * (first @ second.T)
+    )
+    # Rounding can push distances of identical edges slightly below zero
+    np.maximum(squared_distance, 0.0, out=squared_distance)
+    return np.sqrt(squared_distance) / 255.0
+
+
+def mahalanobis_dissimilarity_matrix(
+    first_edges: np.ndarray, first_mu: np.ndarray, first_sigma_inv: np.ndarray,
+    second_edges: np.ndarray, second_sigma_inv: np.ndarray
+) -> np.ndarray:
+    '''Calculates Mahalanobis (MGC-style) dissimilarity measure between every pair of edges at once.
+
+    For pieces i, j and every boundary pixel k the gradient across the boundary is compared with the
+    mean gradient of piece i near that edge, d_k = (second_j[k] - first_i[k]) - mu_i, and only its
+    per-pixel quadratic form is evaluated:
+
+        q_k = d_k (sigma_inv_i + sigma_inv_j) d_k^T
+
+    The reduction is D(i, j) = sqrt(sum_k (q_k / 255)^2), i.e. the same outer reduction as L2 applied to
+    the diagonal of d @ sigma_inv @ d.T. Cross-pixel terms are never formed, so the cost per pair is
+    O(piece_size) instead of O(piece_size^2). Element [i, j] equals
+    ``dissimilarity_measure(first_i, second_j, 'Mahalanobis', orientation)``.
+
+    :params first_edges:      Stacked right (bottom) edges of first pieces, shape (M, piece_size, 3).
+    :params first_mu:         Mean gradients near those edges, shape (M, 3).
+    :params first_sigma_inv:  Inverse covariances of those gradients, shape (M, 3, 3).
+    :params second_edges:     Stacked left (top) edges of second pieces, shape (N, piece_size, 3).
+    :params second_sigma_inv: Inverse covariances of gradients near those edges, shape (N, 3, 3).
+
+    Usage::
+
+        >>> from gaps.fitness import mahalanobis_dissimilarity_matrix
+        >>> lr = mahalanobis_dissimilarity_matrix(right, mu_right, sigma_right_inv, left, sigma_left_inv)
+
+    '''
+    # gradients.shape = (M, N, piece_size, 3)
+    gradients = second_edges[np.newaxis, :] - (first_edges + first_mu[:, np.newaxis, :])[:, np.newaxis]
+    sigma_inv = first_sigma_inv[:, np.newaxis] + second_sigma_inv[np.newaxis, :]
+
+    quadratic_forms = np.einsum('ijkc,ijkc->ijk', np.matmul(gradients, sigma_inv), gradients)
+    return np.sqrt(np.einsum('ijk,ijk->ij', quadratic_forms, quadratic_forms)) / 255.0
@@ -1,98 +1,395 @@
-from operator import attrgetter
-from typing import List
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 from time import time
 
 from gaps import image_helpers
-from gaps.selection import roulette_selection
-from gaps.crossover import Crossover
+from gaps.analysis_cache import AnalysisCache
+from gaps.best_match_table import BestMatchTable
+from gaps.checkpoint import (
+    Checkpoint, python_random_arrays, random_state_arrays, restore_python_random, restore_random_state,
+    restore_seed_sequence, seed_sequence_arrays
+)
+from gaps.selection import SELECTIONS
+from gaps.crossover_pool import CrossoverPool, build_child
 from gaps.individual import Individual
-from gaps.image_analysis import ImageAnalysis
-from gaps.plot import Plot
+from gaps.image_analysis import Analysis
+from gaps.instrumentation import Instrumentation
+from gaps.local_search import LocalSearch
+from gaps.piece_set import PieceSet
+from gaps.population import Population
 from gaps.progress_bar import print_progress
+from gaps.renderer import Renderer, WindowRenderer
 
 import numpy as np
 
 
+def analyze_image(
+    pieces: PieceSet, method: str, dtype: np.dtype = np.float64, memory_budget: int = Analysis.MEMORY_BUDGET,
+    analysis_file: Optional[str] = None, cache_dir: Optional[str] = None, rebuild_cache: bool = False,
+    workers: int = 1
+) -> Analysis:
+    '''Analyzes image of given pieces (or loads the analysis from cache directory), reports and returns it'''
+    t_start = time()
+    with Instrumentation.timer('analysis'):
+        if cache_dir is None:
+            analysis = Analysis.analyze(
+                pieces, method, dtype, memory_budget=memory_budget, path=analysis_file, workers=workers
+            )
+        else:
+            analysis, loaded = AnalysisCache(cache_dir).load_or_analyze(
+                pieces, method, dtype, memory_budget=memory_budget, workers=workers, rebuild=rebuild_cache
+            )
+            if loaded:
+                print('=== Analysis loaded from cache')
+    print('=== Analysis time: {}s'.format(time() - t_start))
+    print('=== Best buddies:  {:.1%} of edges'.format(analysis.buddy_fraction()))
+    return analysis
+
+
+class Generation(NamedTuple):
+    '''Snapshot of evolution after one generation'''
+    # Number of evolved generations
+    generation: int
+    # Fitness of the best individual so far and mean fitness of the evolved generation
+    best_fitness: float
+    mean_fitness: float
+    # Arrangement of the best individual so far
+    best_permutation: np.ndarray
+    # Seconds since evolution started, image analysis excluded
+    elapsed: float
+    # Generations without improvement of the best fitness
+    stalled: int
+    # Seconds spent in each phase and counted events of this generation, see Instrumentation.
+    # Empty unless instrumentation is enabled.
+    timers: Dict[str, float] = {}
+    counters: Dict[str, int] = {}
+
+
 class GeneticAlgorithm(object):
-    '''Genetic algorithm for puzzle solving'''
+    '''Genetic algorithm for puzzle solving
+
+    Every run owns the analysis of its puzzle, so runs of different puzzles may evolve in
+    threads of one process. An analysis made by a previous run (see analysis) or by
+    Analysis.analyze can be given to runs of the same puzzle and method, they then skip the analysis.
+
+    Usage::
+
+        >>> from gaps.genetic_algorithm import GeneticAlgorithm
+        >>> first = GeneticAlgorithm(image, 32, 200, 20, 'L2', seed=1)
+        >>> first.start_evolution(verbose=False)
+        >>> second = GeneticAlgorithm(image, 32, 200, 20, 'L2', seed=2, analysis=first.analysis)
+
+    '''
     TERMINATION_THRESHOLD = 3
 
+    # Individuals improved by local search: none, elites of every generation or the final solution only
+    LOCAL_SEARCH = ('none', 'elites', 'final')
+
     def __init__(
-        self, image: np.ndarray, piece_size: int, population_size: int, generations: int, method: str, elite_size: int = 2
+        self, image: np.ndarray, piece_size: int, population_size: int, generations: int, method: str, elite_size: int = 2,
+        dtype: np.dtype = np.float64, memory_budget: int = Analysis.MEMORY_BUDGET,
+        analysis_file: Optional[str] = None, cache_dir: Optional[str] = None, rebuild_cache: bool = False,
+        workers: int = 1, local_search: str = 'none', seed: Optional[int] = None, selection: str = 'roulette',
+        checkpoint: Optional[str] = None, checkpoint_interval: int = 1, resume: bool = False,
+        analysis: Optional[Analysis] = None
     ):
+        if local_search not in self.LOCAL_SEARCH:
+            raise ValueError('Unknown local search {}, options: {}'.format(local_search, ', '.join(self.LOCAL_SEARCH)))
+        if selection not in SELECTIONS:
+            raise ValueError('Unknown selection {}, options: {}'.format(selection, ', '.join(SELECTIONS)))
+        if analysis_file is not None and cache_dir is not None:
+            raise ValueError('Measures are kept either in analysis_file or in cache_dir, not in both')
+
         self._image = image
         self._piece_size = piece_size
         self._generations = generations
         self._elite_size = elite_size
         self.method = method
-        pieces, rows, columns = image_helpers.flatten_image(
-            image, piece_size, indexed=True)
-        self._population = [Individual(pieces, rows, columns)
-                            for _ in range(population_size)]
+        self._dtype = dtype
+        self._memory_budget = memory_budget
+        self._analysis_file = analysis_file
+        self._cache_dir = cache_dir
+        self._rebuild_cache = rebuild_cache
+        self._workers = workers
+        self._local_search = local_search
+        self._selection = SELECTIONS[selection]
+        self._checkpoint = checkpoint
+        self._checkpoint_interval = max(1, checkpoint_interval)
+
+        # With a seed, every random choice comes from it and each child gets a seed of its own,
+        # so results depend neither on global random state nor on the number of workers.
+        # Without one, global random state is used, children in worker processes get fresh seeds.
+        if seed is not None:
+            self._seed_sequence = np.random.SeedSequence(seed)
+            self._random_state = np.random.RandomState(np.random.MT19937(self._seed_sequence.spawn(1)[0]))
+        else:
+            self._seed_sequence = np.random.SeedSequence() if workers > 1 else None
+            self._random_state = None
+
+        self._local_search_stage = LocalSearch(random_state=self._random_state)
+        with Instrumentation.timer('pieces'):
+            pieces, rows, columns = image_helpers.flatten_image(
+                image, piece_size, indexed=True)
+        self._analysis = analysis
+        self._population = Population.random(pieces, rows, columns, population_size, self._random_state, analysis)
         self._pieces = pieces
+        # Number of evolved generations, generations without improvement
+        # and the best individual of all evolved generations
+        self._generation = 0
+        self._termination_counter = 0
+        self._fittest: Optional[Individual] = None
+        self._key: Optional[str] = None
+
+        if resume and checkpoint is not None and os.path.exists(os.path.expanduser(checkpoint)):
+            self._load_checkpoint(checkpoint)
+
+    @property
+    def analysis(self) -> Optional[Analysis]:
+        '''Analysis of the puzzle, None until evolution starts unless it was given'''
+        return self._analysis
+
+    def start_evolution(self, verbose: bool, renderer: Optional[Renderer] = None) -> Individual:
+        '''Evolves population and returns the solution
 
-    def start_evolution(self, verbose: bool):
+        :params verbose:  Show the best individual of every generation in a window.
+        :params renderer: Renderer of the best individual of every generation, e.g. FrameWriter.
+                          It is not closed. With verbose and no renderer, a WindowRenderer is used.
+
+        '''
         print('=== Pieces:        {}\n'.format(len(self._pieces)))
 
+        window = None
+        if verbose and renderer is None:
+            window = renderer = WindowRenderer(self._image, self._piece_size)
+
+        try:
+            for snapshot in self.evolve():
+                print_progress(snapshot.generation, self._generations, prefix='=== Solving puzzle: ')
+
+                if snapshot.stalled == self.TERMINATION_THRESHOLD:
+                    print('\n\n=== GA terminated')
+                    print('=== There was no improvement for {} generations'.format(
+                        self.TERMINATION_THRESHOLD))
+                elif renderer is not None:
+                    with Instrumentation.timer('rendering'):
+                        renderer.show(
+                            snapshot.generation, snapshot.best_permutation,
+                            'Generation: {} / {}, fitness = {:.2f}'.format(
+                                snapshot.generation, self._generations, snapshot.best_fitness
+                            )
+                        )
+        finally:
+            if window is not None:
+                window.close()
+
+        return self.solution()
+
+    def evolve(self) -> Iterator[Generation]:
+        '''Evolves population and yields a snapshot after every generation.
+
+        Image is analyzed when the first snapshot is requested. Evolution stops after the given number
+        of generations or when the best fitness did not improve for TERMINATION_THRESHOLD generations.
+        Caller may stop iterating at any time, solution() then returns the best individual so far.
+
+        Usage::
+
+            >>> from gaps.genetic_algorithm import GeneticAlgorithm
+            >>> algorithm = GeneticAlgorithm(image, 32, 200, 20, 'L2')
+            >>> for snapshot in algorithm.evolve():
+            ...     if snapshot.best_fitness > target:
+            ...         break
+            >>> solution = algorithm.solution()
+
+        '''
+        if self._analysis is None:
+            self._analysis = analyze_image(
+                self._pieces, self.method, self._dtype, self._memory_budget, self._analysis_file, self._cache_dir,
+                self._rebuild_cache, self._workers
+            )
+            Instrumentation.emit(generation=0)
+
+            # Population (and the best individual of a checkpoint) were created before the analysis
+            self._population = self._next_population(self._population.permutations)
+            if self._fittest is not None:
+                self._fittest = self._population[0].with_permutation(self._fittest.permutation)
+
+        # Workers start after analysis, so that they attach to it. Pool is closed even when
+        # the caller stops iterating, since closing the generator exits the with block.
+        if self._workers > 1:
+            with CrossoverPool(
+                self._workers, self._population.rows, self._population.columns, self._analysis
+            ) as pool:
+                yield from self._evolve(pool)
+        else:
+            yield from self._evolve()
+
+    def solution(self) -> Individual:
+        '''Returns the best individual found so far, improved by local search if it was asked for'''
+        if self._fittest is None:
+            return self._improve_solution(self._best_individual())
+        return self._improve_solution(self._fittest)
+
+    def _evolve(self, pool: Optional[CrossoverPool] = None) -> Iterator[Generation]:
         t_start = time()
-        ImageAnalysis.analyze_image(self._pieces, self.method)
-        print('=== Analysis time: {}s'.format(time() - t_start))
 
-        fittest = None
-        best_fitness_score = np.NINF
-        termination_counter = 0
+        # A resumed run continues with counters of the checkpoint
+        while self._generation < self._generations and self._termination_counter < self.TERMINATION_THRESHOLD:
+            with Instrumentation.timer('fitness'):
+                mean_fitness = float(np.mean(self._population.fitness))
+            fittest = self.step(pool)
+            self._generation += 1
+
+            if self._fittest is not None and fittest.fitness <= self._fittest.fitness:
+                self._termination_counter += 1
+            # Elites keep the best individual, so the last fittest one is at least as fit as the ones before
+            if self._fittest is None or fittest.fitness >= self._fittest.fitness:
+                self._fittest = fittest
+
+            finished = (
+                self._generation == self._generations or self._termination_counter == self.TERMINATION_THRESHOLD
+            )
+            if self._checkpoint is not None and (finished or self._generation % self._checkpoint_interval == 0):
+                self._save_checkpoint(self._checkpoint)
+
+            elapsed = time() - t_start
+            # Whatever the caller does with a snapshot (e.g. rendering) is part of the next record
+            record = Instrumentation.emit(
+                generation=self._generation, best_fitness=self._fittest.fitness, mean_fitness=mean_fitness,
+                elapsed=elapsed
+            )
+            timers, counters = ({}, {}) if record is None else (record['timers'], record['counters'])
+            yield Generation(
+                self._generation, self._fittest.fitness, mean_fitness, self._fittest.permutation.copy(), elapsed,
+                self._termination_counter, timers, counters
+            )
+
+    def step(self, pool: Optional[CrossoverPool] = None) -> Individual:
+        '''Replaces population with the next generation.
+
+        The image must be analyzed first. Returns the fittest individual of the replaced generation.
+
+        :params pool: Pool of worker processes building children, children are built in this process if None.
+
+        '''
+        with Instrumentation.timer('fitness'):
+            self._population.fitness
+
+        # Elitism
+        elite = self._get_elite_individuals()
+        if self._local_search == 'elites':
+            with Instrumentation.timer('local_search'):
+                elite = [self._local_search_stage.run(individual) for individual in elite]
+
+        with Instrumentation.timer('selection'):
+            selected_parents = self._selection(
+                self._population, elites=self._elite_size, random_state=self._random_state)
+
+        with Instrumentation.timer('crossover'):
+            children = self._children(selected_parents, pool)
+        fittest = self._best_individual()
+        self._population = self._next_population(
+            np.array([individual.permutation for individual in elite] + list(children), dtype=np.int32)
+        )
+        return fittest
+
+    def emigrants(self, count: int) -> np.ndarray:
+        '''Returns permutations of 'count' fittest individuals of population, the fittest last'''
+        return self._population.permutations[self._population.elite_indices(count)]
 
-        if verbose:
-            plot = Plot(self._image)
+    def immigrate(self, permutations: np.ndarray):
+        '''Replaces the least fit individuals of population with individuals of given permutations'''
+        count = min(len(permutations), len(self._population))
+        if count == 0:
+            return
 
-        for generation in range(self._generations):
-            print_progress(generation, self._generations - 1, prefix='=== Solving puzzle: ')
+        fitness = self._population.fitness
+        least_fit = np.argpartition(fitness, count - 1)[:count]
+        population = self._population.permutations.copy()
+        population[least_fit] = permutations[len(permutations) - count:]
+        self._population = self._next_population(population)
 
-            new_population = []
+    def _save_checkpoint(self, path: str):
+        '''Writes population, counters, the best individual and states of random generators'''
+        arrays = {
+            'key': np.array(self._puzzle_key()),
+            'permutations': self._population.permutations,
+            'generation': np.array(self._generation),
+            'termination_counter': np.array(self._termination_counter),
+            'fittest': self._fittest.permutation if self._fittest is not None else np.empty(0, dtype=np.int32)
+        }
+        if self._random_state is not None:
+            arrays.update(random_state_arrays(self._random_state, 'random_state'))
+        else:
+            arrays.update(random_state_arrays(np.random, 'numpy_random'))
+            arrays.update(python_random_arrays('python_random'))
+        if self._seed_sequence is not None:
+            arrays.update(seed_sequence_arrays(self._seed_sequence, 'seed_sequence'))
+        Checkpoint(arrays).save(path)
 
-            # Elitism
-            elite = self._get_elite_individuals()
-            new_population.extend(elite)
+    def _load_checkpoint(self, path: str):
+        '''Continues evolution saved by _save_checkpoint'''
+        saved = Checkpoint.load(path)
+        if str(saved['key']) != self._puzzle_key():
+            raise ValueError('Checkpoint {} was written for another puzzle or method'.format(path))
 
-            selected_parents = roulette_selection(
-                self._population, elites=self._elite_size)
+        self._population = self._next_population(saved['permutations'])
+        self._generation = int(saved['generation'])
+        self._termination_counter = int(saved['termination_counter'])
+        if len(saved['fittest']) > 0:
+            self._fittest = self._population[0].with_permutation(saved['fittest'])
 
-            for first_parent, second_parent in selected_parents:
-                crossover = Crossover(first_parent, second_parent)
-                crossover.run()
-                child = crossover.child()
-                new_population.append(child)
+        # Random choices continue where they stopped, seeded or not
+        if self._random_state is not None and 'random_state_keys' in saved:
+            restore_random_state(self._random_state, saved, 'random_state')
+        elif self._random_state is None and 'numpy_random_keys' in saved:
+            restore_random_state(np.random, saved, 'numpy_random')
+            restore_python_random(saved, 'python_random')
+        if self._seed_sequence is not None and 'seed_sequence_entropy' in saved:
+            self._seed_sequence = restore_seed_sequence(saved, 'seed_sequence')
 
-            fittest = self._best_individual()
+    def _next_population(self, permutations: np.ndarray) -> Population:
+        '''Returns population of given permutations of pieces of the puzzle'''
+        return Population(
+            self._pieces, self._population.rows, self._population.columns, permutations, self._analysis
+        )
 
-            if fittest.fitness <= best_fitness_score:
-                termination_counter += 1
-            else:
-                best_fitness_score = fittest.fitness
+    def _puzzle_key(self) -> str:
+        '''Returns key identifying pieces and method the population evolves for'''
+        if self._key is None:
+            self._key = AnalysisCache.key(self._pieces, self.method, self._dtype, BestMatchTable.TOP_K)
+        return self._key
 
-            if termination_counter == self.TERMINATION_THRESHOLD:
-                print('\n\n=== GA terminated')
-                print('=== There was no improvement for {} generations'.format(
-                    self.TERMINATION_THRESHOLD))
-                return fittest
+    def _children(
+        self, selected_parents: List[Tuple[Individual, Individual]], pool: Optional[CrossoverPool] = None
+    ) -> np.ndarray:
+        '''Returns permutations of children of selected pairs of parents'''
+        seeds = [None] * len(selected_parents)
+        if self._seed_sequence is not None:
+            seeds = [child.generate_state(1)[0] for child in self._seed_sequence.spawn(len(selected_parents))]
 
-            self._population = new_population
+        if pool is not None:
+            first_parents, second_parents = (
+                np.array([parents[index].permutation for parents in selected_parents]).reshape(-1, len(self._pieces))
+                for index in range(2)
+            )
+            return pool.children(first_parents, second_parents, seeds)
 
-            if verbose:
-                plot.show_fittest(
-                    fittest.to_image(),
-                    'Generation: {} / {}, fitness = {:.2f}'.format(
-                        generation + 1, self._generations, fittest.fitness
-                    )
-                )
+        children = [
+            build_child(first_parent, second_parent, seed).permutation
+            for (first_parent, second_parent), seed in zip(selected_parents, seeds)
+        ]
+        return np.array(children, dtype=np.int32).reshape(-1, len(self._pieces))
 
+    def _improve_solution(self, fittest: Individual) -> Individual:
+        '''Returns final solution, improved by local search if it was asked for'''
+        if self._local_search == 'final':
+            return self._local_search_stage.run(fittest)
         return fittest
 
     def _get_elite_individuals(self) -> List[Individual]:
         '''Returns first 'elite_count' fittest individuals from population'''
-        # choose the last self._elite_size of the population
-        return sorted(self._population, key=attrgetter('fitness'))[-self._elite_size:]
+        return [self._population[index] for index in self._population.elite_indices(self._elite_size)]
 
     def _best_individual(self) -> Individual:
         '''Returns the fittest individual from population'''
-        return max(self._population, key=attrgetter('fitness'))
+        return self._population[self._population.best_index()]
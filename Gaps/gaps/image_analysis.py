@@ -1,91 +1,532 @@
-from typing import Tuple, List
+import os
+import warnings
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
-from gaps.fitness import dissimilarity_measure
+import numpy as np
+
+from gaps.best_match_table import BestMatchTable
+from gaps.fitness import l2_dissimilarity_matrix, mahalanobis_dissimilarity_matrix
+from gaps.instrumentation import Instrumentation
 from gaps.piece import Piece
+from gaps.piece_set import PieceSet
 from gaps.progress_bar import print_progress
+from gaps.shared_arrays import SharedArrays
 
-class ImageAnalysis(object):
-    '''Cache for dissimilarity measures of individuals
 
-    Class have static lookup table where keys are Piece's id's.
-    For each pair puzzle pieces there is a map with values representing
-    dissimilarity measure between them. Each next generation have greater chance to use
-    cached value instead of calculating measure again.
+class Analysis(object):
+    '''Dissimilarity measures, best matches and best buddies of the pieces of one puzzle
+
+    Analysis is made once by analyze(), load() or attach() and is not changed afterwards, so one
+    analysis can be used by any number of genetic algorithm runs, also by runs in other threads.
+    Individuals, crossovers and local search read the analysis they are given instead of
+    process-wide state, so puzzles with different analyses can be solved in one process at once.
+
+    For each orientation there is a dense N x N plane with values representing
+    dissimilarity measure between ordered pairs of pieces, so measures can be
+    looked up for many pairs at once.
 
     Attributes:
-        dissimilarity_measures  Dictionary with cached dissimilarity measures for puzzle pieces
-        best_match_table        Dictionary with best matching piece for each edge and each piece
+        dissimilarity_measures  Array of shape (2, N, N) with dissimilarity measures for puzzle pieces,
+                                plane ORIENTATIONS['LR'] holds [left, right] and plane ORIENTATIONS['TD']
+                                holds [top, down] pairs. Measure of a piece with itself is infinite.
+        best_match_table        BestMatchTable with best matching pieces for each edge and each piece
+        best_buddies            Array of shape (N, 4) with best buddy of each edge (T, R, D, L) of each piece,
+                                -1 where the best match is not mutual
+
+    Usage::
+
+        >>> from gaps.image_analysis import Analysis
+        >>> analysis = Analysis.analyze(pieces, 'L2')
+        >>> analysis.get_dissimilarity([1, 2], 'TD')
 
     '''
-    dissimilarity_measures = {}
-    best_match_table = {}
+
+    # Plane of dissimilarity_measures for each orientation of pieces
+    ORIENTATIONS = {'LR': 0, 'TD': 1}
+
+    # Names of files written by save()
+    MEASURES_FILE = 'dissimilarity_measures.npy'
+    BEST_MATCH_FILE = 'best_match_table.npz'
+
+    # Default approximate size in bytes of temporary arrays of one block of analysis
+    MEMORY_BUDGET = 2 ** 28
+
+    def __init__(
+        self, dissimilarity_measures: np.ndarray, best_match_table: Optional[BestMatchTable],
+        best_buddies: Optional[np.ndarray] = None, shared: Optional[SharedArrays] = None
+    ):
+        self.dissimilarity_measures = dissimilarity_measures
+        self.best_match_table = best_match_table
+        if best_buddies is None:
+            best_buddies = best_match_table.best_buddies()
+        self.best_buddies = best_buddies
+        # Shared memory holding measures, kept as long as measures are used. Blocks created
+        # by analyze() stay linked for share() until the analysis is garbage collected.
+        self._shared = shared
+        if shared is not None and shared.owned:
+            weakref.finalize(self, shared.unlink)
 
     @classmethod
-    def analyze_image(cls, pieces: List[Piece], method: str):
-        cls.dissimilarity_measures = {
-            (first, second): {} for first in range(len(pieces)) for second in range(len(pieces))
-        }
+    def analyze(
+        cls, pieces: Union[List[Piece], PieceSet], method: str, dtype: np.dtype = np.float64,
+        top_k: int = BestMatchTable.TOP_K, memory_budget: int = MEMORY_BUDGET, path: Optional[str] = None,
+        workers: int = 1
+    ) -> 'Analysis':
+        '''Calculates dissimilarity measures and best matches for every pair of pieces
 
-        # For each edge we keep best matches as a sorted list.
-        # Edges with lower dissimilarity_measure have higher priority.
-        cls.best_match_table = {
-            piece.id : {'T': [], 'R': [], 'D': [], 'L': [] } for piece in pieces
-        }
+        Measures are computed in blocks of rows. Each block is written to the store and merged
+        into the top_k best matches while it is in memory, so the store itself is never read back.
+        With a path the store is a memory mapped .npy file and only one block is ever held in RAM,
+        which allows puzzles with tens of thousands of pieces.
+
+        With more than one worker, blocks are computed by a pool of processes. Piece edges and
+        the store live in shared memory (or in the memory mapped file), so workers copy nothing.
+        Every row is computed the same way as in a single process, so results are identical.
+
+        :params pieces:        Puzzle pieces with ids from 0 to len(pieces) - 1.
+        :params method:        Method for calculating error. Options: 'Mahalanobis' and 'L2'.
+        :params dtype:         Data type of stored measures, np.float32 halves the memory.
+        :params top_k:         Number of best matches found up front for each edge.
+        :params memory_budget: Approximate size in bytes of temporary arrays of one process,
+                               decides the block size.
+        :params path:          Backing .npy file for measures, if None measures are kept in RAM.
+        :params workers:       Number of processes computing measures.
+
+        Usage::
 
-        def update_best_match_table(first_piece: Piece, second_piece: Piece, orientation: str):
-            measure = dissimilarity_measure(first_piece, second_piece, method, orientation)
-            cls.put_dissimilarity((first_piece.id, second_piece.id), orientation, measure)
-            cls.best_match_table[second_piece.id][orientation[0]].append((first_piece.id, measure))
-            cls.best_match_table[first_piece.id][orientation[1]].append((second_piece.id, measure))
-
-        # Calculate dissimilarity measures and best matches for each piece.
-        iterations = len(pieces) - 1
-        for first in range(iterations):
-            print_progress(first, iterations - 1, prefix='=== Analyzing image:')
-            for second in range(first + 1, len(pieces)):
-                for orientation in ['LR', 'TD']:
-                    update_best_match_table(pieces[first], pieces[second], orientation)
-                    update_best_match_table(pieces[second], pieces[first], orientation)
-
-        for piece in pieces:
-            for orientation in ['T', 'L', 'R', 'D']:
-                cls.best_match_table[piece.id][orientation].sort(key=lambda x: x[1])
+            >>> from gaps.image_analysis import Analysis
+            >>> analysis = Analysis.analyze(pieces, 'L2', np.float32, memory_budget=2 ** 30, path='measures.npy')
+
+        '''
+        edges = _stack_edges(pieces, method)
+        shape = (2, len(pieces), len(pieces))
+
+        shared_edges = None
+        shared_measures = None
+        try:
+            if workers > 1:
+                shared_edges = SharedArrays()
+                edges = {name: shared_edges.add(name, array) for name, array in edges.items()}
+
+            # measures[LR, i, j] is the measure of piece i placed to the left of piece j,
+            # measures[TD, i, j] is the measure of piece i placed on top of piece j.
+            if path is not None:
+                measures = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+            elif workers > 1:
+                shared_measures = SharedArrays()
+                measures = shared_measures.create('measures', shape, dtype)
+            else:
+                measures = np.empty(shape, dtype=dtype)
+
+            # For each edge we keep best matches sorted from the best one.
+            # Edges with lower dissimilarity_measure have higher priority, ties are broken by piece id.
+            best_match_table = BestMatchTable(
+                measures[cls.ORIENTATIONS['LR']], measures[cls.ORIENTATIONS['TD']], top_k=top_k
+            )
+
+            block_size = max(1, memory_budget // (len(pieces) * cls._pair_size(method, edges['right'][0].size)))
+            if workers > 1:
+                # Enough blocks to keep every worker busy
+                block_size = min(block_size, -(-len(pieces) // (4 * workers)))
+            starts = list(range(0, len(pieces), block_size))
+            stops = [min(start + block_size, len(pieces)) for start in starts]
+
+            def update_best_match_table(start: int, stop: int, blocks: Dict[str, np.ndarray]):
+                print_progress(stop, len(pieces), prefix='=== Analyzing image:')
+                best_match_table.update(start, blocks['LR'], blocks['TD'])
+
+            if workers > 1:
+                store = ('file', path) if path is not None else ('shared', shared_measures.specification())
+                with ProcessPoolExecutor(
+                    workers, initializer=_initialize_worker,
+                    initargs=(shared_edges.specification(), store, method, np.dtype(dtype).str)
+                ) as executor:
+                    for start, stop, _ in zip(starts, stops, executor.map(_analyze_rows, starts, stops)):
+                        update_best_match_table(start, stop, {
+                            orientation: measures[index, start:stop] for orientation, index in cls.ORIENTATIONS.items()
+                        })
+            else:
+                for start, stop in zip(starts, stops):
+                    blocks = _measure_rows(edges, method, start, stop, dtype)
+                    for orientation, index in cls.ORIENTATIONS.items():
+                        measures[index, start:stop] = blocks[orientation]
+                    update_best_match_table(start, stop, blocks)
+        except BaseException:
+            # Measures are not returned, so no process attaches to their block anymore
+            if shared_measures is not None:
+                shared_measures.unlink()
+            raise
+        finally:
+            # Workers have finished (or failed), no process attaches to shared edges anymore.
+            # Blocks are unlinked first: closing them fails while arrays of a failed run still view them.
+            if shared_edges is not None:
+                shared_edges.unlink()
+
+        if shared_edges is not None:
+            edges = None
+            shared_edges.close()
+        if path is not None:
+            measures.flush()
+
+        return cls(measures, best_match_table, shared=shared_measures)
 
     @classmethod
-    def put_dissimilarity(cls, ids: Tuple[int], orientation: str, value: float):
-        '''Puts a new value in lookup table for given pieces
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'Analysis':
+        '''Loads dissimilarity measures and best match table saved with save()
+
+        :params directory: Directory with saved analysis.
+        :params mmap_mode: Memory map mode of measures, with the default 'r' measures are read
+                           from disk on demand instead of being loaded at once.
+
+        '''
+        measures = np.load(os.path.join(directory, cls.MEASURES_FILE), mmap_mode=mmap_mode)
+        best_match_table = BestMatchTable.load(
+            os.path.join(directory, cls.BEST_MATCH_FILE),
+            measures[cls.ORIENTATIONS['LR']],
+            measures[cls.ORIENTATIONS['TD']]
+        )
+        return cls(measures, best_match_table)
+
+    @classmethod
+    def attach(cls, specification: dict) -> 'Analysis':
+        '''Returns analysis shared by another process with share()'''
+        kind, location = specification['measures']
+        shared = None
+        if kind == 'file':
+            measures = np.load(location, mmap_mode='r')
+        else:
+            shared = SharedArrays.attach(location)
+            measures = shared['measures']
+
+        best_match_table = BestMatchTable(
+            measures[cls.ORIENTATIONS['LR']],
+            measures[cls.ORIENTATIONS['TD']],
+            specification['top_k'], indices=specification['indices'], measures=specification['best_measures']
+        )
+        return cls(measures, best_match_table, specification['best_buddies'], shared)
+
+    def save(self, directory: str):
+        '''Saves dissimilarity measures and best match table to given directory
+
+        Measures already backed by a file in the directory (see path of analyze) are not copied.
+
+        Usage::
+
+            >>> analysis.save('analysis/')
+
+        '''
+        os.makedirs(directory, exist_ok=True)
+        measures_path = os.path.join(directory, self.MEASURES_FILE)
+        measures = self.dissimilarity_measures
+        is_backed = isinstance(measures, np.memmap) and os.path.abspath(measures.filename) == os.path.abspath(measures_path)
+        if not is_backed:
+            np.save(measures_path, measures)
+        self.best_match_table.save(os.path.join(directory, self.BEST_MATCH_FILE))
+
+    def share(self) -> Tuple[dict, Optional[SharedArrays]]:
+        '''Returns picklable specification of the analysis for attach() in other processes
+
+        Measures backed by a .npy file are opened from the file again, measures computed by
+        workers of analyze() are attached in the shared memory they were computed in, other
+        measures in RAM are copied to shared memory once. Returned SharedArrays (None if nothing
+        was copied) must stay linked until every process has attached, and should then be
+        unlinked and closed by the caller.
+        Best match and best buddy tables are small and are pickled with the specification.
+
+        Usage::
+
+            >>> from gaps.image_analysis import Analysis
+            >>> specification, shared = analysis.share()
+            >>> # in another process
+            >>> analysis = Analysis.attach(specification)
+
+        '''
+        measures = self.dissimilarity_measures
+        shared = None
+        # A file which was moved or deleted since it was mapped cannot be opened again
+        if isinstance(measures, np.memmap) and measures.filename is not None and os.path.exists(measures.filename):
+            store = ('file', measures.filename)
+        elif self._shared is not None and self._shared.owned:
+            store = ('shared', self._shared.specification())
+        else:
+            shared = SharedArrays()
+            shared.add('measures', measures)
+            store = ('shared', shared.specification())
+
+        table = self.best_match_table
+        specification = {
+            'measures': store,
+            'top_k': table.top_k,
+            'indices': table.indices,
+            'best_measures': table.measures,
+            'best_buddies': self.best_buddies
+        }
+        return specification, shared
+
+    @staticmethod
+    def _pair_size(method: str, edge_size: int) -> int:
+        '''Returns approximate size in bytes of temporary arrays needed for one pair of pieces'''
+        # Both orientations, best match merging and the measure itself
+        pair_size = 2 * 64
+        if method == 'Mahalanobis':
+            # Gradients, their products with inverse covariances and per-pixel forms
+            pair_size += 3 * 8 * edge_size
+        return pair_size
+
+    def get_dissimilarity(self, ids: Tuple[int], orientation: str) -> float:
+        '''Returns dissimilarity measure for input pieces
 
         :params ids:         Identfiers of puzzle pieces
         :params orientation: Orientation of puzzle pieces. Possible values are:
                              'LR' => 'Left-Right'
                              'TD' => 'Top-Down'
-        :params value:       Value of dissimilarity measure
 
         Usage::
 
-            >>> from gaps.image_analysis import ImageAnalysis
-            >>> ImageAnalysis.put_dissimilarity([1, 2], 'TD', 42)
+            >>> analysis.get_dissimilarity([1, 2], 'TD')
+
         '''
-        cls.dissimilarity_measures[ids][orientation] = value
+        if Instrumentation.enabled:
+            Instrumentation.count('dissimilarity_lookups')
+        return float(self.dissimilarity_measures[self.ORIENTATIONS[orientation], ids[0], ids[1]])
+
+    def get_dissimilarities(self, first_ids: np.ndarray, second_ids: np.ndarray, orientation: str) -> np.ndarray:
+        '''Returns dissimilarity measures for arrays of piece pairs
+
+        :params first_ids:   Identifiers of left (top) pieces, array of any shape
+        :params second_ids:  Identifiers of right (down) pieces, same shape as first_ids
+        :params orientation: Orientation of puzzle pieces. Possible values are:
+                             'LR' => 'Left-Right'
+                             'TD' => 'Top-Down'
+
+        Usage::
+
+            >>> analysis.get_dissimilarities(np.array([1, 3]), np.array([2, 4]), 'LR')
+
+        '''
+        if Instrumentation.enabled:
+            Instrumentation.count('dissimilarity_lookups', int(np.size(first_ids)))
+        return self.dissimilarity_measures[self.ORIENTATIONS[orientation]][first_ids, second_ids]
+
+    def best_match(self, piece, orientation) -> int:
+        '''Returns best match piece for given piece and orientation'''
+        return self.best_match_table.best_match(piece, orientation)
+
+    def buddy_fraction(self) -> float:
+        '''Returns fraction of all 4 * N edges of pieces which have a best buddy.
+
+        The more edges have best buddies, the easier the puzzle usually is to solve.
+
+        '''
+        if self.best_buddies.size == 0:
+            return 0.0
+        return float(np.mean(self.best_buddies >= 0))
+
+
+class ImageAnalysis(object):
+    '''Deprecated process-wide analysis, use Analysis instead
+
+    Class attributes hold tables of the analysis made by the last call of analyze_image(),
+    load() or attach() in the process, so analyses of two puzzles overwrite each other.
+    Individuals, crossovers and local search which are not given an Analysis use the one
+    returned by current(), so code written before Analysis keeps working. Every class method
+    but use() and current() warns with DeprecationWarning.
+
+    Attributes are the same as of Analysis.
+
+    '''
+    dissimilarity_measures = np.empty((2, 0, 0))
+    best_match_table = None
+    best_buddies = np.empty((0, 4), dtype=np.int32)
+    _analysis: Optional[Analysis] = None
+
+    ORIENTATIONS = Analysis.ORIENTATIONS
+    MEASURES_FILE = Analysis.MEASURES_FILE
+    BEST_MATCH_FILE = Analysis.BEST_MATCH_FILE
+    MEMORY_BUDGET = Analysis.MEMORY_BUDGET
 
     @classmethod
-    def get_dissimilarity(cls, ids: Tuple[int], orientation: str) -> float:
-        '''Returns previously cached dissimilarity measure for input pieces
+    def use(cls, analysis: Analysis):
+        '''Makes given analysis the process-wide one'''
+        cls._analysis = analysis
+        cls.dissimilarity_measures = analysis.dissimilarity_measures
+        cls.best_match_table = analysis.best_match_table
+        cls.best_buddies = analysis.best_buddies
+
+    @classmethod
+    def current(cls) -> Analysis:
+        '''Returns the process-wide analysis, made of class attributes if they were replaced'''
+        analysis = cls._analysis
+        if (
+            analysis is None or analysis.dissimilarity_measures is not cls.dissimilarity_measures
+            or analysis.best_match_table is not cls.best_match_table or analysis.best_buddies is not cls.best_buddies
+        ):
+            analysis = Analysis(cls.dissimilarity_measures, cls.best_match_table, cls.best_buddies)
+            cls._analysis = analysis
+        return analysis
+
+    @classmethod
+    def analyze_image(
+        cls, pieces: Union[List[Piece], PieceSet], method: str, dtype: np.dtype = np.float64, top_k: int = BestMatchTable.TOP_K,
+        memory_budget: int = MEMORY_BUDGET, path: Optional[str] = None, workers: int = 1
+    ):
+        '''Deprecated, see Analysis.analyze'''
+        _warn_deprecated('analyze_image', 'Analysis.analyze')
+        cls.use(Analysis.analyze(pieces, method, dtype, top_k, memory_budget, path, workers))
+
+    @classmethod
+    def save(cls, directory: str):
+        '''Deprecated, see Analysis.save'''
+        _warn_deprecated('save', 'Analysis.save')
+        cls.current().save(directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r'):
+        '''Deprecated, see Analysis.load'''
+        _warn_deprecated('load', 'Analysis.load')
+        cls.use(Analysis.load(directory, mmap_mode))
+
+    @classmethod
+    def share(cls) -> Tuple[dict, Optional[SharedArrays]]:
+        '''Deprecated, see Analysis.share'''
+        _warn_deprecated('share', 'Analysis.share')
+        return cls.current().share()
+
+    @classmethod
+    def attach(cls, specification: dict):
+        '''Deprecated, see Analysis.attach'''
+        _warn_deprecated('attach', 'Analysis.attach')
+        cls.use(Analysis.attach(specification))
+
+    @classmethod
+    def put_dissimilarity(cls, ids: Tuple[int], orientation: str, value: float):
+        '''Deprecated, puts a new value in lookup table of the current analysis for given pieces
+
+        Measures are changed in place for everything using the current analysis.
+        Analysis objects are meant not to change once they are made, so there is no replacement.
 
         :params ids:         Identfiers of puzzle pieces
         :params orientation: Orientation of puzzle pieces. Possible values are:
                              'LR' => 'Left-Right'
                              'TD' => 'Top-Down'
+        :params value:       Value of dissimilarity measure
 
         Usage::
 
             >>> from gaps.image_analysis import ImageAnalysis
-            >>> ImageAnalysis.get_dissimilarity([1, 2], 'TD')
-
+            >>> ImageAnalysis.put_dissimilarity([1, 2], 'TD', 42)
         '''
-        return cls.dissimilarity_measures[ids][orientation]
+        _warn_deprecated('put_dissimilarity', 'an Analysis of the changed measures')
+        cls.current().dissimilarity_measures[cls.ORIENTATIONS[orientation], ids[0], ids[1]] = value
+
+    @classmethod
+    def get_dissimilarity(cls, ids: Tuple[int], orientation: str) -> float:
+        '''Deprecated, see Analysis.get_dissimilarity'''
+        _warn_deprecated('get_dissimilarity', 'Analysis.get_dissimilarity')
+        return cls.current().get_dissimilarity(ids, orientation)
+
+    @classmethod
+    def get_dissimilarities(cls, first_ids: np.ndarray, second_ids: np.ndarray, orientation: str) -> np.ndarray:
+        '''Deprecated, see Analysis.get_dissimilarities'''
+        _warn_deprecated('get_dissimilarities', 'Analysis.get_dissimilarities')
+        return cls.current().get_dissimilarities(first_ids, second_ids, orientation)
 
     @classmethod
     def best_match(cls, piece, orientation) -> int:
-        ''''Returns best match piece for given piece and orientation'''
-        return cls.best_match_table[piece][orientation][0][0]
+        '''Deprecated, see Analysis.best_match'''
+        _warn_deprecated('best_match', 'Analysis.best_match')
+        return cls.current().best_match(piece, orientation)
+
+    @classmethod
+    def buddy_fraction(cls) -> float:
+        '''Deprecated, see Analysis.buddy_fraction'''
+        _warn_deprecated('buddy_fraction', 'Analysis.buddy_fraction')
+        return cls.current().buddy_fraction()
+
+
+def _warn_deprecated(name: str, replacement: str):
+    warnings.warn(
+        'ImageAnalysis.{} is deprecated, use {} and pass the analysis on'.format(name, replacement),
+        DeprecationWarning, stacklevel=3
+    )
+
+
+# Edges compared for each orientation, edge of first piece and edge of second piece
+SIDES = {'LR': ('right', 'left'), 'TD': ('bottom', 'top')}
+
+# State of analysis worker processes set by _initialize_worker
+_worker = {}
+
+
+def _stack_edges(pieces: Union[List[Piece], PieceSet], method: str) -> Dict[str, np.ndarray]:
+    '''Returns edges (and edge statistics) of all pieces needed by given method, stacked by piece id'''
+    if method not in ('L2', 'Mahalanobis'):
+        raise ValueError('Unknown method "{}". Options: "Mahalanobis" and "L2".'.format(method))
+
+    edges = {}
+    for first_side, second_side in SIDES.values():
+        edges[first_side] = _stack(pieces, first_side)
+        edges[second_side] = _stack(pieces, second_side)
+        if method == 'Mahalanobis':
+            edges['mu_' + first_side] = _stack(pieces, 'mu_' + first_side)
+            for side in (first_side, second_side):
+                edges['sigma_{}_inv'.format(side)] = _stack(pieces, 'sigma_{}_inv'.format(side))
+    return edges
+
+
+def _measure_rows(
+    edges: Dict[str, np.ndarray], method: str, start: int, stop: int, dtype: np.dtype
+) -> Dict[str, np.ndarray]:
+    '''Returns measures between pieces start, ..., stop - 1 and every piece for each orientation'''
+    rows = slice(start, stop)
+    blocks = {}
+
+    for orientation, (first_side, second_side) in SIDES.items():
+        if method == 'L2':
+            block = l2_dissimilarity_matrix(edges[first_side][rows], edges[second_side])
+        else:
+            first_sigma_inv = edges['sigma_{}_inv'.format(first_side)]
+            second_sigma_inv = edges['sigma_{}_inv'.format(second_side)]
+            block = mahalanobis_dissimilarity_matrix(
+                edges[first_side][rows], edges['mu_' + first_side][rows], first_sigma_inv[rows],
+                edges[second_side], second_sigma_inv
+            )
+
+        block = block.astype(dtype, copy=False)
+        block[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        blocks[orientation] = block
+
+    return blocks
+
+
+def _initialize_worker(edges: dict, store: Tuple[str, object], method: str, dtype: str):
+    '''Attaches analysis worker process to shared edges and measures'''
+    _worker['edges'] = SharedArrays.attach(edges)
+    kind, location = store
+    if kind == 'file':
+        _worker['measures'] = np.load(location, mmap_mode='r+')
+    else:
+        _worker['shared_measures'] = SharedArrays.attach(location)
+        _worker['measures'] = _worker['shared_measures']['measures']
+    _worker['method'] = method
+    _worker['dtype'] = np.dtype(dtype)
+
+
+def _analyze_rows(start: int, stop: int):
+    '''Computes measures of rows start, ..., stop - 1 in analysis worker process'''
+    blocks = _measure_rows(_worker['edges'].arrays(), _worker['method'], start, stop, _worker['dtype'])
+    for orientation, index in Analysis.ORIENTATIONS.items():
+        _worker['measures'][index, start:stop] = blocks[orientation]
+
+
+def _stack(pieces: Union[List[Piece], PieceSet], attribute: str) -> np.ndarray:
+    '''Stacks given attribute (edge or edge statistic) of every piece into one array indexed by piece id'''
+    if isinstance(pieces, PieceSet):
+        return pieces.stack(attribute).astype(np.float64)
+
+    stacked = np.empty((len(pieces),) + np.shape(getattr(pieces[0], attribute)))
+    for piece in pieces:
+        stacked[piece.id] = getattr(piece, attribute)
+    return stacked
@@ -1,53 +1,59 @@
-from typing import Tuple, List
-import itertools
+from typing import List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
-from gaps.piece import Piece
+from gaps.piece_set import PieceSet
 
 
-def flatten_image(image: np.ndarray, piece_size: int, indexed: bool = False) -> Tuple[List[np.ndarray], int, int]:
-    """Converts image into list of square pieces.
+def flatten_image(
+    image: np.ndarray, piece_size: int, indexed: bool = False
+) -> Tuple[Union[np.ndarray, PieceSet], int, int]:
+    """Converts image into grid of square pieces.
 
-    Input image is divided into square pieces of specified size and than
-    flattened into list. Each list element is PIECE_SIZE x PIECE_SIZE x 3
+    Input image is divided into square pieces of specified size. The pieces are a
+    (rows, columns, PIECE_SIZE, PIECE_SIZE, 3) strided view of the input image,
+    so nothing is copied; piece at row y and column x is pieces[y, x].
 
     :params image:      Input image.
     :params piece_size: Size of single square piece. Each piece is PIECE_SIZE x PIECE_SIZE
-    :params indexed:    If True, list of Pieces with IDs will be returned, otherwise just plain list of ndarray pieces
+    :params indexed:    If True, PieceSet of pieces with IDs (row by row) will be returned,
+                        otherwise just a view of image as grid of pieces
 
     Usage::
 
         >>> from gaps.image_helpers import flatten_image
-        >>> flat_image = flatten_image(image, 32)
+        >>> pieces, rows, columns = flatten_image(image, 32)
+        >>> top_left_piece = pieces[0, 0]
 
     """
     rows, columns = image.shape[0] // piece_size, image.shape[1] // piece_size
-    pieces = []
 
-    # Crop pieces from original image
-    for y in range(rows):
-        for x in range(columns):
-            left, top, right, down = x * piece_size, y * piece_size, (x + 1) * piece_size, (y + 1) * piece_size
-            piece = np.empty((piece_size, piece_size, image.shape[2]))
-            piece[:, :, :] = image[top:down, left:right, :]
-            pieces.append(piece)
+    # Splitting axes of the cropped image never needs a copy
+    pieces = image[:rows * piece_size, :columns * piece_size].reshape(
+        rows, piece_size, columns, piece_size, image.shape[2]
+    ).swapaxes(1, 2)
 
     if indexed:
-        pieces = [Piece(value, index) for index, value in enumerate(pieces)]
+        return PieceSet(pieces.reshape(rows * columns, piece_size, piece_size, image.shape[2])), rows, columns
 
     return pieces, rows, columns
 
 
-def assemble_image(pieces: List[np.ndarray], rows: int, columns: int) -> np.ndarray:
+def assemble_image(
+    pieces: Union[np.ndarray, Sequence[np.ndarray]], rows: int, columns: int,
+    permutation: Optional[Sequence[int]] = None, out: Optional[np.ndarray] = None
+) -> np.ndarray:
     """Assembles image from pieces.
 
-    Given an array of pieces and desired image dimensions, function
-    assembles image by stacking pieces.
+    Given pieces, desired image dimensions and order of pieces, function
+    gathers pieces into one preallocated image.
 
-    :params pieces:  Image pieces as an array.
-    :params rows:    Number of rows in resulting image.
-    :params columns: Number of columns in resulting image.
+    :params pieces:      Image pieces as a grid from flatten_image, an (N, W, W, 3) array or a list.
+    :params rows:        Number of rows in resulting image.
+    :params columns:     Number of columns in resulting image.
+    :params permutation: Index of piece (row by row within pieces) at each position of resulting image,
+                         row by row. Pieces are taken in their order by default.
+    :params out:         C-contiguous image of the same dtype as pieces to write into, it is allocated if None.
 
     Usage::
 
@@ -55,9 +61,36 @@ def assemble_image(pieces: List[np.ndarray], rows: int, columns: int) -> np.ndar
         >>> from gaps.image_helpers import flatten_image
         >>> pieces, rows, cols = flatten_image(...)
         >>> original_img = assemble_image(pieces, rows, cols)
+        >>> puzzle = assemble_image(pieces, rows, cols, np.random.permutation(rows * cols))
 
     """
-    image = np.vstack([
-        np.hstack([pieces[i * columns + j] for j in range(columns)]) for i in range(rows)
-    ]).astype(np.uint8)
-    return image
+    if isinstance(pieces, np.ndarray) and pieces.ndim == 5:
+        grid_columns = pieces.shape[1]
+        piece_size, channels, dtype = pieces.shape[2], pieces.shape[4], pieces.dtype
+
+        def gather(indices: np.ndarray) -> np.ndarray:
+            return pieces[indices // grid_columns, indices % grid_columns]
+    else:
+        piece_size, channels, dtype = pieces[0].shape[0], pieces[0].shape[2], pieces[0].dtype
+
+        def gather(indices: np.ndarray) -> Union[np.ndarray, List[np.ndarray]]:
+            if isinstance(pieces, np.ndarray):
+                return pieces[indices]
+            return [pieces[index] for index in indices]
+
+    if permutation is None:
+        permutation = np.arange(rows * columns)
+    permutation = np.asarray(permutation).reshape(rows, columns)
+
+    if out is None:
+        out = np.empty((rows * piece_size, columns * piece_size, channels), dtype=dtype)
+    elif out.dtype != dtype:
+        # Pixels would be silently truncated or wrapped around
+        raise ValueError('Output image of dtype {} cannot hold pieces of dtype {}'.format(out.dtype, dtype))
+
+    # View of output image as grid of pieces, filled one row of pieces at a time
+    grid = out.reshape(rows, piece_size, columns, piece_size, channels).swapaxes(1, 2)
+    for row in range(rows):
+        grid[row] = gather(permutation[row])
+
+    return out
@@ -1,10 +1,11 @@
-from typing import List
+from typing import List, Optional, Sequence, Union
 
 import numpy as np
 
 from gaps import image_helpers
 from gaps.piece import Piece
-from gaps.image_analysis import ImageAnalysis
+from gaps.piece_set import PieceSet
+from gaps.image_analysis import Analysis, ImageAnalysis
 
 
 class Individual(object):
@@ -14,37 +15,75 @@ class Individual(object):
     (possible arrangement of the puzzle's pieces).
     It is created by random shuffling initial puzzle.
 
-    :param pieces:  Array of pieces representing initial puzzle.
-    :param rows:    Number of rows in input puzzle
-    :param columns: Number of columns in input puzzle
+    Arrangement is kept as a permutation array, id of the piece at each position
+    (row by row), and its inverse, position of each piece. Pieces themselves are
+    shared by all individuals of a puzzle.
+
+    :param pieces:      Array of pieces representing initial puzzle, or all pieces indexed
+                        by id (e.g. PieceSet) if permutation is given.
+    :param rows:        Number of rows in input puzzle
+    :param columns:     Number of columns in input puzzle
+    :param shuffle:     Whether to randomly shuffle the arrangement, by default only if no permutation is given
+    :param permutation: Id of the piece at each position, row by row
+    :param analysis:    Analysis of the puzzle, the process-wide ImageAnalysis.current() if None
 
     Usage::
 
         >>> from gaps.individual import Individual
         >>> from gaps.image_helpers import flatten_image
-        >>> pieces, rows, columns = flatten_image(...)
+        >>> pieces, rows, columns = flatten_image(..., indexed=True)
         >>> ind = Individual(pieces, rows, columns)
 
     '''
 
     FITNESS_FACTOR = 1000
 
-    def __init__(self, pieces: List[Piece], rows: int, columns: int, shuffle: bool = True):
-        self.pieces = pieces
+    def __init__(
+        self, pieces: Union[Sequence[Piece], PieceSet], rows: int, columns: int, shuffle: Optional[bool] = None,
+        permutation: Optional[np.ndarray] = None, analysis: Optional[Analysis] = None
+    ):
         self.rows = rows
         self.columns = columns
+        self._analysis = analysis
         self._fitness = None
+        self._neighbours = None
+
+        # Given arrangement is kept as it is unless shuffling is asked for
+        if shuffle is None:
+            shuffle = permutation is None
+        if permutation is None:
+            permutation = np.fromiter((piece.id for piece in pieces), dtype=np.int32, count=len(pieces))
+            if not isinstance(pieces, PieceSet):
+                pieces_by_id = [None] * len(pieces)
+                for piece in pieces:
+                    pieces_by_id[piece.id] = piece
+                pieces = pieces_by_id
+
+        # Pieces indexed by id, shared with other individuals
+        self._pieces = pieces
+        self.permutation = np.array(permutation, dtype=np.int32)
 
         if shuffle:
-            np.random.shuffle(self.pieces)
+            np.random.shuffle(self.permutation)
 
-        # Map piece ID to index in Individual's list
-        self._piece_mapping = {
-            piece.id: index for index, piece in enumerate(self.pieces)
-        }
+        # Position of each piece
+        self.inverse = np.empty_like(self.permutation)
+        self.inverse[self.permutation] = np.arange(len(self.permutation), dtype=np.int32)
 
     def __getitem__(self, key: int) -> List[Piece]:
-        return self.pieces[key * self.columns : (key + 1) * self.columns]
+        return [self._pieces[piece] for piece in self.permutation[key * self.columns : (key + 1) * self.columns]]
+
+    @property
+    def pieces(self) -> List[Piece]:
+        '''Returns pieces in order of arrangement, row by row'''
+        return [self._pieces[piece] for piece in self.permutation]
+
+    @property
+    def analysis(self) -> Analysis:
+        '''Analysis of the puzzle fitness and crossovers of the individual are based on'''
+        if self._analysis is None:
+            return ImageAnalysis.current()
+        return self._analysis
 
     @property
     def fitness(self):
@@ -54,47 +93,87 @@ class Individual(object):
 
         '''
         if self._fitness is None:
-            fitness_value = 1 / self.FITNESS_FACTOR
-            # For each two adjacent pieces in rows
-            for i in range(self.rows):
-                for j in range(self.columns - 1):
-                    ids = (self[i][j].id, self[i][j + 1].id)
-                    fitness_value += ImageAnalysis.get_dissimilarity(ids, orientation='LR')
-            # For each two adjacent pieces in columns
-            for i in range(self.rows - 1):
-                for j in range(self.columns):
-                    ids = (self[i][j].id, self[i + 1][j].id)
-                    fitness_value += ImageAnalysis.get_dissimilarity(ids, orientation='TD')
-
-            self._fitness = self.FITNESS_FACTOR / fitness_value
+            self._fitness = float(
+                self.batch_fitness(self.permutation[np.newaxis], self.rows, self.columns, self.analysis)[0]
+            )
 
         return self._fitness
 
+    @classmethod
+    def batch_fitness(
+        cls, permutations: np.ndarray, rows: int, columns: int, analysis: Optional[Analysis] = None
+    ) -> np.ndarray:
+        '''Evaluates fitness values of many arrangements at once.
+
+        :params permutations: Ids of pieces at each position of each arrangement, shape (M, rows * columns).
+        :params analysis:     Analysis of the puzzle, the process-wide ImageAnalysis.current() if None.
+
+        '''
+        if analysis is None:
+            analysis = ImageAnalysis.current()
+        ids = permutations.reshape(len(permutations), rows, columns)
+        fitness_values = np.full(len(permutations), 1 / cls.FITNESS_FACTOR)
+        # For each two adjacent pieces in rows
+        fitness_values += analysis.get_dissimilarities(ids[:, :, :-1], ids[:, :, 1:], 'LR').sum(
+            axis=(1, 2), dtype=np.float64
+        )
+        # For each two adjacent pieces in columns
+        fitness_values += analysis.get_dissimilarities(ids[:, :-1, :], ids[:, 1:, :], 'TD').sum(
+            axis=(1, 2), dtype=np.float64
+        )
+        return cls.FITNESS_FACTOR / fitness_values
+
+    def with_permutation(self, permutation: np.ndarray) -> 'Individual':
+        '''Returns new individual of the same puzzle with given arrangement'''
+        return Individual(
+            self._pieces, self.rows, self.columns, shuffle=False, permutation=permutation, analysis=self._analysis
+        )
+
     def piece_size(self):
         '''Returns single piece size'''
-        return self.pieces[0].size
+        return self._pieces[0].size()
 
     def piece_by_id(self, identifier: int) -> Piece:
         ''''Return specific piece from individual'''
-        return self.pieces[self._piece_mapping[identifier]]
+        return self._pieces[identifier]
 
     def to_image(self) -> np.ndarray:
         '''Converts individual to showable image'''
-        pieces = [piece.image for piece in self.pieces]
-        return image_helpers.assemble_image(pieces, self.rows, self.columns)
+        if isinstance(self._pieces, PieceSet):
+            return image_helpers.assemble_image(self._pieces.images, self.rows, self.columns, self.permutation)
+        pieces = [piece.image for piece in self._pieces]
+        return image_helpers.assemble_image(pieces, self.rows, self.columns, self.permutation)
+
+    def neighbours(self) -> np.ndarray:
+        '''Returns ids of neighbours of every piece.
+
+        Row i of the (N, 4) array holds the pieces on top, right, down and left of piece i,
+        -1 where piece i lies on the border. The table is built once and kept.
+
+        '''
+        if self._neighbours is None:
+            grid = np.full((self.rows + 2, self.columns + 2), -1, dtype=np.int32)
+            grid[1:-1, 1:-1] = self.permutation.reshape(self.rows, self.columns)
+
+            self._neighbours = np.empty((len(self.permutation), 4), dtype=np.int32)
+            self._neighbours[self.permutation, 0] = grid[:-2, 1:-1].ravel()
+            self._neighbours[self.permutation, 1] = grid[1:-1, 2:].ravel()
+            self._neighbours[self.permutation, 2] = grid[2:, 1:-1].ravel()
+            self._neighbours[self.permutation, 3] = grid[1:-1, :-2].ravel()
+        return self._neighbours
 
-    def edge(self, piece_id: int, orientation: str) -> int:
-        edge_index = self._piece_mapping[piece_id]
+    def edge(self, piece_id: int, orientation: str) -> Optional[int]:
+        edge_index = int(self.inverse[piece_id])
 
         # first do boundary checking, then return the piece over the given piece
         if (orientation == 'T') and (edge_index >= self.columns):
-            return self.pieces[edge_index - self.columns].id
+            return int(self.permutation[edge_index - self.columns])
 
         if (orientation == 'R') and (edge_index % self.columns < self.columns - 1):
-            return self.pieces[edge_index + 1].id
+            return int(self.permutation[edge_index + 1])
 
         if (orientation == 'D') and (edge_index < (self.rows - 1) * self.columns):
-            return self.pieces[edge_index + self.columns].id
+            return int(self.permutation[edge_index + self.columns])
 
         if (orientation == 'L') and (edge_index % self.columns > 0):
-            return self.pieces[edge_index - 1].id
+            return int(self.permutation[edge_index - 1])
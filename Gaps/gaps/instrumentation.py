@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, TextIO
+
+
+class _Timer(object):
+    '''Adds time spent in with block to a phase'''
+
+    def __init__(self, phase: str):
+        self._phase = phase
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = perf_counter()
+
+    def __exit__(self, *args):
+        Instrumentation.add_time(self._phase, perf_counter() - self._start)
+
+
+class _NoTimer(object):
+    '''Timer of disabled instrumentation'''
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+class Instrumentation(object):
+    '''Per-phase timers and event counters of puzzle solving.
+
+    Disabled by default. When enabled, phases (pieces, analysis, fitness, selection,
+    crossover, local_search, rendering) add their time to timers and hot paths add to counters
+    (heap pushes and pops, stale candidates, shared, buddy and best match placements of
+    crossover, dissimilarity lookups). emit() sends one record with all timers and counters
+    since the previous record to the JSON lines file and to callbacks, and resets them;
+    the genetic algorithm emits a record after the analysis and after every generation.
+
+    Hot loops keep plain integer counters of their own and report them once per run,
+    and a disabled timer is one shared no-op object, so disabled instrumentation costs
+    a few attribute lookups per generation. Crossovers built in worker processes are
+    counted by the workers only, they are not part of records.
+
+    Timers and counters are kept per thread, so puzzles solved in threads of one process
+    do not mix their values: a record holds values of the thread which emitted it and the
+    name of that thread. Enabling, the file and callbacks are shared by all threads, so
+    callbacks get records of every thread.
+
+    Values of other processes are not seen by this one. Processes which collect records
+    of their own (e.g. islands) send them back to be passed on by forward().
+
+    Usage::
+
+        >>> from gaps.instrumentation import Instrumentation
+        >>> Instrumentation.enable(path='profile.jsonl', callback=print)
+        >>> with Instrumentation.timer('selection'):
+        ...     parents = roulette_selection(population)
+        >>> Instrumentation.count('heap_pushes', 12)
+        >>> Instrumentation.emit(generation=1)
+        >>> Instrumentation.disable()
+
+    '''
+    enabled = False
+    _values = threading.local()
+    _callbacks: List[Callable[[dict], None]] = []
+    _file: Optional[TextIO] = None
+    _file_lock = threading.Lock()
+
+    @classmethod
+    def enable(cls, path: Optional[str] = None, callback: Optional[Callable[[dict], None]] = None):
+        '''Starts collecting, records are appended to JSON lines file at path and/or passed to callback'''
+        if path is not None:
+            with cls._file_lock:
+                if cls._file is not None:
+                    cls._file.close()
+                cls._file = open(os.path.expanduser(path), 'a')
+        if callback is not None:
+            cls._callbacks = cls._callbacks + [callback]
+        cls.enabled = True
+
+    @classmethod
+    def remove_callback(cls, callback: Callable[[dict], None]):
+        '''Stops passing records to callback added by enable()'''
+        cls._callbacks = [added for added in cls._callbacks if added is not callback]
+
+    @classmethod
+    def disable(cls):
+        '''Stops collecting, closes the file and forgets callbacks and unsent values of all threads'''
+        cls.enabled = False
+        with cls._file_lock:
+            if cls._file is not None:
+                cls._file.close()
+                cls._file = None
+        cls._callbacks = []
+        cls._values = threading.local()
+
+    @classmethod
+    def timer(cls, phase: str):
+        '''Returns context manager adding time spent in it to given phase'''
+        if not cls.enabled:
+            return _NO_TIMER
+        return _Timer(phase)
+
+    @classmethod
+    def add_time(cls, phase: str, seconds: float):
+        if cls.enabled:
+            timers = cls._thread_values('timers')
+            timers[phase] = timers.get(phase, 0.0) + seconds
+
+    @classmethod
+    def count(cls, name: str, value: int = 1):
+        if cls.enabled:
+            counters = cls._thread_values('counters')
+            counters[name] = counters.get(name, 0) + value
+
+    @classmethod
+    def emit(cls, **fields) -> Optional[dict]:
+        '''Sends record of given fields, timers and counters of this thread, and resets them'''
+        if not cls.enabled:
+            return None
+
+        record = dict(
+            fields, thread=threading.current_thread().name, timers=cls._thread_values('timers'),
+            counters=cls._thread_values('counters')
+        )
+        cls._values.timers = {}
+        cls._values.counters = {}
+        cls._send(record)
+        return record
+
+    @classmethod
+    def forward(cls, record: dict, **fields) -> Optional[dict]:
+        '''Sends record emitted by another process (e.g. an island) with given fields added'''
+        if not cls.enabled:
+            return None
+
+        record = dict(record, **fields)
+        cls._send(record)
+        return record
+
+    @classmethod
+    def _send(cls, record: dict):
+        '''Writes record to the file and passes it to callbacks'''
+        with cls._file_lock:
+            if cls._file is not None:
+                cls._file.write(json.dumps(record) + '\n')
+                cls._file.flush()
+        for callback in cls._callbacks:
+            callback(record)
+
+    @classmethod
+    def _thread_values(cls, name: str) -> dict:
+        '''Returns timers or counters of this thread'''
+        values = getattr(cls._values, name, None)
+        if values is None:
+            values = {}
+            setattr(cls._values, name, values)
+        return values
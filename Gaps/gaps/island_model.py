@@ -0,0 +1,292 @@
+import multiprocessing
+import traceback
+from multiprocessing.connection import Connection
+from typing import List, Optional
+
+import numpy as np
+
+from gaps import image_helpers
+from gaps.genetic_algorithm import GeneticAlgorithm, analyze_image
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+from gaps.instrumentation import Instrumentation
+from gaps.local_search import LocalSearch
+from gaps.progress_bar import print_progress
+from gaps.renderer import Renderer, WindowRenderer
+from gaps.selection import SELECTIONS
+
+
+class IslandModel(object):
+    '''Genetic algorithm evolving several populations (islands) in separate processes.
+
+    Image is analyzed once and islands attach to the analysis (see Analysis.share).
+    Every 'migration_interval' generations each island sends copies of its 'migrants'
+    fittest individuals to other islands, where they replace the least fit ones:
+
+        ring     - island i sends to island i + 1
+        complete - every island sends to all other islands
+        random   - every island receives from another island drawn at random
+
+    Islands keep diversity longer than one large population and generations of
+    different islands run in parallel. With Instrumentation enabled, islands send
+    records of their generations along with their emigrants, and they are passed on
+    with the index of the island. Evolution stops after the given number of
+    generations or when the best individual did not improve for
+    GeneticAlgorithm.TERMINATION_THRESHOLD migrations.
+
+    :param islands:            Number of islands, each runs in its own process.
+    :param population_size:    Size of population of each island.
+    :param migration_interval: Number of generations between migrations.
+    :param migrants:           Number of individuals each island sends in one migration.
+    :param topology:           Which islands exchange individuals, one of TOPOLOGIES.
+    :param seed:               Seed of random choices of all islands, fresh entropy by default.
+
+    Other parameters are the same as of GeneticAlgorithm; analysis options are used
+    by the analysis in the main process, other options by every island.
+
+    Usage::
+
+        >>> from gaps.island_model import IslandModel
+        >>> model = IslandModel(image, 32, 100, 40, 'L2', islands=4)
+        >>> solution = model.start_evolution(verbose=False)
+
+    '''
+    TOPOLOGIES = ('ring', 'complete', 'random')
+
+    def __init__(
+        self, image: np.ndarray, piece_size: int, population_size: int, generations: int, method: str,
+        islands: int = 4, migration_interval: int = 5, migrants: int = 1, topology: str = 'ring',
+        elite_size: int = 2, dtype: np.dtype = np.float64, memory_budget: int = Analysis.MEMORY_BUDGET,
+        analysis_file: Optional[str] = None, cache_dir: Optional[str] = None, rebuild_cache: bool = False,
+        workers: int = 1, local_search: str = 'none', seed: Optional[int] = None, selection: str = 'roulette'
+    ):
+        if topology not in self.TOPOLOGIES:
+            raise ValueError('Unknown topology {}, options: {}'.format(topology, ', '.join(self.TOPOLOGIES)))
+        if local_search not in GeneticAlgorithm.LOCAL_SEARCH:
+            raise ValueError('Unknown local search {}, options: {}'.format(
+                local_search, ', '.join(GeneticAlgorithm.LOCAL_SEARCH)))
+        if selection not in SELECTIONS:
+            raise ValueError('Unknown selection {}, options: {}'.format(selection, ', '.join(SELECTIONS)))
+        if islands < 1 or migration_interval < 1 or migrants < 0:
+            raise ValueError('Islands and migration interval must be positive, migrants must not be negative')
+        if analysis_file is not None and cache_dir is not None:
+            raise ValueError('Measures are kept either in analysis_file or in cache_dir, not in both')
+
+        self._image = image
+        self._piece_size = piece_size
+        self._population_size = population_size
+        self._generations = generations
+        self.method = method
+        self._islands = islands
+        self._migration_interval = migration_interval
+        self._migrants = migrants
+        self._topology = topology
+        self._dtype = dtype
+        self._memory_budget = memory_budget
+        self._analysis_file = analysis_file
+        self._cache_dir = cache_dir
+        self._rebuild_cache = rebuild_cache
+        self._workers = workers
+        self._local_search = local_search
+        self._options = {'elite_size': elite_size, 'local_search': local_search, 'selection': selection}
+
+        # Islands must not share global random state, so each gets a seed even without one
+        seed_sequence = np.random.SeedSequence(seed)
+        island_sequences = seed_sequence.spawn(islands + 1)
+        self._island_seeds = [int(sequence.generate_state(1)[0]) for sequence in island_sequences[1:]]
+        self._random_state = np.random.RandomState(np.random.MT19937(island_sequences[0]))
+
+        self._pieces, self._rows, self._columns = image_helpers.flatten_image(image, piece_size, indexed=True)
+        self._analysis: Optional[Analysis] = None
+
+    def start_evolution(self, verbose: bool, renderer: Optional[Renderer] = None) -> Individual:
+        '''Evolves islands and returns the solution, parameters are the same as of GeneticAlgorithm.start_evolution'''
+        print('=== Pieces:        {}'.format(len(self._pieces)))
+        print('=== Islands:       {}\n'.format(self._islands))
+
+        self._analysis = analyze_image(
+            self._pieces, self.method, self._dtype, self._memory_budget, self._analysis_file, self._cache_dir,
+            self._rebuild_cache, self._workers
+        )
+        Instrumentation.emit(generation=0)
+
+        specification, shared = self._analysis.share()
+        connections: List[Connection] = []
+        processes: List[multiprocessing.Process] = []
+        window = None
+        if verbose and renderer is None:
+            window = renderer = WindowRenderer(self._image, self._piece_size)
+        try:
+            for island_seed in self._island_seeds:
+                connection, island_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_run_island,
+                    args=(
+                        island_connection, specification, self._image, self._piece_size, self._population_size,
+                        self._generations, self.method, self._migrants, island_seed, self._options,
+                        Instrumentation.enabled
+                    ),
+                    daemon=True
+                )
+                process.start()
+                island_connection.close()
+                connections.append(connection)
+                processes.append(process)
+
+            fittest = self._evolve(renderer, connections)
+        finally:
+            if window is not None:
+                window.close()
+            for connection in connections:
+                try:
+                    connection.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                connection.close()
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            if shared is not None:
+                shared.unlink()
+                shared.close()
+
+        if self._local_search == 'final':
+            return LocalSearch(random_state=self._random_state).run(fittest)
+        return fittest
+
+    def _evolve(self, renderer: Optional[Renderer], connections: List[Connection]) -> Individual:
+        best_permutation = None
+        best_fitness_score = -np.inf
+        termination_counter = 0
+
+        immigrants = [np.empty((0, len(self._pieces)), dtype=np.int32)] * self._islands
+        generation = 0
+        while generation < self._generations:
+            print_progress(generation, self._generations, prefix='=== Solving puzzle: ')
+
+            generations = min(self._migration_interval, self._generations - generation)
+            for connection, island_immigrants in zip(connections, immigrants):
+                _send(connection, (generations, island_immigrants))
+            results = [_receive(connection) for connection in connections]
+            generation += generations
+
+            for island, (_, _, records) in enumerate(results):
+                for record in records:
+                    Instrumentation.forward(record, island=island)
+            immigrants = self._route([island_emigrants for island_emigrants, _, _ in results])
+
+            best_permutations = np.array([permutation for _, permutation, _ in results])
+            fitness_scores = Individual.batch_fitness(best_permutations, self._rows, self._columns, self._analysis)
+            island = int(np.argmax(fitness_scores))
+            if fitness_scores[island] <= best_fitness_score:
+                termination_counter += 1
+            else:
+                best_fitness_score = float(fitness_scores[island])
+                best_permutation = best_permutations[island]
+                termination_counter = 0
+
+            if termination_counter == GeneticAlgorithm.TERMINATION_THRESHOLD:
+                print('\n\n=== Island model terminated')
+                print('=== There was no improvement for {} migrations'.format(
+                    GeneticAlgorithm.TERMINATION_THRESHOLD))
+                break
+
+            if renderer is not None:
+                renderer.show(
+                    generation, best_permutation,
+                    'Generation: {} / {}, fitness = {:.2f}'.format(
+                        generation, self._generations, best_fitness_score
+                    )
+                )
+
+        print_progress(self._generations, self._generations, prefix='=== Solving puzzle: ')
+        return self._individual(best_permutation)
+
+    def _route(self, emigrants: List[np.ndarray]) -> List[np.ndarray]:
+        '''Returns immigrants of each island given emigrants of each island'''
+        count = len(emigrants)
+        if count == 1:
+            return [emigrants[0][:0]]
+
+        if self._topology == 'ring':
+            sources = [[(island - 1) % count] for island in range(count)]
+        elif self._topology == 'complete':
+            sources = [[source for source in range(count) if source != island] for island in range(count)]
+        else:
+            # Any island but itself
+            offsets = self._random_state.randint(1, count, count)
+            sources = [[(island + offset) % count] for island, offset in enumerate(offsets)]
+
+        return [np.concatenate([emigrants[source] for source in island_sources]) for island_sources in sources]
+
+    def _individual(self, permutation: np.ndarray) -> Individual:
+        return Individual(
+            self._pieces, self._rows, self._columns, shuffle=False, permutation=permutation, analysis=self._analysis
+        )
+
+
+def _send(connection: Connection, request: tuple):
+    '''Sends request to island process, raises error which stopped the island'''
+    # A failed island sends its error instead of waiting for requests
+    if connection.poll():
+        _receive(connection)
+    try:
+        connection.send(request)
+    except OSError:
+        # Island closed the pipe, its error may still be there
+        _receive(connection)
+        raise
+
+
+def _receive(connection: Connection):
+    '''Returns result sent by island process, raises error which stopped the island'''
+    try:
+        result = connection.recv()
+    except EOFError:
+        raise RuntimeError('Island process exited without sending a result') from None
+    if isinstance(result, BaseException):
+        raise RuntimeError('Island process failed') from result
+    return result
+
+
+def _run_island(
+    connection: Connection, specification: dict, image: np.ndarray, piece_size: int, population_size: int,
+    generations: int, method: str, migrants: int, seed: int, options: dict, profile: bool
+):
+    '''Evolves population of one island until it gets None instead of (generations, immigrants)'''
+    # Records are sent to the main process, which writes them. Instrumentation of
+    # a forked island must not write to the file or call callbacks of the main process.
+    Instrumentation.disable()
+    records: List[dict] = []
+    if profile:
+        Instrumentation.enable(callback=records.append)
+
+    try:
+        algorithm = GeneticAlgorithm(
+            image, piece_size, population_size, generations, method, seed=seed, analysis=Analysis.attach(specification),
+            **options
+        )
+
+        generation = 0
+        while True:
+            request = connection.recv()
+            if request is None:
+                break
+
+            island_generations, immigrants = request
+            algorithm.immigrate(immigrants)
+            for _ in range(island_generations):
+                fittest = algorithm.step()
+                generation += 1
+                Instrumentation.emit(generation=generation, best_fitness=fittest.fitness)
+
+            # Emigrants are ordered from the least fit, the fittest one is sent even without migration
+            fittest = algorithm.emigrants(1)[-1]
+            connection.send((algorithm.emigrants(migrants), fittest, records))
+            records.clear()
+    except Exception:
+        # Traceback of the island is lost when the error is pickled, so it travels as the message
+        connection.send(RuntimeError(traceback.format_exc()))
+    finally:
+        connection.close()
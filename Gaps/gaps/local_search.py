@@ -0,0 +1,286 @@
+from typing import Optional
+
+import numpy as np
+
+from gaps.image_analysis import ImageAnalysis
+from gaps.individual import Individual
+
+
+class LocalSearch(object):
+    '''Improves an arrangement by small moves, keeping only the moves which lower total dissimilarity.
+
+    Moves tried on every round:
+
+    - swap of two pieces,
+    - shift of a block of rows (or columns) to another place of the grid,
+    - relocation of a horizontal (or vertical) segment to another place of its row (or column),
+      pieces between its old and new place shift to fill the hole.
+
+    A move is scored by the change of measures of boundaries it affects only, so
+    swaps cost O(1), shifts O(1) after one O(rows² · columns) table per round and
+    relocations O(columns), instead of O(rows · columns) of the full fitness.
+    Swaps and relocations are sampled in batches and scored all at once.
+    Dissimilarity measures are read from the analysis of the improved individual.
+
+    :param rounds:        Maximal number of rounds of moves.
+    :param sample_size:   Number of random swaps (and relocations of each length) scored on every round.
+    :param max_block:     Longest block of rows or columns which is shifted.
+    :param max_segment:   Longest segment which is relocated.
+    :param random_state:  numpy RandomState of sampled moves, global numpy random state by default.
+
+    Usage::
+
+        >>> from gaps.local_search import LocalSearch
+        >>> local_search = LocalSearch(rounds=50)
+        >>> improved = local_search.run(individual)
+
+    '''
+
+    def __init__(
+        self, rounds: int = 20, sample_size: int = 512, max_block: int = 3, max_segment: int = 4,
+        random_state: Optional[np.random.RandomState] = None
+    ):
+        self.rounds = rounds
+        self.sample_size = sample_size
+        self.max_block = max_block
+        self.max_segment = max_segment
+        self._random = np.random if random_state is None else random_state
+
+    def run(self, individual: Individual) -> Individual:
+        '''Returns improved individual, or the given one if no improving move was found'''
+        grid = individual.permutation.reshape(individual.rows, individual.columns).copy()
+        measures = individual.analysis.dissimilarity_measures
+
+        improved = False
+        for _ in range(self.rounds):
+            moved = self._swap_pieces(grid, measures)
+            moved = self._shift_blocks(grid, measures) or moved
+            moved = self._shift_blocks(grid.T, measures, transposed=True) or moved
+            moved = self._relocate_segments(grid, measures) or moved
+            moved = self._relocate_segments(grid.T, measures, transposed=True) or moved
+            if not moved:
+                break
+            improved = True
+
+        if not improved:
+            return individual
+        return individual.with_permutation(grid.ravel())
+
+    def _swap_pieces(self, grid: np.ndarray, measures: np.ndarray) -> bool:
+        '''Applies the best improving swap of a batch of random pairs of positions'''
+        size = grid.size
+        if size < 2:
+            return False
+
+        first = self._random.randint(0, size, self.sample_size)
+        second = self._random.randint(0, size - 1, self.sample_size)
+        second += second >= first
+        deltas = exchange_deltas(grid, first[:, np.newaxis], second[:, np.newaxis], measures)
+
+        best = int(np.argmin(deltas))
+        if not deltas[best] < 0:
+            return False
+
+        positions = [first[best], second[best]]
+        grid.flat[positions] = grid.flat[positions[::-1]]
+        return True
+
+    def _shift_blocks(self, grid: np.ndarray, measures: np.ndarray, transposed: bool = False) -> bool:
+        '''Applies the best improving shift of a block of rows of grid to another place'''
+        rows = len(grid)
+        if rows < 2:
+            return False
+
+        costs = _row_costs(grid, transposed, measures)
+        best_delta, best_move = 0.0, None
+        for length in range(1, min(self.max_block, rows - 1) + 1):
+            for start in range(rows - length + 1):
+                stop = start + length
+                for gap in range(rows + 1):
+                    if start <= gap <= stop:
+                        continue
+                    delta = _shift_delta(costs, start, stop, gap)
+                    if delta < best_delta:
+                        best_delta, best_move = delta, (start, stop, gap)
+
+        if best_move is None:
+            return False
+
+        start, stop, gap = best_move
+        order = list(range(rows))
+        block = order[start:stop]
+        del order[start:stop]
+        index = gap if gap < start else gap - (stop - start)
+        order[index:index] = block
+        grid[...] = grid[order]
+        return True
+
+    def _relocate_segments(self, grid: np.ndarray, measures: np.ndarray, transposed: bool = False) -> bool:
+        '''Applies the best improving relocation of a batch of random segments of rows of grid'''
+        rows, columns = grid.shape
+
+        best_delta, best_move = 0.0, None
+        for length in range(1, min(self.max_segment, columns - 1) + 1):
+            row = self._random.randint(0, rows, self.sample_size)
+            start = self._random.randint(0, columns - length + 1, self.sample_size)
+            stop = start + length
+            # Gaps at either end of the segment would leave it in place
+            gap = self._random.randint(0, columns - length, self.sample_size)
+            gap += (gap >= start) * (length + 1)
+
+            deltas = relocation_deltas(grid, row, start, stop, gap, measures, transposed)
+            best = int(np.argmin(deltas))
+            if deltas[best] < best_delta:
+                best_delta, best_move = deltas[best], (row[best], start[best], stop[best], gap[best])
+
+        if best_move is None:
+            return False
+
+        row, start, stop, gap = best_move
+        grid[row] = grid[row, _relocation_orders(columns, start, stop, gap)]
+        return True
+
+
+def exchange_deltas(
+    grid: np.ndarray, first: np.ndarray, second: np.ndarray, measures: Optional[np.ndarray] = None
+) -> np.ndarray:
+    '''Returns change of total dissimilarity caused by exchanging pieces of each pair of groups of positions.
+
+    :params grid:     Arrangement, ids of pieces of shape (rows, columns).
+    :params first:    Flat positions, shape (K, M). Piece at first[k, i] is exchanged with piece at second[k, i].
+    :params second:   Flat positions of the same shape, disjoint with first in each row.
+    :params measures: Dissimilarity measures of an Analysis, of ImageAnalysis.current() if None.
+
+    Only boundaries of the moved pieces are looked at, O(M²) per exchange.
+
+    '''
+    rows, columns = grid.shape
+    if measures is None:
+        measures = ImageAnalysis.current().dissimilarity_measures
+    left_right, top_down = measures[0], measures[1]
+    flat = grid.reshape(-1)
+
+    positions = np.hstack((first, second))
+    old_pieces = flat[positions]
+    new_pieces = flat[np.hstack((second, first))]
+    position_rows, position_columns = np.divmod(positions, columns)
+
+    deltas = np.zeros(len(positions))
+    for row_offset, column_offset in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        neighbour_rows, neighbour_columns = position_rows + row_offset, position_columns + column_offset
+        valid = (
+            (neighbour_rows >= 0) & (neighbour_rows < rows) & (neighbour_columns >= 0) & (neighbour_columns < columns)
+        )
+        neighbours = np.clip(neighbour_rows, 0, rows - 1) * columns + np.clip(neighbour_columns, 0, columns - 1)
+
+        # Neighbours which are moved too: their new pieces are used and boundary
+        # between two moved pieces is counted from its top or left side only
+        matches = neighbours[:, :, np.newaxis] == positions[:, np.newaxis, :]
+        moved = matches.any(axis=-1)
+        if row_offset < 0 or column_offset < 0:
+            valid &= ~moved
+
+        old_neighbours = flat[neighbours]
+        moved_pieces = np.take_along_axis(new_pieces, matches.argmax(axis=-1), axis=1)
+        new_neighbours = np.where(moved, moved_pieces, old_neighbours)
+
+        if row_offset:
+            plane = top_down
+        else:
+            plane = left_right
+        if row_offset < 0 or column_offset < 0:
+            old, new = plane[old_neighbours, old_pieces], plane[new_neighbours, new_pieces]
+        else:
+            old, new = plane[old_pieces, old_neighbours], plane[new_pieces, new_neighbours]
+        deltas += np.where(valid, new, 0).sum(axis=1) - np.where(valid, old, 0).sum(axis=1)
+    return deltas
+
+
+def relocation_deltas(
+    grid: np.ndarray, row: np.ndarray, start: np.ndarray, stop: np.ndarray, gap: np.ndarray,
+    measures: Optional[np.ndarray] = None, transposed: bool = False
+) -> np.ndarray:
+    '''Returns change of total dissimilarity caused by moving segment start...stop - 1 of each row before column gap.
+
+    Pieces between the segment and gap shift by the length of the segment to fill its place.
+
+    :params grid:       Arrangement, ids of pieces of shape (rows, columns), or its transpose.
+    :params row:        Rows of segments, shape (K,).
+    :params start:      First columns of segments, shape (K,).
+    :params stop:       Columns after segments, shape (K,).
+    :params gap:        Columns before which segments are put, not in start...stop.
+    :params measures:   Dissimilarity measures of an Analysis, of ImageAnalysis.current() if None.
+    :params transposed: True if grid is transposed, i.e. segments are vertical.
+
+    Only the boundaries of the moved row are looked at, O(columns) per relocation.
+
+    '''
+    rows, columns = grid.shape
+    row = np.asarray(row)
+    if measures is None:
+        measures = ImageAnalysis.current().dissimilarity_measures
+    along, across = (measures[1], measures[0]) if transposed else (measures[0], measures[1])
+
+    old = grid[row]
+    new = np.take_along_axis(old, _relocation_orders(columns, start, stop, gap), axis=-1)
+    deltas = along[new[:, :-1], new[:, 1:]].sum(axis=1) - along[old[:, :-1], old[:, 1:]].sum(axis=1)
+
+    # Rows above and below have no boundary with the first and the last row
+    inner = row > 0
+    above = grid[row[inner] - 1]
+    deltas[inner] += (across[above, new[inner]] - across[above, old[inner]]).sum(axis=1)
+    inner = row < rows - 1
+    below = grid[row[inner] + 1]
+    deltas[inner] += (across[new[inner], below] - across[old[inner], below]).sum(axis=1)
+    return deltas
+
+
+def _relocation_orders(columns: int, start, stop, gap) -> np.ndarray:
+    '''Returns columns of pieces at each column of a row after moving segment start...stop - 1 before gap'''
+    start, stop, gap = (np.asarray(value)[..., np.newaxis] for value in (start, stop, gap))
+    length = stop - start
+    column = np.arange(columns)
+
+    # Segment moved to the left pushes pieces gap...start - 1 to the right
+    left = np.where(
+        (gap <= column) & (column < gap + length), start + column - gap,
+        np.where((gap + length <= column) & (column < stop), column - length, column)
+    )
+    # Segment moved to the right pulls pieces stop...gap - 1 to the left
+    right = np.where(
+        (start <= column) & (column < gap - length), column + length,
+        np.where((gap - length <= column) & (column < gap), start + column - gap + length, column)
+    )
+    return np.where(gap < start, left, right)
+
+
+def _row_costs(grid: np.ndarray, transposed: bool, measures: Optional[np.ndarray] = None) -> np.ndarray:
+    '''Returns sums of measures between every two rows of grid put one above the other'''
+    if measures is None:
+        measures = ImageAnalysis.current().dissimilarity_measures
+    plane = measures[0] if transposed else measures[1]
+    return plane[grid[:, np.newaxis, :], grid[np.newaxis, :, :]].sum(axis=-1, dtype=np.float64)
+
+
+def _shift_delta(costs: np.ndarray, start: int, stop: int, gap: int) -> float:
+    '''Returns change of sum of measures between rows caused by moving rows start...stop - 1 before row gap'''
+    rows = len(costs)
+    last = stop - 1
+
+    delta = 0.0
+    # Block is cut out and its former neighbours are joined
+    if start > 0:
+        delta -= costs[start - 1, start]
+    if stop < rows:
+        delta -= costs[last, stop]
+    if start > 0 and stop < rows:
+        delta += costs[start - 1, stop]
+
+    # Block is put between rows gap - 1 and gap
+    if 0 < gap < rows:
+        delta -= costs[gap - 1, gap]
+    if gap > 0:
+        delta += costs[gap - 1, start]
+    if gap < rows:
+        delta += costs[last, gap]
+    return delta
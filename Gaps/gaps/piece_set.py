@@ -0,0 +1,143 @@
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+
+class PieceSet(object):
+    '''All pieces of a puzzle stored as contiguous arrays.
+
+    Instead of a Piece object with its own float64 copy of pixels for every piece,
+    pixels of all pieces are kept in one (N, W, W, C) array in the image's own dtype.
+    Edges and gradients near edges of all pieces are precomputed as float32 slabs
+    of shape (N, W, C). Mean gradients and inverse covariances needed by the
+    Mahalanobis method are computed for all pieces at once, the first time they are used.
+
+    Indexing a PieceSet returns lightweight PieceView handles with the same attributes
+    as Piece, so code that works with single pieces keeps working.
+
+    :param images: Pixels of pieces, array of shape (N, W, W, C). Piece id is its index.
+
+    Usage::
+
+        >>> from gaps.image_helpers import flatten_image
+        >>> pieces, rows, columns = flatten_image(image, 32, indexed=True)
+        >>> right_edges = pieces.stack('right')
+        >>> piece = pieces[42]
+
+    '''
+
+    SIDES = ('top', 'right', 'bottom', 'left')
+
+    def __init__(self, images: np.ndarray):
+        self.images = images
+
+        # Edge strips and differences between them and their inner neighbours
+        self.edges = {
+            'top': images[:, 0, :, :].astype(np.float32),
+            'right': images[:, :, -1, :].astype(np.float32),
+            'bottom': images[:, -1, :, :].astype(np.float32),
+            'left': images[:, :, 0, :].astype(np.float32)
+        }
+        self.gradients = {
+            'top': self.edges['top'] - images[:, 1, :, :],
+            'right': self.edges['right'] - images[:, :, -2, :],
+            'bottom': self.edges['bottom'] - images[:, -2, :, :],
+            'left': self.edges['left'] - images[:, :, 1, :]
+        }
+
+        self._statistics: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, index: int) -> 'PieceView':
+        if not -len(self) <= index < len(self):
+            raise IndexError('piece index out of range')
+        return PieceView(self, index % len(self))
+
+    def __iter__(self) -> Iterator['PieceView']:
+        return (PieceView(self, index) for index in range(len(self)))
+
+    def piece_size(self) -> int:
+        '''Returns size of single piece'''
+        return self.images.shape[1]
+
+    def stack(self, attribute: str) -> np.ndarray:
+        '''Returns given attribute (same names as of Piece) of all pieces, indexed by piece id'''
+        if attribute in self.edges:
+            return self.edges[attribute]
+        return self.statistics()[attribute]
+
+    def statistics(self) -> Dict[str, np.ndarray]:
+        '''Returns mean gradients and inverse covariances of gradients near each edge of all pieces.
+
+        Keys are the attribute names of Piece, e.g. 'mu_left' of shape (N, C) and
+        'sigma_left_inv' of shape (N, C, C).
+
+        '''
+        if not self._statistics:
+            for side in self.SIDES:
+                gradient = self.gradients[side].astype(np.float64)
+                mu = gradient.mean(axis=1)
+                centered = gradient - mu[:, np.newaxis, :]
+                covariance = np.einsum('nki,nkj->nij', centered, centered) / (gradient.shape[1] - 1)
+
+                self._statistics['mu_' + side] = mu
+                self._statistics['sigma_{}_inv'.format(side)] = np.linalg.pinv(covariance)
+        return self._statistics
+
+
+class PieceView(object):
+    '''Handle of a single piece of a PieceSet.
+
+    Has the same attributes as Piece, but holds no data of its own.
+
+    :param pieces: PieceSet the piece belongs to.
+    :param index:  Id of the piece within the set.
+
+    '''
+
+    __slots__ = ('_pieces', 'id')
+
+    def __init__(self, pieces: PieceSet, index: int):
+        self._pieces = pieces
+        self.id = index
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        if name.startswith('sigma_') or name.startswith('mu_'):
+            try:
+                return self._pieces.statistics()[name][self.id]
+            except KeyError:
+                pass
+        raise AttributeError(name)
+
+    def __getitem__(self, index: int):
+        return self.image.__getitem__(index)
+
+    @property
+    def image(self) -> np.ndarray:
+        return self._pieces.images[self.id]
+
+    @property
+    def top(self) -> np.ndarray:
+        return self._pieces.edges['top'][self.id]
+
+    @property
+    def right(self) -> np.ndarray:
+        return self._pieces.edges['right'][self.id]
+
+    @property
+    def bottom(self) -> np.ndarray:
+        return self._pieces.edges['bottom'][self.id]
+
+    @property
+    def left(self) -> np.ndarray:
+        return self._pieces.edges['left'][self.id]
+
+    def size(self) -> int:
+        '''Returns piece size'''
+        return self.image.shape[0]
+
+    def shape(self) -> Tuple[int, int, int]:
+        '''Returns shape of piece's image'''
+        return self.image.shape
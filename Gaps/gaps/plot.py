@@ -4,12 +4,16 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.cbook
 
-warnings.filterwarnings('ignore', category=matplotlib.cbook.mplDeprecation)
+# Deprecation warnings of matplotlib, named mplDeprecation by versions before 3.6
+warnings.filterwarnings(
+    'ignore', category=getattr(matplotlib.cbook, 'mplDeprecation', matplotlib.MatplotlibDeprecationWarning)
+)
 
 
 class Plot(object):
 
-    def __init__(self, image: np.ndarray, title: str = 'Initial problem'):
+    def __init__(self, image: np.ndarray, title: str = 'Initial problem', pause: float = 0.05):
+        self._pause = pause
 
         aspect_ratio = image.shape[0] / image.shape[1]
         width = 8
@@ -29,5 +33,5 @@ class Plot(object):
         self._current_image.set_data(image)
         plt.draw()
 
-        # Give pyplot 0.05s to draw image
-        plt.pause(0.05)
+        # Give pyplot time to draw image
+        plt.pause(self._pause)
@@ -0,0 +1,99 @@
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+from gaps.piece import Piece
+from gaps.piece_set import PieceSet
+
+
+class Population(object):
+    '''Population of individuals kept as one matrix of permutations.
+
+    Row i of the matrix is the arrangement of individual i, ids of pieces
+    at each position, row by row. Fitness values of all individuals are
+    evaluated in one gather over dissimilarity measures and cached, so
+    elites, the best individual and selection read one vector.
+
+    :param pieces:       All pieces of the puzzle indexed by id (e.g. PieceSet).
+    :param rows:         Number of rows in input puzzle
+    :param columns:      Number of columns in input puzzle
+    :param permutations: Arrangements of individuals, shape (population_size, rows * columns).
+    :param analysis:     Analysis of the puzzle, the process-wide ImageAnalysis.current() if None.
+
+    Usage::
+
+        >>> from gaps.population import Population
+        >>> population = Population.random(pieces, rows, columns, 200)
+        >>> elite = population.elite_indices(2)
+        >>> fittest = population[population.best_index()]
+
+    '''
+
+    def __init__(
+        self, pieces: Union[Sequence[Piece], PieceSet], rows: int, columns: int, permutations: np.ndarray,
+        analysis: Optional[Analysis] = None
+    ):
+        self._pieces = pieces
+        self.analysis = analysis
+        self.rows = rows
+        self.columns = columns
+        self.permutations = np.asarray(permutations, dtype=np.int32)
+        self._fitness = None
+        self._individuals = {}
+
+    @classmethod
+    def random(
+        cls, pieces: PieceSet, rows: int, columns: int, size: int, random_state: Optional[np.random.RandomState] = None,
+        analysis: Optional[Analysis] = None
+    ) -> 'Population':
+        '''Creates population of randomly shuffled arrangements
+
+        :params random_state: numpy RandomState used for shuffling, global numpy random state by default.
+
+        '''
+        random = np.random if random_state is None else random_state
+        permutations = np.empty((size, len(pieces)), dtype=np.int32)
+        for permutation in permutations:
+            permutation[:] = np.arange(len(pieces), dtype=np.int32)
+            random.shuffle(permutation)
+        return cls(pieces, rows, columns, permutations, analysis)
+
+    def __len__(self) -> int:
+        return len(self.permutations)
+
+    def __getitem__(self, index: int) -> Individual:
+        # Individuals are kept, so tables they build (e.g. neighbours) are reused by every crossover
+        individual = self._individuals.get(index)
+        if individual is None:
+            individual = Individual(
+                self._pieces, self.rows, self.columns, shuffle=False, permutation=self.permutations[index],
+                analysis=self.analysis
+            )
+            self._individuals[index] = individual
+        # Fitness of the individual is already known
+        if individual._fitness is None and self._fitness is not None:
+            individual._fitness = float(self._fitness[index])
+        return individual
+
+    @property
+    def fitness(self) -> np.ndarray:
+        '''Fitness values of all individuals'''
+        if self._fitness is None:
+            self._fitness = Individual.batch_fitness(self.permutations, self.rows, self.columns, self.analysis)
+        return self._fitness
+
+    def elite_indices(self, count: int) -> np.ndarray:
+        '''Returns indices of 'count' fittest individuals, ordered from the least fit'''
+        count = min(count, len(self))
+        if count <= 0:
+            return np.empty(0, dtype=np.intp)
+
+        fitness = self.fitness
+        indices = np.argpartition(fitness, len(self) - count)[len(self) - count:]
+        return indices[np.lexsort((indices, fitness[indices]))]
+
+    def best_index(self) -> int:
+        '''Returns index of the fittest individual'''
+        return int(np.argmax(self.fitness))
@@ -0,0 +1,69 @@
+import heapq
+import itertools
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class PriorityQueue(object):
+    '''Binary heap of keyed items whose priorities can be changed or removed.
+
+    Every key has at most one live entry. Pushing a key which is already queued
+    replaces its priority (decrease or increase key); removing a key invalidates
+    its entry in place, and invalidated entries are dropped when they reach the top.
+    Entries are ordered by priority and then by insertion, like heapq.
+
+    Usage::
+
+        >>> from gaps.priority_queue import PriorityQueue
+        >>> queue = PriorityQueue()
+        >>> queue.push('a', (1.5, 'first'))
+        >>> queue.push('a', (0.5, 'first'))
+        >>> queue.pop()
+        ('a', (0.5, 'first'))
+
+    '''
+
+    def __init__(self):
+        self._heap: List[List[Any]] = []
+        self._entries: Dict[Hashable, List[Any]] = {}
+        self._counter = itertools.count()
+        # Number of entries pushed and popped, for instrumentation
+        self.pushes = 0
+        self.pops = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def push(self, key: Hashable, priority: Any):
+        '''Adds key with given priority, or changes priority of the queued key'''
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == priority:
+                return
+            entry[-1] = False
+        entry = [priority, next(self._counter), key, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        self.pushes += 1
+
+    def remove(self, key: Hashable):
+        '''Removes key from the queue if it is queued'''
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[-1] = False
+
+    def priority(self, key: Hashable) -> Any:
+        '''Returns priority of queued key'''
+        return self._entries[key][0]
+
+    def pop(self) -> Tuple[Hashable, Any]:
+        '''Removes and returns key with the lowest priority and its priority'''
+        while self._heap:
+            priority, _, key, valid = heapq.heappop(self._heap)
+            if valid:
+                del self._entries[key]
+                self.pops += 1
+                return key, priority
+        raise KeyError('pop from an empty priority queue')
@@ -0,0 +1,256 @@
+import multiprocessing
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from gaps import image_helpers
+from gaps.shared_arrays import SharedArrays
+
+# Longest title shown in window, in bytes of UTF-8
+TITLE_SIZE = 256
+
+
+class Renderer(ABC):
+    '''Shows the best individual of every generation off the solving thread.
+
+    Renderers get arrangements (ids of pieces at each position, row by row) and
+    assemble images themselves, so the solver only hands over a permutation.
+
+    :param image:      Puzzle being solved.
+    :param piece_size: Size of single square piece in pixels.
+
+    '''
+
+    def __init__(self, image: np.ndarray, piece_size: int):
+        self._image = image
+        self._piece_size = piece_size
+
+    def __enter__(self) -> 'Renderer':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @abstractmethod
+    def show(self, generation: int, permutation: np.ndarray, title: str):
+        '''Renders arrangement of pieces of given generation, returns without waiting for it'''
+
+    @abstractmethod
+    def close(self):
+        '''Stops rendering, renders arrangements which are still waiting first if the renderer keeps them all'''
+
+
+class WindowRenderer(Renderer):
+    '''Shows the latest best individual in a matplotlib window owned by another process.
+
+    show() copies the arrangement to shared memory and returns. The window process redraws
+    whenever a new arrangement is there, so it always shows the latest one and skips those
+    which came while it was drawing. Matplotlib is imported by the window process only.
+
+    :param pause: Seconds the window process waits for events between checks of new arrangements.
+
+    Usage::
+
+        >>> from gaps.renderer import WindowRenderer
+        >>> with WindowRenderer(puzzle, 32) as renderer:
+        ...     renderer.show(1, permutation, 'Generation: 1')
+
+    '''
+
+    def __init__(self, image: np.ndarray, piece_size: int, pause: float = 0.05):
+        super().__init__(image, piece_size)
+        _, rows, columns = image_helpers.flatten_image(image, piece_size)
+        self._shared = SharedArrays()
+        self._permutation = self._shared.create('permutation', (rows * columns,), np.int32)
+        self._title = self._shared.create('title', (TITLE_SIZE,), np.uint8)
+        self._version = self._shared.create('version', (1,), np.int64)
+        self._version[0] = 0
+        self._lock = multiprocessing.Lock()
+        self._stop = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_show_window,
+            args=(self._shared.specification(), self._lock, self._stop, image, piece_size, pause),
+            daemon=True
+        )
+        self._process.start()
+
+    def show(self, generation: int, permutation: np.ndarray, title: str):
+        title = title.encode()[:TITLE_SIZE]
+        with self._lock:
+            self._permutation[:] = permutation
+            self._title[:] = 0
+            self._title[:len(title)] = np.frombuffer(title, dtype=np.uint8)
+            self._version[0] += 1
+
+    def close(self):
+        if self._shared is None:
+            return
+        self._stop.set()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._shared.unlink()
+        self._shared.close()
+        self._shared = None
+
+
+class FrameWriter(Renderer):
+    '''Writes the best individual to image files and/or an animation, without any window.
+
+    Every 'every'-th generation is assembled and written by a background thread, and the last
+    shown generation is written on close() too. Frames are PNG files named by generation;
+    animation is a video (.avi, .mp4) or an animated .gif, which needs Pillow.
+    Matplotlib is not imported, so it works on machines without a display.
+
+    Videos are written frame by frame. GIF frames are kept in memory until close(), so at most
+    max_gif_frames of them are kept: when there are more, every other one is dropped and only every
+    2nd (4th, ...) frame is kept from then on. The last frame is always kept.
+
+    :param directory: Directory of PNG frames, none are written if None.
+    :param animation: Path of video or animated GIF, none is written if None.
+    :param every:     Number of generations between written frames.
+    :param fps:       Frames per second of animation.
+    :param max_gif_frames: Most frames of an animated GIF.
+
+    Usage::
+
+        >>> from gaps.renderer import FrameWriter
+        >>> with FrameWriter(puzzle, 32, directory='frames', animation='solving.gif', every=5) as writer:
+        ...     writer.show(5, permutation, 'Generation: 5')
+
+    '''
+
+    def __init__(
+        self, image: np.ndarray, piece_size: int, directory: Optional[str] = None, animation: Optional[str] = None,
+        every: int = 1, fps: int = 5, max_gif_frames: int = 200
+    ):
+        super().__init__(image, piece_size)
+        self._grid, self._rows, self._columns = image_helpers.flatten_image(image, piece_size)
+        self._directory = None if directory is None else os.path.expanduser(directory)
+        self._animation = None if animation is None else os.path.expanduser(animation)
+        self._every = max(1, every)
+        self._fps = fps
+        if self._directory is not None:
+            os.makedirs(self._directory, exist_ok=True)
+
+        self._video = None
+        self._gif_frames: List[np.ndarray] = []
+        self._max_gif_frames = max(2, max_gif_frames)
+        # Every _gif_stride-th frame is kept, _gif_count frames have come so far, the latest is _gif_last
+        self._gif_stride = 1
+        self._gif_count = 0
+        self._gif_last: Optional[np.ndarray] = None
+        self._last = None
+        self._written = None
+        self._error: Optional[BaseException] = None
+        self._frames: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_frames, daemon=True)
+        self._thread.start()
+
+    def show(self, generation: int, permutation: np.ndarray, title: str):
+        self._last = (generation, np.array(permutation, dtype=np.int32))
+        if generation % self._every == 0:
+            self._frames.put(self._last)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._frames.put(self._last)
+        self._frames.put(None)
+        self._thread.join()
+        self._thread = None
+
+        if self._video is not None:
+            self._video.release()
+        if self._error is not None:
+            raise RuntimeError('Writing frames failed') from self._error
+        if self._gif_last is not None:
+            from PIL import Image
+
+            if (self._gif_count - 1) % self._gif_stride:
+                self._gif_frames.append(self._gif_last)
+            frames = [Image.fromarray(frame) for frame in self._gif_frames]
+            frames[0].save(
+                self._animation, save_all=True, append_images=frames[1:], duration=int(1000 / self._fps), loop=0
+            )
+
+    def _write_frames(self):
+        while True:
+            frame = self._frames.get()
+            if frame is None:
+                return
+            generation, permutation = frame
+            # The last generation may have been written already
+            if generation == self._written:
+                continue
+            self._written = generation
+            try:
+                self._write(
+                    generation, image_helpers.assemble_image(self._grid, self._rows, self._columns, permutation)
+                )
+            except Exception as error:
+                # Reported by close(), frames which follow are dropped
+                self._error = error
+                return
+
+    def _write(self, generation: int, image: np.ndarray):
+        if self._directory is not None:
+            path = os.path.join(self._directory, 'generation_{:05d}.png'.format(generation))
+            cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+
+        if self._animation is None:
+            return
+        if self._animation.lower().endswith('.gif'):
+            self._add_gif_frame(image)
+            return
+        if self._video is None:
+            codec = 'mp4v' if self._animation.lower().endswith('.mp4') else 'MJPG'
+            self._video = cv2.VideoWriter(
+                self._animation, cv2.VideoWriter_fourcc(*codec), self._fps, (image.shape[1], image.shape[0])
+            )
+        self._video.write(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+
+    def _add_gif_frame(self, image: np.ndarray):
+        if self._gif_count % self._gif_stride == 0:
+            self._gif_frames.append(image)
+            if len(self._gif_frames) >= self._max_gif_frames:
+                # Kept frames are frames 0, stride, 2 * stride, ... so every other one is dropped
+                self._gif_frames = self._gif_frames[::2]
+                self._gif_stride *= 2
+        self._gif_count += 1
+        self._gif_last = image
+
+
+def _show_window(
+    specification: dict, lock, stop, image: np.ndarray, piece_size: int, pause: float
+):
+    '''Redraws window with the latest arrangement until stop is set'''
+    # Interactive backend is imported by the window process only
+    import matplotlib.pyplot as plt
+
+    from gaps.plot import Plot
+
+    shared = SharedArrays.attach(specification)
+    grid, rows, columns = image_helpers.flatten_image(image, piece_size)
+    plot = Plot(image, pause=pause)
+    shown_version = 0
+    try:
+        while not stop.is_set():
+            with lock:
+                version = int(shared['version'][0])
+                if version != shown_version:
+                    permutation = shared['permutation'].copy()
+                    title = shared['title'].tobytes().rstrip(b'\0').decode(errors='ignore')
+
+            if version == shown_version:
+                plt.pause(pause)
+                continue
+            shown_version = version
+            plot.show_fittest(image_helpers.assemble_image(grid, rows, columns, permutation), title)
+    finally:
+        shared.close()
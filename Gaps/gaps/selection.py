@@ -1,13 +1,22 @@
-'''Selects fittest individuals from given population.'''
+'''Selects fittest individuals from given population.
 
-from typing import List, Tuple
+Every selection draws parents of all children at once and returns pairs
+of parents, one pair for each individual which is not an elite.
+Selections are registered in SELECTIONS by name.
+'''
+
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 
 from gaps.individual import Individual
+from gaps.population import Population
 
 
-def roulette_selection(population: List[Individual], elites: int = 4) -> List[Tuple[Individual, Individual]]:
+def roulette_selection(
+    population: Union[List[Individual], Population], elites: int = 4,
+    random_state: Optional[np.random.RandomState] = None
+) -> List[Tuple[Individual, Individual]]:
     '''Roulette wheel selection.
 
     Each individual is selected to reproduce, with probability directly
@@ -15,6 +24,7 @@ def roulette_selection(population: List[Individual], elites: int = 4) -> List[Tu
 
     :params population: Collection of the individuals for selecting.
     :params elite: Number of elite individuals passed to next generation.
+    :params random_state: numpy RandomState used for drawing, global numpy random state by default.
 
     Usage::
 
@@ -22,20 +32,81 @@ def roulette_selection(population: List[Individual], elites: int = 4) -> List[Tu
         >>> selected_parents = roulette_selection(population, 10)
 
     '''
-    fitness_values = np.array([individual.fitness for individual in population])
-    probability_intervals = np.cumsum(fitness_values)
-
-    def select_individual() -> float:
-        '''Selects random individual from population based on fitess value'''
-        select_1 = np.random.uniform(0, probability_intervals[-1])
-        select_2 = np.random.uniform(0, probability_intervals[-1])
-        index_1, index_2 = np.searchsorted(probability_intervals, [select_1, select_2])
-        
-        return population[index_1], population[index_2]
-
-    selected = []
-    for _ in range(len(population) - elites):
-        first, second = select_individual()
-        selected.append((first, second))
-
-    return selected
+    probability_intervals = np.cumsum(_fitness_values(population))
+    random = np.random if random_state is None else random_state
+
+    selections = random.uniform(0, probability_intervals[-1], (_pairs_count(population, elites), 2))
+    return _pairs(population, np.searchsorted(probability_intervals, selections))
+
+
+def tournament_selection(
+    population: Union[List[Individual], Population], elites: int = 4,
+    random_state: Optional[np.random.RandomState] = None, tournament_size: int = 3
+) -> List[Tuple[Individual, Individual]]:
+    '''Tournament selection.
+
+    Each parent is the fittest of 'tournament_size' individuals drawn uniformly.
+    Unlike roulette wheel, selection pressure does not fade when fitness
+    values get close to each other; larger tournaments select harder.
+
+    :params tournament_size: Number of individuals competing for each parent.
+
+    Other parameters are the same as of roulette_selection.
+
+    '''
+    fitness_values = _fitness_values(population)
+    random = np.random if random_state is None else random_state
+
+    competitors = random.randint(0, len(population), (_pairs_count(population, elites), 2, tournament_size))
+    winners = np.argmax(fitness_values[competitors], axis=-1)
+    return _pairs(population, np.take_along_axis(competitors, winners[..., np.newaxis], axis=-1)[..., 0])
+
+
+def stochastic_universal_selection(
+    population: Union[List[Individual], Population], elites: int = 4,
+    random_state: Optional[np.random.RandomState] = None
+) -> List[Tuple[Individual, Individual]]:
+    '''Stochastic universal sampling.
+
+    Selects with the same probabilities as roulette wheel, but all parents are
+    picked by equally spaced pointers with one random offset, so the number of times
+    an individual is selected never strays far from its expected value.
+    Selected parents are shuffled before they are paired.
+
+    Parameters are the same as of roulette_selection.
+
+    '''
+    probability_intervals = np.cumsum(_fitness_values(population))
+    random = np.random if random_state is None else random_state
+
+    count = 2 * _pairs_count(population, elites)
+    pointers = (random.uniform() + np.arange(count)) * (probability_intervals[-1] / max(count, 1))
+    selections = random.permutation(np.searchsorted(probability_intervals, pointers))
+    return _pairs(population, selections.reshape(-1, 2))
+
+
+# Selection by name, each is called as selection(population, elites, random_state)
+SELECTIONS: Dict[str, Callable[..., List[Tuple[Individual, Individual]]]] = {
+    'roulette': roulette_selection,
+    'tournament': tournament_selection,
+    'sus': stochastic_universal_selection
+}
+
+
+def _fitness_values(population: Union[List[Individual], Population]) -> np.ndarray:
+    '''Returns fitness values of all individuals of population'''
+    if isinstance(population, Population):
+        return population.fitness
+    return np.array([individual.fitness for individual in population])
+
+
+def _pairs_count(population: Union[List[Individual], Population], elites: int) -> int:
+    '''Returns number of pairs of parents needed for the next generation'''
+    return max(0, len(population) - elites)
+
+
+def _pairs(population: Union[List[Individual], Population], indices: np.ndarray) -> List[Tuple[Individual, Individual]]:
+    '''Returns pairs of individuals of population at given (K, 2) indices'''
+    # Searching right past the last interval is possible due to rounding only
+    indices = np.minimum(indices, len(population) - 1).tolist()
+    return [(population[first], population[second]) for first, second in indices]
@@ -0,0 +1,91 @@
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+class SharedArrays(object):
+    '''Named numpy arrays living in shared memory.
+
+    Arrays are created (or copied) into multiprocessing.shared_memory blocks
+    by one process and attached by the others through specification(), so
+    worker processes read and write them without copying or pickling.
+
+    The creating process should call unlink() once no other process needs
+    to attach anymore; its own arrays stay valid until close().
+
+    Usage::
+
+        >>> from gaps.shared_arrays import SharedArrays
+        >>> shared = SharedArrays()
+        >>> edges = shared.add('edges', edges)
+        >>> # in a worker process
+        >>> edges = SharedArrays.attach(specification)['edges']
+
+    '''
+
+    def __init__(self):
+        self._blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._owner = True
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._arrays
+
+    @property
+    def owned(self) -> bool:
+        '''True if this process created the blocks and did not unlink them yet'''
+        return self._owner
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        '''Returns all shared arrays by name'''
+        return dict(self._arrays)
+
+    def create(self, name: str, shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        '''Creates new uninitialized shared array'''
+        dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self._blocks[name] = block
+        self._arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return self._arrays[name]
+
+    def add(self, name: str, array: np.ndarray) -> np.ndarray:
+        '''Copies given array into new shared array'''
+        shared = self.create(name, array.shape, array.dtype)
+        shared[...] = array
+        return shared
+
+    def specification(self) -> Dict[str, Tuple[str, Tuple[int, ...], str]]:
+        '''Returns picklable description of arrays used by attach()'''
+        return {
+            name: (self._blocks[name].name, array.shape, array.dtype.str) for name, array in self._arrays.items()
+        }
+
+    @classmethod
+    def attach(cls, specification: Dict[str, Tuple[str, Tuple[int, ...], str]]) -> 'SharedArrays':
+        '''Attaches to arrays created by another process'''
+        shared = cls()
+        shared._owner = False
+        for name, (block_name, shape, dtype) in specification.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            shared._blocks[name] = block
+            shared._arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return shared
+
+    def unlink(self):
+        '''Removes names of shared blocks, memory is freed once every process closes them'''
+        if self._owner:
+            for block in self._blocks.values():
+                block.unlink()
+            self._owner = False
+
+    def close(self):
+        '''Releases arrays of this process, arrays must not be used afterwards'''
+        self._arrays.clear()
+        for block in self._blocks.values():
+            block.close()
+        self._blocks.clear()
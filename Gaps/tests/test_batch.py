@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from gaps import image_helpers
+from gaps.batch import BatchSolver, puzzle_sources
+from gaps.genetic_algorithm import GeneticAlgorithm
+
+PIECE_SIZE = 8
+ROWS = 3
+COLUMNS = 4
+
+
+def write_puzzle(path, seed):
+    y, x = np.mgrid[0:ROWS * PIECE_SIZE, 0:COLUMNS * PIECE_SIZE]
+    image = np.stack([x * 7, y * 9, (x + y) * 4], axis=-1).clip(0, 255).astype(np.uint8)
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE)
+    permutation = np.random.RandomState(seed).permutation(ROWS * COLUMNS)
+    cv2.imwrite(str(path), image_helpers.assemble_image(pieces, ROWS, COLUMNS, permutation))
+
+
+def test_puzzle_sources_of_directory_and_manifest(tmp_path):
+    for name in ('b.png', 'a.jpg', 'notes.txt'):
+        (tmp_path / name).write_bytes(b'')
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text('# puzzles\nb.png\n\n/elsewhere/c.png\n')
+
+    assert puzzle_sources(str(tmp_path)) == [str(tmp_path / 'a.jpg'), str(tmp_path / 'b.png')]
+    assert puzzle_sources(str(manifest)) == [str(tmp_path / 'b.png'), '/elsewhere/c.png']
+
+
+def test_records_of_solved_and_unreadable_puzzles(tmp_path):
+    write_puzzle(tmp_path / 'puzzle.png', 0)
+    (tmp_path / 'broken.png').write_bytes(b'not an image')
+    output_dir = tmp_path / 'solutions'
+
+    solver = BatchSolver(
+        output_dir=str(output_dir), piece_size=PIECE_SIZE, population_size=10, generations=3, seed=0
+    )
+    records = {record['source']: record for record in solver.solve(puzzle_sources(str(tmp_path)))}
+
+    solved = records[str(tmp_path / 'puzzle.png')]
+    assert solved['error'] is None
+    assert (solved['rows'], solved['columns'], solved['piece_size']) == (ROWS, COLUMNS, PIECE_SIZE)
+    assert sorted(solved['permutation']) == list(range(ROWS * COLUMNS))
+    assert solved['fitness'] > 0 and solved['generations'] > 0
+    assert {'reading', 'analysis', 'crossover', 'solving', 'writing'} <= set(solved['timings'])
+    assert cv2.imread(solved['output']).shape == (ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)
+
+    broken = records[str(tmp_path / 'broken.png')]
+    assert 'Cannot read image' in broken['error'] and broken['output'] is None
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='workers must inherit the patched solver')
+def test_crashed_workers_give_error_records(tmp_path, monkeypatch):
+    for seed in range(3):
+        write_puzzle(tmp_path / 'puzzle{}.png'.format(seed), seed)
+
+    def crash(self, verbose):
+        os._exit(1)
+
+    monkeypatch.setattr(GeneticAlgorithm, 'start_evolution', crash)
+    solver = BatchSolver(workers=2, piece_size=PIECE_SIZE, population_size=10, generations=3, seed=0)
+    records = list(solver.solve(puzzle_sources(str(tmp_path))))
+
+    assert sorted(record['index'] for record in records) == [0, 1, 2]
+    assert all('BrokenProcessPool' in record['error'] and record['fitness'] is None for record in records)
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+import numpy as np
+
+from gaps.checkpoint import (
+    Checkpoint, python_random_arrays, random_state_arrays, restore_python_random, restore_random_state,
+    restore_seed_sequence, seed_sequence_arrays
+)
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'run.npz')
+    permutations = np.arange(12, dtype=np.int32).reshape(3, 4)
+    Checkpoint({'permutations': permutations, 'generation': np.array(7)}).save(path)
+    Checkpoint({'permutations': permutations[::-1], 'generation': np.array(8)}).save(path)
+
+    checkpoint = Checkpoint.load(path)
+    assert np.array_equal(checkpoint['permutations'], permutations[::-1])
+    assert int(checkpoint['generation']) == 8
+    assert [entry.name for entry in tmp_path.iterdir()] == ['run.npz']
+
+
+def test_load_rejects_other_version(tmp_path):
+    path = str(tmp_path / 'run.npz')
+    np.savez(path, version=np.array(Checkpoint.VERSION + 1))
+    with pytest.raises(ValueError):
+        Checkpoint.load(path)
+
+
+def test_random_states_continue_after_restore():
+    random_state = np.random.RandomState(3)
+    random_state.normal()
+    random.seed(3)
+    seed_sequence = np.random.SeedSequence(2 ** 100 + 1)
+    seed_sequence.spawn(2)
+
+    checkpoint = Checkpoint({
+        **random_state_arrays(random_state, 'numpy'), **python_random_arrays('python'),
+        **seed_sequence_arrays(seed_sequence, 'sequence')
+    })
+    expected = (random_state.normal(size=3), random.random(), seed_sequence.spawn(1)[0].generate_state(2))
+
+    restored_state = np.random.RandomState()
+    restore_random_state(restored_state, checkpoint, 'numpy')
+    random.seed(5)
+    restore_python_random(checkpoint, 'python')
+    restored_sequence = restore_seed_sequence(checkpoint, 'sequence')
+
+    assert np.array_equal(restored_state.normal(size=3), expected[0])
+    assert random.random() == expected[1]
+    assert np.array_equal(restored_sequence.spawn(1)[0].generate_state(2), expected[2])
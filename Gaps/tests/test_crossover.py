@@ -0,0 +1,54 @@
+import random
+
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+from gaps.crossover import Crossover
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+
+PIECE_SIZE = 8
+ROWS = 4
+COLUMNS = 5
+
+
+@pytest.fixture
+def pieces():
+    random_state = np.random.RandomState(0)
+    image = random_state.randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)).astype(np.uint8)
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    return pieces
+
+
+@pytest.fixture
+def analysis(pieces):
+    return Analysis.analyze(pieces, 'L2', top_k=2)
+
+
+def test_child_is_arrangement_of_all_pieces(pieces, analysis):
+    np.random.seed(0)
+    random.seed(0)
+    for _ in range(10):
+        crossover = Crossover(
+            Individual(pieces, ROWS, COLUMNS, analysis=analysis), Individual(pieces, ROWS, COLUMNS, analysis=analysis)
+        )
+        crossover.run()
+        child = crossover.child()
+
+        assert (child.rows, child.columns) == (ROWS, COLUMNS)
+        assert sorted(child.permutation) == list(range(ROWS * COLUMNS))
+
+
+def test_same_random_state_gives_the_same_child(pieces, analysis):
+    np.random.seed(1)
+    parents = Individual(pieces, ROWS, COLUMNS, analysis=analysis), Individual(pieces, ROWS, COLUMNS, analysis=analysis)
+
+    children = []
+    for _ in range(2):
+        random.seed(1)
+        crossover = Crossover(*parents)
+        crossover.run()
+        children.append(crossover.child().permutation)
+
+    assert np.array_equal(*children)
@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+from gaps.crossover_pool import CrossoverPool, build_child
+from gaps.image_analysis import Analysis
+from gaps.population import Population
+
+PIECE_SIZE = 8
+ROWS = 4
+COLUMNS = 5
+
+
+@pytest.fixture
+def population():
+    random_state = np.random.RandomState(0)
+    image = random_state.randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)).astype(np.uint8)
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    return pieces, Population.random(pieces, ROWS, COLUMNS, 10, np.random.RandomState(1)).permutations
+
+
+@pytest.mark.parametrize("memory_mapped", [False, True])
+def test_pool_children_match_serial_children(population, memory_mapped, tmp_path):
+    pieces, permutations = population
+    path = str(tmp_path / 'measures.npy') if memory_mapped else None
+    analysis = Analysis.analyze(pieces, 'L2', top_k=3, path=path)
+    population = Population(pieces, ROWS, COLUMNS, permutations, analysis)
+
+    pairs = [(population[index], population[(3 * index + 1) % len(population)]) for index in range(len(population))]
+    seeds = np.arange(len(pairs)) * 7919
+    expected = np.array([build_child(first, second, seed).permutation for (first, second), seed in zip(pairs, seeds)])
+
+    with CrossoverPool(2, ROWS, COLUMNS, analysis) as pool:
+        children = pool.children(
+            np.array([first.permutation for first, _ in pairs]), np.array([second.permutation for _, second in pairs]),
+            seeds
+        )
+
+    assert np.array_equal(children, expected)
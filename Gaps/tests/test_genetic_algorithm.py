@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import numpy as np
+
+from gaps.genetic_algorithm import GeneticAlgorithm
+from gaps.instrumentation import Instrumentation
+
+PIECE_SIZE = 8
+ROWS = 4
+COLUMNS = 5
+
+
+@pytest.fixture
+def puzzle():
+    y, x = np.mgrid[0:ROWS * PIECE_SIZE, 0:COLUMNS * PIECE_SIZE]
+    image = np.stack([x * 6, y * 7, (x + y) * 3], axis=-1)
+    image = image + np.random.RandomState(0).randint(0, 10, image.shape)
+    return image.clip(0, 255).astype(np.uint8)
+
+
+def solve(puzzle, **options):
+    algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', **options)
+    return algorithm.start_evolution(verbose=False).permutation
+
+
+def test_evolve_can_stop_at_any_generation(puzzle):
+    algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=0)
+
+    snapshots = []
+    for snapshot in algorithm.evolve():
+        snapshots.append(snapshot)
+        if snapshot.generation == 2:
+            break
+
+    assert [snapshot.generation for snapshot in snapshots] == [1, 2]
+    assert snapshots[1].best_fitness >= snapshots[0].best_fitness >= snapshots[0].mean_fitness
+    assert np.array_equal(algorithm.solution().permutation, snapshots[1].best_permutation)
+
+
+def test_stalled_counts_generations_without_improvement(puzzle):
+    algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 50, 'L2', seed=1)
+    algorithm.TERMINATION_THRESHOLD = 2
+
+    snapshots = list(algorithm.evolve())
+
+    stalled = 0
+    for previous, snapshot in zip(snapshots, snapshots[1:]):
+        stalled += snapshot.best_fitness <= previous.best_fitness
+        assert snapshot.stalled == stalled
+    # Evolution stops as soon as the best fitness stalls for the threshold
+    assert snapshots[-1].stalled == 2 and snapshots[-1].generation < 50
+    assert all(snapshot.stalled < 2 for snapshot in snapshots[:-1])
+
+
+def test_evolve_and_start_evolution_find_the_same_solution(puzzle):
+    algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=2)
+    snapshots = list(algorithm.evolve())
+
+    assert np.array_equal(snapshots[-1].best_permutation, solve(puzzle, seed=2))
+    assert np.array_equal(algorithm.solution().permutation, solve(puzzle, seed=2))
+
+
+def test_snapshots_carry_counters_of_their_generation(puzzle):
+    algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=3)
+    assert next(algorithm.evolve()).counters == {}
+
+    Instrumentation.enable()
+    try:
+        snapshot = next(GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=3).evolve())
+    finally:
+        Instrumentation.disable()
+    assert snapshot.counters['dissimilarity_lookups'] > 0
+    assert snapshot.timers['crossover'] > 0
+
+
+def test_seed_makes_solution_reproducible(puzzle):
+    assert np.array_equal(solve(puzzle, seed=3), solve(puzzle, seed=3))
+
+
+def test_resumed_run_ends_with_the_same_solution(puzzle, tmp_path):
+    path = str(tmp_path / 'run.npz')
+    expected = solve(puzzle, seed=4)
+
+    algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=4, checkpoint=path)
+    for snapshot in algorithm.evolve():
+        if snapshot.generation == 2:
+            break
+
+    assert np.array_equal(solve(puzzle, seed=4, checkpoint=path, resume=True), expected)
+
+
+def test_immigrants_replace_the_least_fit(puzzle):
+    algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=5)
+    next(algorithm.evolve())
+    population = algorithm.emigrants(20)
+    fittest = population[-1]
+
+    algorithm.immigrate(fittest[np.newaxis])
+
+    def copies(permutations):
+        return sum(np.array_equal(permutation, fittest) for permutation in permutations)
+
+    # Emigrants are ordered from the least fit
+    assert copies(algorithm.emigrants(20)) == copies(population) + 1
+    assert len(algorithm.emigrants(30)) == len(population)
+
+
+def test_runs_of_different_puzzles_do_not_share_analysis(puzzle):
+    other = np.ascontiguousarray(puzzle[::-1, ::-1])
+    expected = [solve(puzzle, seed=6), solve(other, seed=7)]
+
+    # The second puzzle is analyzed while the first one evolves
+    algorithms = [
+        GeneticAlgorithm(image, PIECE_SIZE, 20, 8, 'L2', seed=seed) for image, seed in [(puzzle, 6), (other, 7)]
+    ]
+    evolutions = [algorithm.evolve() for algorithm in algorithms]
+    for _ in zip(*evolutions):
+        pass
+    for algorithm, permutation in zip(algorithms, expected):
+        assert np.array_equal(algorithm.solution().permutation, permutation)
+
+    with ThreadPoolExecutor(2) as executor:
+        solutions = list(executor.map(lambda image, seed: solve(image, seed=seed), [puzzle, other], [6, 7]))
+    for solution, permutation in zip(solutions, expected):
+        assert np.array_equal(solution, permutation)
+
+
+def test_analysis_is_reused_by_other_runs(puzzle):
+    first = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=8)
+    first.start_evolution(verbose=False)
+
+    second = GeneticAlgorithm(puzzle, PIECE_SIZE, 20, 8, 'L2', seed=9, analysis=first.analysis)
+    assert np.array_equal(second.start_evolution(verbose=False).permutation, solve(puzzle, seed=9))
+    assert second.analysis is first.analysis
+
+
+def test_workers_attach_to_analysis_cached_on_a_cold_cache(puzzle, tmp_path):
+    expected = solve(puzzle, seed=10, workers=2)
+
+    # The first run analyzes and caches, the second one loads the analysis
+    assert np.array_equal(solve(puzzle, seed=10, workers=2, cache_dir=str(tmp_path)), expected)
+    assert np.array_equal(solve(puzzle, seed=10, workers=2, cache_dir=str(tmp_path)), expected)
+
+
+def test_analysis_file_is_not_combined_with_cache(puzzle, tmp_path):
+    with pytest.raises(ValueError):
+        GeneticAlgorithm(
+            puzzle, PIECE_SIZE, 20, 8, 'L2', analysis_file=str(tmp_path / 'measures.npy'), cache_dir=str(tmp_path)
+        )
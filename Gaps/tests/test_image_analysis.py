@@ -0,0 +1,225 @@
+import os
+
+import pytest
+import numpy as np
+
+from gaps import image_analysis, image_helpers
+from gaps.fitness import dissimilarity_measure
+from gaps.analysis_cache import AnalysisCache
+from gaps.image_analysis import Analysis, ImageAnalysis
+
+PIECE_SIZE = 8
+ROWS = 3
+COLUMNS = 4
+
+
+@pytest.fixture
+def pieces():
+    random_state = np.random.RandomState(0)
+    image = random_state.randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)).astype(np.uint8)
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    return pieces
+
+
+@pytest.mark.parametrize("method", ["L2", "Mahalanobis"])
+def test_analysis_matches_pairwise_measure(pieces, method):
+    analysis = Analysis.analyze(pieces, method)
+
+    for first in pieces:
+        for second in pieces:
+            if first.id == second.id:
+                continue
+            for orientation in ['LR', 'TD']:
+                expected = dissimilarity_measure(first, second, method, orientation)
+                actual = analysis.get_dissimilarity((first.id, second.id), orientation)
+                assert np.isclose(actual, expected)
+
+
+@pytest.mark.parametrize("top_k", [1, 4, 32])
+def test_best_match_table_matches_full_sort(pieces, top_k):
+    # Duplicated pieces give ties which must be broken by piece id
+    pieces[7].right[:] = pieces[3].right
+    analysis = Analysis.analyze(pieces, 'L2', top_k=top_k)
+    table = analysis.best_match_table
+
+    for piece in pieces:
+        for orientation in ['T', 'R', 'D', 'L']:
+            ids, measures = table.full_row(piece.id, orientation)
+            top_ids, top_measures = table.row(piece.id, orientation)
+
+            expected = sorted(
+                (table_measure(analysis, piece.id, other.id, orientation), other.id) for other in pieces if other.id != piece.id
+            )
+            assert list(zip(measures, ids)) == expected
+            assert np.array_equal(top_ids, ids[:min(top_k, len(pieces) - 1)])
+            assert np.array_equal(top_measures, measures[:min(top_k, len(pieces) - 1)])
+            assert analysis.best_match(piece.id, orientation) == ids[0]
+
+
+@pytest.mark.parametrize("top_k", [0, 4])
+def test_best_buddies_are_mutual_best_matches(pieces, top_k):
+    # Piece 5 fits right of piece 2 perfectly
+    pieces[5].left[:] = pieces[2].right
+    analysis = Analysis.analyze(pieces, 'L2', top_k=top_k)
+    complementary = {'T': 'D', 'R': 'L', 'D': 'T', 'L': 'R'}
+
+    for piece in pieces:
+        for index, orientation in enumerate(['T', 'R', 'D', 'L']):
+            best = analysis.best_match(piece.id, orientation)
+            mutual = analysis.best_match(best, complementary[orientation]) == piece.id
+            assert analysis.best_buddies[piece.id, index] == (best if mutual else -1)
+
+    assert analysis.best_buddies[2, 1] == 5 and analysis.best_buddies[5, 3] == 2
+    assert analysis.buddy_fraction() == np.mean(analysis.best_buddies >= 0) > 0
+
+
+def table_measure(analysis, piece, other, orientation):
+    if orientation == 'T':
+        return analysis.get_dissimilarity((other, piece), 'TD')
+    if orientation == 'R':
+        return analysis.get_dissimilarity((piece, other), 'LR')
+    if orientation == 'D':
+        return analysis.get_dissimilarity((piece, other), 'TD')
+    return analysis.get_dissimilarity((other, piece), 'LR')
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_vectorized_lookup_matches_single_lookup(pieces, dtype):
+    analysis = Analysis.analyze(pieces, 'L2', dtype=dtype)
+    first_ids = np.array([0, 1, 5, 11])
+    second_ids = np.array([3, 0, 6, 2])
+
+    for orientation in ['LR', 'TD']:
+        measures = analysis.get_dissimilarities(first_ids, second_ids, orientation)
+        assert measures.dtype == dtype
+        for first, second, measure in zip(first_ids, second_ids, measures):
+            assert analysis.get_dissimilarity((first, second), orientation) == measure
+
+
+
+@pytest.mark.parametrize("method", ["L2", "Mahalanobis"])
+def test_blocked_memory_mapped_analysis_matches_in_memory(pieces, method, tmp_path):
+    analysis = Analysis.analyze(pieces, method, top_k=3)
+    expected_measures = np.array(analysis.dissimilarity_measures)
+    expected_table = analysis.best_match_table
+
+    # Budget small enough for blocks of a single row
+    path = str(tmp_path / 'measures.npy')
+    analysis = Analysis.analyze(pieces, method, top_k=3, memory_budget=1, path=path)
+
+    assert isinstance(analysis.dissimilarity_measures, np.memmap)
+    assert np.array_equal(np.load(path), expected_measures)
+    table = analysis.best_match_table
+    for orientation in ['T', 'R', 'D', 'L']:
+        assert np.array_equal(table.indices[orientation], expected_table.indices[orientation])
+        assert np.array_equal(table.measures[orientation], expected_table.measures[orientation])
+
+
+def test_analysis_cache_round_trip(pieces, tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+
+    analysis, loaded = cache.load_or_analyze(pieces, 'L2', top_k=3)
+    assert not loaded
+    expected_measures = np.array(analysis.dissimilarity_measures)
+    expected_indices = analysis.best_match_table.indices
+
+    analysis, loaded = cache.load_or_analyze(pieces, 'L2', top_k=3)
+    assert loaded
+    assert isinstance(analysis.dissimilarity_measures, np.memmap)
+    assert np.array_equal(analysis.dissimilarity_measures, expected_measures)
+    for orientation in ['T', 'R', 'D', 'L']:
+        assert np.array_equal(analysis.best_match_table.indices[orientation], expected_indices[orientation])
+
+    assert not cache.load_or_analyze(pieces, 'L2', top_k=3, rebuild=True)[1]
+    analysis, loaded = cache.load_or_analyze(pieces, 'Mahalanobis', top_k=3)
+    assert not loaded
+    # Measures of a fresh analysis are mapped from the cache entry, not from its temporary directory
+    assert os.path.dirname(analysis.dissimilarity_measures.filename) == cache.path(
+        cache.key(pieces, 'Mahalanobis', np.float64, 3)
+    )
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.parametrize("method", ["L2", "Mahalanobis"])
+@pytest.mark.parametrize("memory_mapped", [False, True])
+def test_parallel_analysis_matches_serial(pieces, method, memory_mapped, tmp_path):
+    analysis = Analysis.analyze(pieces, method, top_k=3)
+    expected_measures = np.array(analysis.dissimilarity_measures)
+    expected_table = analysis.best_match_table
+
+    path = str(tmp_path / 'measures.npy') if memory_mapped else None
+    analysis = Analysis.analyze(pieces, method, top_k=3, path=path, workers=2)
+
+    assert np.array_equal(analysis.dissimilarity_measures, expected_measures)
+    table = analysis.best_match_table
+    for orientation in ['T', 'R', 'D', 'L']:
+        assert np.array_equal(table.indices[orientation], expected_table.indices[orientation])
+        assert np.array_equal(table.measures[orientation], expected_table.measures[orientation])
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='shared memory blocks are not files')
+def test_failed_parallel_analysis_releases_shared_memory(pieces, monkeypatch):
+    def fail(*args):
+        raise ValueError('analysis failure')
+
+    def shared_blocks():
+        return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+    # Forked workers inherit the failing function
+    monkeypatch.setattr(image_analysis, '_measure_rows', fail)
+    blocks = shared_blocks()
+    with pytest.raises(ValueError):
+        Analysis.analyze(pieces, 'L2', workers=2)
+
+    assert shared_blocks() <= blocks
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='shared memory blocks are not files')
+def test_parallel_analysis_is_shared_without_copy(pieces):
+    def shared_blocks():
+        return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+    blocks = shared_blocks()
+    analysis = Analysis.analyze(pieces, 'L2', workers=2)
+    specification, shared = analysis.share()
+    attached = Analysis.attach(specification)
+
+    # Workers attach to the block measures were computed in
+    assert shared is None and len(shared_blocks() - blocks) == 1
+    assert np.array_equal(attached.dissimilarity_measures, analysis.dissimilarity_measures)
+
+    # The block is unlinked with the analysis
+    del analysis
+    assert shared_blocks() <= blocks
+
+
+def test_class_api_uses_the_current_analysis(pieces, tmp_path):
+    analysis = Analysis.analyze(pieces, 'L2', top_k=3)
+    with pytest.deprecated_call():
+        ImageAnalysis.analyze_image(pieces, 'Mahalanobis', top_k=3)
+    with pytest.deprecated_call():
+        assert ImageAnalysis.get_dissimilarity((1, 2), 'LR') != analysis.get_dissimilarity((1, 2), 'LR')
+
+    ImageAnalysis.use(analysis)
+    assert ImageAnalysis.current() is analysis
+    with pytest.deprecated_call():
+        assert ImageAnalysis.get_dissimilarity((1, 2), 'LR') == analysis.get_dissimilarity((1, 2), 'LR')
+    with pytest.deprecated_call():
+        assert ImageAnalysis.best_match(1, 'R') == analysis.best_match(1, 'R')
+    with pytest.deprecated_call():
+        ImageAnalysis.put_dissimilarity((1, 2), 'TD', 42)
+    assert analysis.get_dissimilarity((1, 2), 'TD') == 42
+    assert analysis.get_dissimilarity((2, 1), 'TD') != 42
+
+    with pytest.deprecated_call():
+        ImageAnalysis.save(str(tmp_path / 'analysis'))
+    with pytest.deprecated_call():
+        ImageAnalysis.load(str(tmp_path / 'analysis'))
+    assert ImageAnalysis.current() is not analysis
+    with pytest.deprecated_call():
+        assert ImageAnalysis.get_dissimilarity((1, 2), 'TD') == 42
+
+    with pytest.deprecated_call():
+        assert not AnalysisCache(str(tmp_path / 'cache')).analyze_image(pieces, 'L2', top_k=3)
+    with pytest.deprecated_call():
+        assert ImageAnalysis.get_dissimilarity((1, 2), 'TD') != 42
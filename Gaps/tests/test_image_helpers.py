@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+
+PIECE_SIZE = 8
+ROWS = 3
+COLUMNS = 4
+
+
+def test_flatten_image_is_a_view():
+    # Image with a margin which does not fit into pieces
+    image = np.random.RandomState(0).randint(0, 256, size=(ROWS * PIECE_SIZE + 3, COLUMNS * PIECE_SIZE + 5, 3))
+    image = image.astype(np.uint8)
+    pieces, rows, columns = image_helpers.flatten_image(image, PIECE_SIZE)
+
+    assert (rows, columns) == (ROWS, COLUMNS)
+    assert pieces.shape == (ROWS, COLUMNS, PIECE_SIZE, PIECE_SIZE, 3)
+    assert np.shares_memory(pieces, image)
+    assert np.array_equal(pieces[1, 2], image[PIECE_SIZE:2 * PIECE_SIZE, 2 * PIECE_SIZE:3 * PIECE_SIZE])
+
+
+def test_assemble_image_gathers_permuted_pieces():
+    image = np.random.RandomState(0).randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3))
+    image = image.astype(np.uint8)
+    pieces, rows, columns = image_helpers.flatten_image(image, PIECE_SIZE)
+
+    assert np.array_equal(image_helpers.assemble_image(pieces, rows, columns), image)
+
+    permutation = np.random.RandomState(1).permutation(rows * columns)
+    puzzle = image_helpers.assemble_image(pieces, rows, columns, permutation)
+    piece_list = [pieces[index // columns, index % columns] for index in range(rows * columns)]
+    expected = np.vstack([
+        np.hstack([piece_list[permutation[i * columns + j]] for j in range(columns)]) for i in range(rows)
+    ])
+    assert np.array_equal(puzzle, expected)
+    assert np.array_equal(image_helpers.assemble_image(piece_list, rows, columns, permutation), expected)
+
+    # Solving the puzzle is applying the inverse permutation
+    out = np.empty_like(image)
+    puzzle_pieces, _, _ = image_helpers.flatten_image(puzzle, PIECE_SIZE)
+    solution = image_helpers.assemble_image(puzzle_pieces, rows, columns, np.argsort(permutation), out=out)
+    assert solution is out
+    assert np.array_equal(solution, image)
+
+
+@pytest.mark.parametrize('dtype', [np.uint16, np.float32])
+def test_assemble_image_keeps_dtype_of_pieces(dtype):
+    image = np.random.RandomState(0).uniform(0, 1000, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3))
+    image = image.astype(dtype)
+    pieces, rows, columns = image_helpers.flatten_image(image, PIECE_SIZE)
+
+    assembled = image_helpers.assemble_image(pieces, rows, columns)
+    assert assembled.dtype == dtype and np.array_equal(assembled, image)
+    piece_list = list(pieces.reshape(-1, PIECE_SIZE, PIECE_SIZE, 3))
+    assert image_helpers.assemble_image(piece_list, rows, columns).dtype == dtype
+
+    with pytest.raises(ValueError):
+        image_helpers.assemble_image(pieces, rows, columns, out=np.empty(image.shape, dtype=np.uint8))
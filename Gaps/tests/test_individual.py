@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+
+PIECE_SIZE = 8
+ROWS = 3
+COLUMNS = 4
+
+
+@pytest.fixture
+def image():
+    random_state = np.random.RandomState(0)
+    return random_state.randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)).astype(np.uint8)
+
+
+@pytest.fixture
+def pieces(image):
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    return pieces
+
+
+def test_fitness_sums_adjacent_measures(pieces):
+    analysis = Analysis.analyze(pieces, 'L2')
+    np.random.seed(0)
+    individual = Individual(pieces, ROWS, COLUMNS, analysis=analysis)
+
+    expected = 1 / Individual.FITNESS_FACTOR
+    for i in range(ROWS):
+        for j in range(COLUMNS - 1):
+            expected += analysis.get_dissimilarity((individual[i][j].id, individual[i][j + 1].id), 'LR')
+    for i in range(ROWS - 1):
+        for j in range(COLUMNS):
+            expected += analysis.get_dissimilarity((individual[i][j].id, individual[i + 1][j].id), 'TD')
+
+    assert np.isclose(individual.fitness, Individual.FITNESS_FACTOR / expected)
+
+
+def test_permutation_and_edges(pieces):
+    np.random.seed(0)
+    individual = Individual(pieces, ROWS, COLUMNS)
+    permutation = individual.permutation
+
+    assert permutation.dtype == np.int32
+    assert sorted(permutation) == list(range(ROWS * COLUMNS))
+    assert np.array_equal(individual.inverse[permutation], np.arange(ROWS * COLUMNS))
+    assert [piece.id for piece in individual.pieces] == list(permutation)
+
+    top_left, top_right = permutation[0], permutation[COLUMNS - 1]
+    assert individual.edge(top_left, 'T') is None
+    assert individual.edge(top_left, 'L') is None
+    assert individual.edge(top_left, 'R') == permutation[1]
+    assert individual.edge(top_left, 'D') == permutation[COLUMNS]
+    assert individual.edge(top_right, 'R') is None
+    assert individual.piece_by_id(top_left).id == top_left
+
+
+def test_to_image_places_pieces_by_permutation(image, pieces):
+    permutation = np.arange(ROWS * COLUMNS)[::-1]
+    individual = Individual(pieces, ROWS, COLUMNS, shuffle=False, permutation=permutation)
+
+    assert np.array_equal(Individual(pieces, ROWS, COLUMNS, shuffle=False).to_image(), image)
+    assert np.array_equal(individual.to_image(), image[::-1, ::-1].reshape(
+        ROWS, PIECE_SIZE, COLUMNS, PIECE_SIZE, 3
+    )[:, ::-1, :, ::-1].reshape(image.shape))
+
+    # Individuals of lists of pieces are arranged the same way
+    listed = Individual(list(pieces)[::-1], ROWS, COLUMNS, shuffle=False)
+    assert np.array_equal(listed.permutation, permutation)
+    assert np.array_equal(listed.to_image(), individual.to_image())
+
+
+def test_given_permutation_is_not_shuffled(pieces):
+    permutation = np.arange(ROWS * COLUMNS)[::-1]
+    np.random.seed(0)
+
+    assert np.array_equal(Individual(pieces, ROWS, COLUMNS, permutation=permutation).permutation, permutation)
+    assert not np.array_equal(Individual(pieces, ROWS, COLUMNS).permutation, np.arange(ROWS * COLUMNS))
+
+
+def test_neighbours(pieces):
+    np.random.seed(0)
+    individual = Individual(pieces, ROWS, COLUMNS)
+    neighbours = individual.neighbours()
+
+    for piece in range(ROWS * COLUMNS):
+        expected = [individual.edge(piece, orientation) for orientation in 'TRDL']
+        assert list(neighbours[piece]) == [-1 if edge is None else edge for edge in expected]
@@ -0,0 +1,94 @@
+import json
+import random
+import threading
+
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+from gaps.crossover import Crossover
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+from gaps.instrumentation import Instrumentation
+
+PIECE_SIZE = 8
+ROWS = 4
+COLUMNS = 5
+
+
+@pytest.fixture
+def instrumentation():
+    yield Instrumentation
+    Instrumentation.disable()
+
+
+def test_disabled_instrumentation_collects_nothing():
+    with Instrumentation.timer('selection'):
+        Instrumentation.count('heap_pushes', 3)
+
+    assert Instrumentation.emit(generation=1) is None
+    # Nothing was kept either
+    Instrumentation.enable()
+    record = Instrumentation.emit(generation=1)
+    Instrumentation.disable()
+    assert record['timers'] == {} and record['counters'] == {}
+
+
+def test_records_go_to_file_and_callback(instrumentation, tmp_path):
+    path = str(tmp_path / 'profile.jsonl')
+    records = []
+    instrumentation.enable(path=path, callback=records.append)
+
+    for generation in (1, 2):
+        with instrumentation.timer('selection'):
+            instrumentation.count('heap_pushes', generation)
+        instrumentation.emit(generation=generation)
+    instrumentation.disable()
+
+    with open(path) as profile:
+        lines = [json.loads(line) for line in profile]
+    assert lines == records
+    assert [record['counters'] for record in records] == [{'heap_pushes': 1}, {'heap_pushes': 2}]
+    assert all(record['timers']['selection'] >= 0 for record in records)
+
+
+def test_threads_emit_their_own_values(instrumentation):
+    records = []
+    instrumentation.enable(callback=records.append)
+    barrier = threading.Barrier(2)
+
+    def solve(count: int):
+        instrumentation.count('heap_pushes', count)
+        # Both threads have counted before either emits
+        barrier.wait()
+        instrumentation.emit(generation=count)
+
+    threads = [threading.Thread(target=solve, args=(count,), name='solve-{}'.format(count)) for count in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted((record['thread'], record['counters']['heap_pushes']) for record in records) == [
+        ('solve-1', 1), ('solve-2', 2)
+    ]
+
+
+def test_crossover_counters(instrumentation):
+    image = np.random.RandomState(0).randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3))
+    pieces, _, _ = image_helpers.flatten_image(image.astype(np.uint8), PIECE_SIZE, indexed=True)
+    analysis = Analysis.analyze(pieces, 'L2', top_k=2)
+    np.random.seed(0)
+    random.seed(0)
+
+    instrumentation.enable()
+    crossover = Crossover(
+        Individual(pieces, ROWS, COLUMNS, analysis=analysis), Individual(pieces, ROWS, COLUMNS, analysis=analysis)
+    )
+    crossover.run()
+    counters = instrumentation.emit()['counters']
+
+    placements = counters['shared_placements'] + counters['buddy_placements'] + counters['best_match_placements']
+    assert placements == ROWS * COLUMNS - 1
+    assert counters['heap_pops'] == placements + counters['stale_candidates']
+    assert counters['heap_pushes'] >= counters['heap_pops']
@@ -0,0 +1,80 @@
+import multiprocessing
+
+import pytest
+import numpy as np
+
+from gaps.genetic_algorithm import GeneticAlgorithm
+from gaps.instrumentation import Instrumentation
+from gaps.island_model import IslandModel
+
+PIECE_SIZE = 8
+ROWS = 4
+COLUMNS = 5
+
+
+@pytest.fixture
+def puzzle():
+    y, x = np.mgrid[0:ROWS * PIECE_SIZE, 0:COLUMNS * PIECE_SIZE]
+    image = np.stack([x * 6, y * 7, (x + y) * 3], axis=-1)
+    return image.clip(0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("topology", IslandModel.TOPOLOGIES)
+def test_routes_emigrants_to_other_islands(puzzle, topology):
+    model = IslandModel(puzzle, PIECE_SIZE, 10, 4, 'L2', islands=3, migrants=2, topology=topology, seed=0)
+    emigrants = [np.full((2, ROWS * COLUMNS), island, dtype=np.int32) for island in range(3)]
+
+    immigrants = model._route(emigrants)
+
+    expected_sources = 2 if topology == 'complete' else 1
+    for island, island_immigrants in enumerate(immigrants):
+        assert len(island_immigrants) == 2 * expected_sources
+        assert island not in island_immigrants[:, 0]
+    if topology == 'ring':
+        assert [int(island_immigrants[0, 0]) for island_immigrants in immigrants] == [2, 0, 1]
+
+
+def test_islands_solve_puzzle(puzzle):
+    model = IslandModel(puzzle, PIECE_SIZE, 10, 4, 'L2', islands=2, migration_interval=2, seed=0)
+    solution = model.start_evolution(verbose=False)
+
+    assert sorted(solution.permutation) == list(range(ROWS * COLUMNS))
+
+
+def test_islands_attach_to_analysis_cached_on_a_cold_cache(puzzle, tmp_path):
+    for _ in range(2):
+        model = IslandModel(
+            puzzle, PIECE_SIZE, 10, 4, 'L2', islands=2, migration_interval=2, seed=0, cache_dir=str(tmp_path)
+        )
+        solution = model.start_evolution(verbose=False)
+        assert sorted(solution.permutation) == list(range(ROWS * COLUMNS))
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='islands must inherit the patched method')
+def test_error_of_island_is_raised_with_its_traceback(puzzle, monkeypatch):
+    def fail(self, permutations):
+        raise ValueError('island failure')
+
+    monkeypatch.setattr(GeneticAlgorithm, 'immigrate', fail)
+    model = IslandModel(puzzle, PIECE_SIZE, 10, 4, 'L2', islands=2, migration_interval=2, seed=0)
+
+    with pytest.raises(RuntimeError) as error:
+        model.start_evolution(verbose=False)
+    assert 'island failure' in str(error.value.__cause__)
+    assert 'immigrate' in str(error.value.__cause__)
+
+
+def test_records_of_islands_are_passed_on(puzzle):
+    records = []
+    Instrumentation.enable(callback=records.append)
+    try:
+        model = IslandModel(puzzle, PIECE_SIZE, 10, 4, 'L2', islands=2, migration_interval=2, seed=0)
+        model.start_evolution(verbose=False)
+    finally:
+        Instrumentation.disable()
+
+    assert 'analysis' in records[0]['timers']
+    for island in range(2):
+        island_records = [record for record in records if record.get('island') == island]
+        assert [record['generation'] for record in island_records] == [1, 2, 3, 4]
+        assert all('crossover' in record['timers'] for record in island_records)
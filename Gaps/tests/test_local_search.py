@@ -0,0 +1,98 @@
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+from gaps.local_search import LocalSearch, _row_costs, _shift_delta, exchange_deltas, relocation_deltas
+
+PIECE_SIZE = 8
+ROWS = 4
+COLUMNS = 5
+
+
+@pytest.fixture
+def individual():
+    random_state = np.random.RandomState(0)
+    image = random_state.randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)).astype(np.uint8)
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    np.random.seed(0)
+    return Individual(pieces, ROWS, COLUMNS, analysis=Analysis.analyze(pieces, 'L2'))
+
+
+def total_dissimilarity(grid, measures):
+    left_right, top_down = measures
+    return left_right[grid[:, :-1], grid[:, 1:]].sum() + top_down[grid[:-1, :], grid[1:, :]].sum()
+
+
+def test_exchange_deltas(individual):
+    grid = individual.permutation.reshape(ROWS, COLUMNS)
+    measures = individual.analysis.dissimilarity_measures
+    first, second = np.divmod(np.arange(grid.size ** 2), grid.size)
+    first, second = first[first != second], second[first != second]
+
+    # Swaps of every two pieces, adjacent ones included
+    deltas = exchange_deltas(grid, first[:, np.newaxis], second[:, np.newaxis], measures)
+    for a, b, delta in zip(first, second, deltas):
+        swapped = grid.copy()
+        swapped.flat[[a, b]] = swapped.flat[[b, a]]
+        assert np.isclose(delta, total_dissimilarity(swapped, measures) - total_dissimilarity(grid, measures))
+
+    # Exchanges of touching and distant horizontal and vertical segments
+    first = np.array([[0, 1, 2], [0, 5, 10], [6, 7, 8], [0, 1, 2]])
+    second = np.array([[3, 4, 5], [1, 6, 11], [11, 12, 13], [17, 18, 19]])
+    deltas = exchange_deltas(grid, first, second, measures)
+    for a, b, delta in zip(first, second, deltas):
+        exchanged = grid.copy()
+        exchanged.flat[np.hstack((a, b))] = exchanged.flat[np.hstack((b, a))]
+        assert np.isclose(delta, total_dissimilarity(exchanged, measures) - total_dissimilarity(grid, measures))
+
+
+@pytest.mark.parametrize('transposed', [False, True])
+def test_shift_deltas(individual, transposed):
+    arrangement = individual.permutation.reshape(ROWS, COLUMNS)
+    grid = arrangement.T if transposed else arrangement
+    measures = individual.analysis.dissimilarity_measures
+
+    costs = _row_costs(grid, transposed, measures)
+    rows = list(range(len(grid)))
+    for start, stop, gap in ((1, 2, 0), (0, 2, len(grid)), (1, 3, 0), (2, 3, 4)):
+        order = rows[:start] + rows[stop:]
+        index = gap if gap < start else gap - (stop - start)
+        order[index:index] = rows[start:stop]
+        moved = grid[order].T if transposed else grid[order]
+        assert np.isclose(
+            _shift_delta(costs, start, stop, gap),
+            total_dissimilarity(moved, measures) - total_dissimilarity(arrangement, measures)
+        )
+
+
+@pytest.mark.parametrize('transposed', [False, True])
+def test_relocation_deltas(individual, transposed):
+    arrangement = individual.permutation.reshape(ROWS, COLUMNS)
+    grid = arrangement.T if transposed else arrangement
+    measures = individual.analysis.dissimilarity_measures
+    rows, columns = grid.shape
+
+    # Every segment of every row moved to every other place
+    moves = np.array([
+        (row, start, stop, gap)
+        for row in range(rows) for start in range(columns) for stop in range(start + 1, columns + 1)
+        for gap in range(columns + 1) if not start <= gap <= stop
+    ])
+    deltas = relocation_deltas(grid, *moves.T, measures, transposed)
+    for (row, start, stop, gap), delta in zip(moves, deltas):
+        order = list(grid[row, :start]) + list(grid[row, stop:])
+        index = gap if gap < start else gap - (stop - start)
+        order[index:index] = grid[row, start:stop]
+        moved = grid.copy()
+        moved[row] = order
+        moved = moved.T if transposed else moved
+        assert np.isclose(delta, total_dissimilarity(moved, measures) - total_dissimilarity(arrangement, measures))
+
+
+def test_run_never_worsens(individual):
+    improved = LocalSearch(rounds=10, sample_size=64).run(individual)
+
+    assert improved.fitness >= individual.fitness
+    assert sorted(improved.permutation) == list(range(ROWS * COLUMNS))
@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+from gaps.piece import Piece
+
+PIECE_SIZE = 8
+ROWS = 3
+COLUMNS = 4
+
+
+@pytest.fixture
+def image():
+    random_state = np.random.RandomState(0)
+    return random_state.randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)).astype(np.uint8)
+
+
+def test_piece_views_match_pieces(image):
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    assert len(pieces) == ROWS * COLUMNS
+    assert pieces.images.dtype == np.uint8
+
+    for index, view in enumerate(pieces):
+        row, column = divmod(index, COLUMNS)
+        piece = Piece(image[
+            row * PIECE_SIZE:(row + 1) * PIECE_SIZE, column * PIECE_SIZE:(column + 1) * PIECE_SIZE
+        ].astype(np.float64), index)
+
+        assert view.id == piece.id
+        assert np.array_equal(view.image, piece.image)
+        for side in ['top', 'right', 'bottom', 'left']:
+            assert getattr(view, side).dtype == np.float32
+            assert np.array_equal(getattr(view, side), getattr(piece, side))
+            assert np.allclose(getattr(view, 'mu_' + side), getattr(piece, 'mu_' + side))
+            sigma_inv = 'sigma_{}_inv'.format(side)
+            assert np.allclose(getattr(view, sigma_inv), getattr(piece, sigma_inv))
+
+
+def test_statistics_are_computed_on_demand(image):
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    pieces.stack('right')
+    assert not pieces._statistics
+
+    assert pieces.stack('sigma_right_inv').shape == (ROWS * COLUMNS, 3, 3)
+    with pytest.raises(AttributeError):
+        pieces[0].sigma_middle_inv
@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+
+from gaps import image_helpers
+from gaps.image_analysis import Analysis
+from gaps.individual import Individual
+from gaps.population import Population
+
+PIECE_SIZE = 8
+ROWS = 3
+COLUMNS = 4
+
+
+@pytest.fixture
+def population():
+    random_state = np.random.RandomState(0)
+    image = random_state.randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3)).astype(np.uint8)
+    pieces, _, _ = image_helpers.flatten_image(image, PIECE_SIZE, indexed=True)
+    np.random.seed(0)
+    return Population.random(pieces, ROWS, COLUMNS, 30, analysis=Analysis.analyze(pieces, 'L2'))
+
+
+def test_batch_fitness_matches_individuals(population):
+    individuals = [
+        Individual(population[index].pieces, ROWS, COLUMNS, shuffle=False, analysis=population.analysis)
+        for index in range(len(population))
+    ]
+
+    assert np.array_equal(population.fitness, [individual.fitness for individual in individuals])
+    assert all(population[index].fitness == population.fitness[index] for index in range(len(population)))
+
+
+@pytest.mark.parametrize('count', [0, 1, 5, 30])
+def test_elite_and_best(population, count):
+    fitness = population.fitness
+    expected = sorted(range(len(population)), key=lambda index: fitness[index])[len(population) - count:]
+
+    assert list(population.elite_indices(count)) == expected
+    assert population.best_index() == int(np.argmax(fitness))
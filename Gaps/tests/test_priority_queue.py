@@ -0,0 +1,29 @@
+import pytest
+
+from gaps.priority_queue import PriorityQueue
+
+
+def test_push_pop_in_priority_order():
+    queue = PriorityQueue()
+    for key, priority in (('a', 3), ('b', 1), ('c', 2), ('d', 1)):
+        queue.push(key, priority)
+
+    assert [queue.pop() for _ in range(len(queue))] == [('b', 1), ('d', 1), ('c', 2), ('a', 3)]
+    with pytest.raises(KeyError):
+        queue.pop()
+
+
+def test_change_and_remove_keys():
+    queue = PriorityQueue()
+    for key, priority in (('a', 3), ('b', 1), ('c', 2)):
+        queue.push(key, priority)
+
+    queue.push('a', 0)
+    queue.push('b', 5)
+    queue.remove('c')
+    queue.remove('missing')
+
+    assert 'c' not in queue and 'a' in queue
+    assert len(queue) == 2
+    assert queue.priority('b') == 5
+    assert [queue.pop() for _ in range(len(queue))] == [('a', 0), ('b', 5)]
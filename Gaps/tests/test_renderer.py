@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from gaps import image_helpers
+from gaps.renderer import FrameWriter, Renderer
+
+PIECE_SIZE = 8
+ROWS = 2
+COLUMNS = 3
+
+
+def puzzle():
+    image = np.random.RandomState(0).randint(0, 256, size=(ROWS * PIECE_SIZE, COLUMNS * PIECE_SIZE, 3))
+    return image.astype(np.uint8)
+
+
+def test_renderer_is_abstract():
+    with pytest.raises(TypeError):
+        Renderer(puzzle(), PIECE_SIZE)
+
+
+def test_frames_are_written_at_cadence_and_at_close(tmp_path):
+    image = puzzle()
+    directory = tmp_path / 'frames'
+
+    animation = tmp_path / 'run.gif'
+
+    with FrameWriter(image, PIECE_SIZE, directory=str(directory), animation=str(animation), every=2) as writer:
+        for generation in range(1, 6):
+            writer.show(generation, np.arange(ROWS * COLUMNS)[::-1], 'Generation {}'.format(generation))
+
+    assert sorted(path.name for path in directory.iterdir()) == [
+        'generation_00002.png', 'generation_00004.png', 'generation_00005.png'
+    ]
+    assert animation.exists()
+
+
+def test_long_animations_keep_a_bounded_number_of_frames(tmp_path):
+    animation = tmp_path / 'run.gif'
+    random_state = np.random.RandomState(1)
+    permutations = [random_state.permutation(ROWS * COLUMNS) for _ in range(100)]
+
+    with FrameWriter(puzzle(), PIECE_SIZE, animation=str(animation), max_gif_frames=10) as writer:
+        for generation, permutation in enumerate(permutations, 1):
+            writer.show(generation, permutation, 'Generation {}'.format(generation))
+
+    with Image.open(str(animation)) as gif:
+        assert 5 <= gif.n_frames <= 10
+        gif.seek(gif.n_frames - 1)
+        last = np.array(gif.convert('RGB'), dtype=np.int64)
+
+    # Colors of GIF frames are quantized, the last frame is the closest to the last arrangement
+    pieces, _, _ = image_helpers.flatten_image(puzzle(), PIECE_SIZE)
+    distances = [
+        np.abs(last - image_helpers.assemble_image(pieces, ROWS, COLUMNS, permutation)).sum()
+        for permutation in permutations
+    ]
+    assert np.argmin(distances) == len(permutations) - 1
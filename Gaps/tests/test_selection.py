@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+
+from gaps.selection import SELECTIONS, stochastic_universal_selection, tournament_selection
+
+
+class Individual(object):
+
+    def __init__(self, fitness):
+        self.fitness = fitness
+
+
+@pytest.fixture
+def population():
+    return [Individual(fitness) for fitness in [1.0, 2.0, 3.0, 4.0, 10.0]]
+
+
+@pytest.mark.parametrize("name", list(SELECTIONS))
+def test_one_pair_for_each_child(population, name):
+    selected = SELECTIONS[name](population, elites=1, random_state=np.random.RandomState(0))
+
+    assert len(selected) == len(population) - 1
+    assert all(first in population and second in population for first, second in selected)
+
+
+def test_tournament_of_whole_population_selects_fittest(population):
+    selected = tournament_selection(population, 0, np.random.RandomState(0), tournament_size=200)
+
+    assert all(first is population[-1] and second is population[-1] for first, second in selected)
+
+
+def test_stochastic_universal_sampling_keeps_expected_counts():
+    population = [Individual(fitness) for fitness in [1.0, 3.0, 4.0, 2.0]] + [Individual(0.0) for _ in range(6)]
+    selected = stochastic_universal_selection(population, 0, np.random.RandomState(0))
+
+    # 20 parents, each individual is selected twice per unit of fitness
+    counts = [sum(parent is individual for pair in selected for parent in pair) for individual in population]
+    assert counts == [2, 6, 8, 4, 0, 0, 0, 0, 0, 0]
@@ -19,8 +19,8 @@ images = [
 def create_puzzle(image_path, piece_size):
     image = cv2.imread(image_path)
     pieces, rows, columns = image_helpers.flatten_image(image, piece_size)
-    np.random.shuffle(pieces)
-    return image_helpers.assemble_image(pieces, rows, columns)
+    permutation = np.random.permutation(rows * columns)
+    return image_helpers.assemble_image(pieces, rows, columns, permutation)
 
 @pytest.mark.parametrize("image", images)
 def test_size_detection(image):
@@ -14,8 +14,8 @@ image = cv2.imread("images/baboon.jpg")
 @pytest.fixture
 def puzzle():
     pieces, rows, columns = image_helpers.flatten_image(image, PIECE_SIZE)
-    np.random.shuffle(pieces)
-    return image_helpers.assemble_image(pieces, rows, columns)
+    permutation = np.random.permutation(rows * columns)
+    return image_helpers.assemble_image(pieces, rows, columns, permutation)
 
 def test_puzzle_solver(puzzle):
     algorithm = GeneticAlgorithm(puzzle, PIECE_SIZE, POPULATION, GENERATIONS)